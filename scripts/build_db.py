@@ -1,12 +1,38 @@
 import argparse
+import cProfile
+import datetime as dt
+import hashlib
+import json
+import os
 import sqlite3
+import sys
+import time
 import pandas as pd
 import re
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import NamedTuple
+
+# 与 tooling/build_sqlite_from_csv.py 共用的构建阶段
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tooling"))
+from build_profile import DEFAULT_OUT as PROFILE_OUT, BuildProfile, peak_rss_mb  # noqa: E402
+from content_stats import build_deck_level_stats, refresh_media_counts  # noqa: E402
+from dedup_content import dedup_content, format_report as format_dedup_report  # noqa: E402
+from finalize_db import DEFAULT_PAGE_SIZE, finalize, format_report  # noqa: E402
+from item_links import build_item_links, format_report as format_links_report  # noqa: E402
+from media_resolver import format_summary, resolve_media, write_missing_report  # noqa: E402
+from search_grams import build_search_grams  # noqa: E402
+from shuffle_keys import refresh_shuffle_keys  # noqa: E402
+from text_keys import refresh_text_keys  # noqa: E402
 
 MARKER = r"\にほんご"
 MARKER2 = r"/にほんご/"
 
+ITEM_COLUMNS = ["deck", "term", "level", "reading", "meaning", "audio", "image"]
+
+# handler 的 path_col 默认值：在传入的整张 sheet 上自动查找
+AUTO = object()
+
 def norm_path(p: str) -> str:
     if p is None:
         return ""
@@ -20,6 +46,79 @@ def make_search_text(*parts) -> str:
     s = re.sub(r"\s+", " ", s).strip()
     return s
 
+# ---- 列级（向量化）工具：每个 handler 把整张 sheet 变成一个 items 帧 ----
+
+def col(df: pd.DataFrame, name) -> pd.Series:
+    """取列；列不存在时返回空串列（等价于原来的 r.get(name, "")）。"""
+    if name is not None and name in df.columns:
+        return df[name]
+    return pd.Series("", index=df.index, dtype=object)
+
+def text(s) -> pd.Series:
+    """NaN/None/"nan" → ""，其余转 str 并去掉首尾空白。
+
+    整数值的浮点列（含空单元格的页码列会被 pandas 推成 float）输出 "12" 而不是 "12.0"，
+    这样整表读取和 --stream 分块读取得到的文本一致。
+    """
+    if pd.api.types.is_float_dtype(s):
+        out = s.astype(str).str.replace(r"\.0$", "", regex=True).where(s.notna(), "")
+    else:
+        out = s.where(s.notna(), "").astype(str)
+    out = out.str.strip()
+    return out.mask(out.str.lower() == "nan", "")
+
+def join_nonempty(parts, sep=" ") -> pd.Series:
+    out = parts[0]
+    for s in parts[1:]:
+        both = (out != "") & (s != "")
+        out = out + both.map({True: sep, False: ""}) + s
+    return out
+
+def search_text_cols(index, *parts) -> pd.Series:
+    """make_search_text 的列版本；parts 可以是列或常量字符串。"""
+    cols = [text(p) if isinstance(p, pd.Series) else text(pd.Series(p, index=index, dtype=object)) for p in parts]
+    return join_nonempty(cols).str.replace(r"\s+", " ", regex=True).str.strip()
+
+def labeled(prefix: str, s: pd.Series) -> pd.Series:
+    """f"{prefix}{value}"，值为空时整体为空。"""
+    v = text(s)
+    return (prefix + v).where(v != "", "")
+
+def path_col_candidates(df: pd.DataFrame) -> set:
+    needle = MARKER + "\\"
+    found = set()
+    for c in df.columns:
+        s = df[c]
+        if pd.api.types.is_numeric_dtype(s) or pd.api.types.is_datetime64_any_dtype(s):
+            continue
+        s = s.dropna()
+        if not s.empty and s.astype(str).str.contains(needle, regex=False).any():
+            found.add(c)
+    return found
+
+def find_path_col(df: pd.DataFrame):
+    """第一个包含 …\\にほんご\\… 的列（只看文本列里的非空值）。"""
+    for c in df.columns:
+        if c in path_col_candidates(df[[c]]):
+            return c
+    return None
+
+def items_frame(index, deck, term, level="", reading="", meaning="", audio="", image="") -> pd.DataFrame:
+    def as_col(v):
+        return text(v) if isinstance(v, pd.Series) else pd.Series(v, index=index, dtype=object)
+    return pd.DataFrame(
+        {
+            "deck": as_col(deck),
+            "term": as_col(term),
+            "level": as_col(level),
+            "reading": as_col(reading),
+            "meaning": as_col(meaning),
+            "audio": as_col(audio),
+            "image": as_col(image),
+        },
+        index=index,
+    )[ITEM_COLUMNS]
+
 def create_schema(conn: sqlite3.Connection):
     cur = conn.cursor()
     cur.execute("""
@@ -42,62 +141,71 @@ def create_schema(conn: sqlite3.Connection):
       FOREIGN KEY(item_id) REFERENCES items(id)
     );
     """)
-    # SRS tables (app uses these)
-    cur.execute("""
+    # SRS tables：与 App 的 ensureUserTables（lib/db.dart）保持同一结构，否则 App 建 idx_srs_deck_level 时会失败
+    cur.executescript("""
     CREATE TABLE IF NOT EXISTS srs(
       item_id INTEGER PRIMARY KEY,
-      reps INTEGER NOT NULL DEFAULT 0,
-      interval_days INTEGER NOT NULL DEFAULT 0,
-      due_day INTEGER NOT NULL DEFAULT 0,
+      deck TEXT,
+      level TEXT,
+      state INTEGER NOT NULL DEFAULT 0,          -- 0=new 1=learning 2=review
       ease REAL NOT NULL DEFAULT 2.5,
-      last_day INTEGER NOT NULL DEFAULT 0
+      interval_days INTEGER NOT NULL DEFAULT 0,
+      due_day INTEGER NOT NULL DEFAULT 0,        -- days since epoch
+      reps INTEGER NOT NULL DEFAULT 0,
+      lapses INTEGER NOT NULL DEFAULT 0,
+      last_review_day INTEGER NOT NULL DEFAULT 0
     );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS reviews(
+    CREATE TABLE IF NOT EXISTS review_log(
       id INTEGER PRIMARY KEY AUTOINCREMENT,
-      day INTEGER NOT NULL,
       item_id INTEGER NOT NULL,
-      rating TEXT NOT NULL
+      day INTEGER NOT NULL,                      -- days since epoch
+      grade INTEGER NOT NULL,                    -- 1 again,2 hard,3 good,4 easy
+      ts INTEGER NOT NULL                        -- unix seconds
     );
+    CREATE INDEX IF NOT EXISTS idx_log_day ON review_log(day);
+    CREATE INDEX IF NOT EXISTS idx_srs_due ON srs(due_day);
+    CREATE INDEX IF NOT EXISTS idx_srs_deck_level ON srs(deck, level);
     """)
+    conn.commit()
+
+def create_indexes(conn: sqlite3.Connection):
+    # 数据写完后再建索引（比逐行维护索引快得多）
+    cur = conn.cursor()
     cur.execute("CREATE INDEX IF NOT EXISTS idx_items_deck ON items(deck);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_items_level ON items(level);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_items_search_text ON items(search_text);")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_media_item ON media(item_id);")
     conn.commit()
 
-def insert_item(conn, deck, term, level="", reading="", meaning="", audio="", image=""):
-    term = "" if term is None else str(term).strip()
-    if not term or term.lower() == "nan":
-        return None
-    deck = str(deck).strip()
-    level = "" if level is None else str(level).strip()
-    reading = "" if reading is None else str(reading).strip()
-    meaning = "" if meaning is None else str(meaning).strip()
-
-    search_text = make_search_text(deck, level, term, reading, meaning)
-
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO items(deck, level, term, reading, meaning, search_text) VALUES(?,?,?,?,?,?)",
-        (deck, level, term, reading, meaning, search_text),
+def write_items(conn, frame: pd.DataFrame) -> int:
+    """批量写入一个 items 帧（insert_item 的向量化版本），返回写入条数。"""
+    frame = frame[frame["term"] != ""]
+    if frame.empty:
+        return 0
+    next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM items").fetchone()[0]
+    ids = pd.RangeIndex(next_id, next_id + len(frame))
+    frame = frame.set_axis(ids)
+    search = search_text_cols(frame.index, frame["deck"], frame["level"], frame["term"], frame["reading"], frame["meaning"])
+
+    conn.executemany(
+        "INSERT INTO items(id, deck, level, term, reading, meaning, search_text) VALUES(?,?,?,?,?,?,?)",
+        zip(ids, frame["deck"], frame["level"], frame["term"], frame["reading"], frame["meaning"], search),
     )
-    item_id = cur.lastrowid
-
-    if audio:
-        ap = norm_path(audio)
-        if ap:
-            cur.execute("INSERT INTO media(item_id, type, path) VALUES(?,?,?)", (item_id, "audio", ap))
-    if image:
-        ip = norm_path(image)
-        if ip:
-            cur.execute("INSERT INTO media(item_id, type, path) VALUES(?,?,?)", (item_id, "image", ip))
 
-    return item_id
+    # 每个条目先音频后图片，与逐行导入时的 media.id 顺序一致
+    media = []
+    for order, kind in enumerate(["audio", "image"]):
+        paths = frame[kind].str.replace("\\", "/", regex=False)
+        paths = paths[paths != ""]
+        media.append(pd.DataFrame({"item_id": paths.index, "order": order, "type": kind, "path": paths.values}))
+    media = pd.concat(media).sort_values(["item_id", "order"], kind="stable")
+    conn.executemany(
+        "INSERT INTO media(item_id, type, path) VALUES(?,?,?)",
+        zip(media["item_id"].tolist(), media["type"], media["path"]),
+    )
+    return len(frame)
 
-def handle_red_book(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="红宝书")
+def handle_red_book(df: pd.DataFrame) -> pd.DataFrame:
     # 核心列（你这个 4.2 版本里验证过）
     col_kana = "假名"
     col_kanji = "汉字/外文"
@@ -105,171 +213,565 @@ def handle_red_book(conn, xls: Path):
     col_audio = "音源路径"
     col_image = "图源.1"
 
-    for _, r in df.iterrows():
-        kana = r.get(col_kana, "")
-        kanji = r.get(col_kanji, "")
-        term = kanji if str(kanji).strip() and str(kanji).lower() != "nan" else kana
-        reading = kana
-        level = r.get(col_level, "")
-        audio = r.get(col_audio, "")
-        image = r.get(col_image, "")
-        insert_item(conn, "红宝书", term=term, level=level, reading=reading, meaning="", audio=audio, image=image)
-
-def handle_sheet1_adverbs(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="Sheet1")
+    kana = text(col(df, col_kana))
+    kanji = text(col(df, col_kanji))
+    term = kanji.where(kanji != "", kana)
+    return items_frame(df.index, "红宝书", term=term, level=col(df, col_level), reading=kana,
+                       audio=col(df, col_audio), image=col(df, col_image))
+
+def handle_sheet1_adverbs(df: pd.DataFrame) -> pd.DataFrame:
     # 序号, 副词, 词意, 例句...
-    for _, r in df.iterrows():
-        term = r.get("副词", "")
-        meaning = r.get("词意", "")
-        example = r.get("例句", "")
-        ex_mean = r.get("例句解释", "")
-        insert_item(conn, "副词（Sheet1）", term=term, level="", reading="", meaning=make_search_text(meaning, example, ex_mean))
-
-def handle_exam_countermeasure(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="考前对策")
-    for _, r in df.iterrows():
-        term = r.get("句型", "")
-        level = r.get("级别", "")
-        # 优先实际路径
-        img = r.get("实际路径", "") or r.get("路径", "")
-        page = r.get("页数", "")
-        meaning = f"页码：{page}" if str(page).strip() and str(page).lower() != "nan" else ""
-        insert_item(conn, "考前对策", term=term, level=level, reading="", meaning=meaning, image=img)
-
-def handle_shinkanzen(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="新完全掌握")
+    meaning = search_text_cols(df.index, col(df, "词意"), col(df, "例句"), col(df, "例句解释"))
+    return items_frame(df.index, "副词（Sheet1）", term=col(df, "副词"), meaning=meaning)
+
+def handle_exam_countermeasure(df: pd.DataFrame) -> pd.DataFrame:
+    # 优先实际路径
+    actual = text(col(df, "实际路径"))
+    img = actual.where(actual != "", text(col(df, "路径")))
+    meaning = labeled("页码：", col(df, "页数"))
+    return items_frame(df.index, "考前对策", term=col(df, "句型"), level=col(df, "级别"), meaning=meaning, image=img)
+
+def handle_shinkanzen(df: pd.DataFrame) -> pd.DataFrame:
     # 句型 + 路径
-    for _, r in df.iterrows():
-        term = r.get("句型", "")
-        img = r.get("路径", "")
-        p = r.get("页码", "")
-        meaning = f"页码：{p}" if str(p).strip() and str(p).lower() != "nan" else ""
-        insert_item(conn, "新完全掌握", term=term, meaning=meaning, image=img)
-
-def handle_donnatoki(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="どんな时どう使う")
-    for _, r in df.iterrows():
-        term = r.get("句型", "")
-        ref = r.get("参考", "")
-        page = r.get("页码", "")
-        meaning = make_search_text(f"参考：{ref}", f"页码：{page}")
-        insert_item(conn, "どんな时どう使う", term=term, meaning=meaning)
-
-def handle_new_textbook(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="新日本语教程")
-    # 这里分两类：图片索引 + 基本句型/词汇指导
-    for _, r in df.iterrows():
-        img = r.get("实际路径", "") or r.get("路径", "")
-        lesson = r.get("初1", "")  # 课号
-        pattern = r.get("基本句型", "")
-        vocabguide = r.get("词汇表达能力指导", "")
-
-        if img and str(img).strip().lower() != "nan":
-            term = f"初级1 第{lesson}课 图片"
-            insert_item(conn, "新日本语教程-图片", term=term, meaning="", image=img)
-
-        if pattern and str(pattern).strip().lower() != "nan":
-            insert_item(conn, "新日本语教程-基本句型", term=str(pattern).strip(), meaning=str(vocabguide).strip())
-
-def handle_diff(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="疑难辨析")
+    meaning = labeled("页码：", col(df, "页码"))
+    return items_frame(df.index, "新完全掌握", term=col(df, "句型"), meaning=meaning, image=col(df, "路径"))
+
+def handle_donnatoki(df: pd.DataFrame) -> pd.DataFrame:
+    meaning = search_text_cols(df.index, labeled("参考：", col(df, "参考")), labeled("页码：", col(df, "页码")))
+    return items_frame(df.index, "どんな时どう使う", term=col(df, "句型"), meaning=meaning)
+
+def handle_new_textbook(df: pd.DataFrame) -> pd.DataFrame:
+    # 这里分两类：图片索引 + 基本句型/词汇指导；同一行先图片后句型
+    actual = text(col(df, "实际路径"))
+    img = actual.where(actual != "", text(col(df, "路径")))
+    lesson = text(col(df, "初1"))  # 课号
+    pattern = text(col(df, "基本句型"))
+
+    pos = pd.RangeIndex(len(df))
+    images = items_frame(pos, "新日本语教程-图片", term="初级1 第" + lesson.values + "课 图片", image=img.values)
+    images = images[img.values != ""].assign(_sub=0)
+    patterns = items_frame(pos, "新日本语教程-基本句型", term=pattern.values, meaning=text(col(df, "词汇表达能力指导")).values)
+    patterns = patterns[pattern.values != ""].assign(_sub=1)
+    both = pd.concat([images, patterns]).rename_axis("_pos").reset_index()
+    return both.sort_values(["_pos", "_sub"], kind="stable")[ITEM_COLUMNS].reset_index(drop=True)
+
+def handle_diff(df: pd.DataFrame, path_col=AUTO) -> pd.DataFrame:
     # 这张表列名很乱：我们只要把“对比点 + 两个表达 + 图片路径”收进去
     # 找到第一个包含 F:\...\にほんご 的列作为实际路径
-    path_col = None
-    for c in df.columns:
-        s = df[c].astype(str)
-        if s.str.contains(r"\\にほんご\\", na=False).any():
-            path_col = c
-            break
-
-    for _, r in df.iterrows():
-        topic = r.get("终了", "")  # 例如：终了/替换/...
-        a1 = make_search_text(r.get("~", ""), r.get("がおわる", ""))
-        a2 = make_search_text(r.get("~.1", ""), r.get("をおわる", ""))
-        term = make_search_text(topic, f"{a1} vs {a2}")
-        img = r.get(path_col, "") if path_col is not None else ""
-        insert_item(conn, "疑难辨析", term=term, meaning="", image=img)
-
-def handle_vocab_diff(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="词汇辨析")
+    if path_col is AUTO:
+        path_col = find_path_col(df)
+    topic = col(df, "终了")  # 例如：终了/替换/...
+    a1 = search_text_cols(df.index, col(df, "~"), col(df, "がおわる"))
+    a2 = search_text_cols(df.index, col(df, "~.1"), col(df, "をおわる"))
+    term = search_text_cols(df.index, topic, a1 + " vs " + a2)
+    return items_frame(df.index, "疑难辨析", term=term, image=col(df, path_col))
+
+def handle_vocab_diff(df: pd.DataFrame, path_col=AUTO) -> pd.DataFrame:
     # 找到实际路径列
-    path_col = None
-    for c in df.columns:
-        s = df[c].astype(str)
-        if s.str.contains(r"\\にほんご\\", na=False).any():
-            path_col = c
-            break
+    if path_col is AUTO:
+        path_col = find_path_col(df)
     # term 列：这张表第三列就是条目文本（书名那列）
     text_col = df.columns[2]
+    return items_frame(df.index, "词汇辨析", term=col(df, text_col), image=col(df, path_col))
 
-    for _, r in df.iterrows():
-        term = r.get(text_col, "")
-        img = r.get(path_col, "") if path_col is not None else ""
-        insert_item(conn, "词汇辨析", term=term, meaning="", image=img)
+def handle_grammar_newthinking(df: pd.DataFrame) -> pd.DataFrame:
+    point = text(col(df, "语法点"))
+    term = point.where(point != "", text(col(df, "順\n序")))
+    return items_frame(df.index, "日语语法新思维", term=term, meaning=search_text_cols(df.index, "页码：", col(df, "页码")))
 
-def handle_grammar_newthinking(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="日语语法新思维")
-    for _, r in df.iterrows():
-        term = r.get("语法点", "") or r.get("順\n序", "")
-        page = r.get("页码", "")
-        insert_item(conn, "日语语法新思维", term=term, meaning=make_search_text("页码：", page))
-
-def handle_jpxy_dict(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="《日本语句型辞典》")
+def handle_jpxy_dict(df: pd.DataFrame, path_col=AUTO) -> pd.DataFrame:
     # 实际路径列：包含 にほんご
-    path_col = None
-    for c in df.columns:
-        s = df[c].astype(str)
-        if s.str.contains(r"\\にほんご\\", na=False).any():
-            path_col = c
-            break
+    if path_col is AUTO:
+        path_col = find_path_col(df)
     # term 列通常是最后一列（例如 あか/あさ/…）
     term_col = df.columns[-1]
+    return items_frame(df.index, "日本语句型辞典", term=col(df, term_col), image=col(df, path_col))
 
-    for _, r in df.iterrows():
-        term = r.get(term_col, "")
-        img = r.get(path_col, "") if path_col is not None else ""
-        insert_item(conn, "日本语句型辞典", term=term, meaning="", image=img)
-
-def handle_blue_book(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="蓝宝书")
+def handle_blue_book(df: pd.DataFrame) -> pd.DataFrame:
     # 没有路径，作为目录索引
-    for _, r in df.iterrows():
-        t2015 = r.get("句型・2015年版目录", "")
-        lv2015 = r.get("级别.1", "")
-        p2015 = r.get("页数.2", "")
-        if str(t2015).strip() and str(t2015).lower() != "nan":
-            insert_item(conn, "蓝宝书-目录", term=t2015, level=lv2015, meaning=make_search_text("页码：", p2015))
-
-def handle_kanji(conn, xls: Path):
-    df = pd.read_excel(xls, sheet_name="日语汉字")
+    meaning = search_text_cols(df.index, "页码：", col(df, "页数.2"))
+    return items_frame(df.index, "蓝宝书-目录", term=col(df, "句型・2015年版目录"), level=col(df, "级别.1"), meaning=meaning)
+
+def handle_kanji(df: pd.DataFrame) -> pd.DataFrame:
     # 只保留“漢字、音訓”两列
-    if "漢字" in df.columns and "音訓" in df.columns:
-        for _, r in df.iterrows():
-            k = r.get("漢字", "")
-            onkun = r.get("音訓", "")
-            if str(k).strip() and str(k).lower() != "nan":
-                insert_item(conn, "日语汉字", term=k, meaning=str(onkun).strip())
-
-def handle_toc(conn, xls: Path, sheet: str):
-    df = pd.read_excel(xls, sheet_name=sheet)
+    if "漢字" not in df.columns or "音訓" not in df.columns:
+        return items_frame(df.index[:0], "日语汉字", term="")
+    return items_frame(df.index, "日语汉字", term=col(df, "漢字"), meaning=col(df, "音訓"))
+
+def handle_toc(df: pd.DataFrame, sheet: str) -> pd.DataFrame:
     # 纯目录（顾明耀/皮细庚/变形与活用等）——把第一列/第二列拼成 term
-    for _, r in df.iterrows():
-        parts = []
-        for c in df.columns[:6]:
-            v = r.get(c, "")
-            if str(v).strip() and str(v).lower() != "nan":
-                parts.append(str(v).strip())
-        term = " ".join(parts)
-        if term:
-            insert_item(conn, sheet, term=term, meaning="")
+    term = join_nonempty([text(df[c]) for c in df.columns[:6]]) if len(df.columns) else ""
+    return items_frame(df.index, sheet, term=term)
+
+# 逐个 sheet 导入的顺序（决定 items.id 顺序）
+SHEET_HANDLERS = [
+    ("红宝书", handle_red_book),
+    ("Sheet1", handle_sheet1_adverbs),
+    ("考前对策", handle_exam_countermeasure),
+    ("新完全掌握", handle_shinkanzen),
+    ("どんな时どう使う", handle_donnatoki),
+    ("新日本语教程", handle_new_textbook),
+    ("疑难辨析", handle_diff),
+    ("词汇辨析", handle_vocab_diff),
+    ("日语语法新思维", handle_grammar_newthinking),
+    ("《日本语句型辞典》", handle_jpxy_dict),
+    ("蓝宝书", handle_blue_book),
+    ("日语汉字", handle_kanji),
+]
+# 这些是目录类，尽量也收进去
+TOC_SHEETS = ["顾明耀", "皮细庚", "变形与活用", "词典存放目录"]
+
+def wanted_sheets(present) -> list:
+    missing = [name for name, _ in SHEET_HANDLERS if name not in present]
+    if missing:
+        raise SystemExit(f"Excel 缺少 sheet：{', '.join(missing)}")
+    return [name for name, _ in SHEET_HANDLERS] + [s for s in TOC_SHEETS if s in present]
+
+def sheet_names(xls: Path) -> list:
+    with pd.ExcelFile(xls) as book:
+        return list(book.sheet_names)
+
+def load_sheets(xls: Path, cache=None) -> dict:
+    """只打开/解析一次工作簿，一次性读出所有需要的 sheet；有缓存时直接读缓存。"""
+    sheets = {}
+    present = cache.sheet_names() if cache is not None else None
+    if present is not None:
+        for name in wanted_sheets(present):
+            df = cache.get(name)
+            if df is not None:
+                sheets[name] = df
+        if len(sheets) == len(wanted_sheets(present)):
+            print(f"parse cache hit: {len(sheets)} sheets")
+            cache.evict()
+            return sheets
+
+    with pd.ExcelFile(xls) as book:
+        present = list(book.sheet_names)
+        todo = [name for name in wanted_sheets(present) if name not in sheets]
+        sheets.update(pd.read_excel(book, sheet_name=todo))
+    if cache is not None:
+        cache.put_sheet_names(present)
+        for name in todo:
+            cache.put(name, sheets[name])
+        cache.evict()
+    return sheets
+
+class SheetCache:
+    """解析结果缓存：按工作簿 SHA-256 + sheet 名存 pickle（保留 pandas 的列类型），超过上限按最近使用淘汰。"""
+
+    def __init__(self, root: Path, xls: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        h = hashlib.sha256()
+        with xls.open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        # pandas 版本也算进 key：不同版本的 pickle 不保证互通
+        self.key = f"{h.hexdigest()}-pd{pd.__version__}"
+        root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sheet: str) -> Path:
+        name = hashlib.sha1(sheet.encode("utf-8")).hexdigest()[:16]
+        return self.root / f"{self.key}-{name}.pkl"
+
+    def _touch(self, path: Path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def sheet_names(self):
+        path = self.root / f"{self.key}.sheets.json"
+        if not path.exists():
+            return None
+        self._touch(path)
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def put_sheet_names(self, names):
+        (self.root / f"{self.key}.sheets.json").write_text(json.dumps(names, ensure_ascii=False), encoding="utf-8")
+
+    def get(self, sheet: str):
+        path = self._path(sheet)
+        if not path.exists():
+            return None
+        try:
+            df = pd.read_pickle(path)
+        except Exception:
+            path.unlink(missing_ok=True)
+            return None
+        self._touch(path)
+        return df
+
+    def put(self, sheet: str, df: pd.DataFrame):
+        path = self._path(sheet)
+        tmp = path.with_suffix(".tmp")
+        df.to_pickle(tmp)
+        os.replace(tmp, path)
+
+    def evict(self):
+        files = [p for p in self.root.iterdir() if p.is_file()]
+        total = sum(p.stat().st_size for p in files)
+        for p in sorted(files, key=lambda p: p.stat().st_mtime):
+            if total <= self.max_bytes:
+                break
+            if p.name.startswith(self.key):
+                continue  # 不淘汰本次刚用到的工作簿
+            total -= p.stat().st_size
+            p.unlink(missing_ok=True)
+
+# ---- --stream：只读逐行读取，分块喂给同一套 handler ----
+
+# 需要整表信息（路径列、按位置取的列 df.columns[i]）的 handler，流式模式下先扫一遍确定列
+PATH_COL_SHEETS = {"疑难辨析", "词汇辨析", "《日本语句型辞典》"}
+
+def excel_value(v):
+    # 与 pandas 的 openpyxl/pyxlsb 读取器一致：整数值的浮点数转成 int，空串当空单元格
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    if v == "":
+        return None
+    return v
+
+def pandas_headers(raw) -> list:
+    """按 pandas.read_excel 的规则命名表头：空表头 → "Unnamed: i"，重名 → name.1/name.2…"""
+    names = [f"Unnamed: {i}" if v is None else v for i, v in enumerate(raw)]
+    counts = {}
+    for i, name in enumerate(names):
+        cur = counts.get(name, 0)
+        while cur > 0:
+            counts[name] = cur + 1
+            name = f"{name}.{cur}"
+            cur = counts.get(name, 0)
+        names[i] = name
+        counts[name] = cur + 1
+    return names
+
+def trim_row(row: list) -> list:
+    end = len(row)
+    while end and row[end - 1] is None:
+        end -= 1
+    return row[:end]
+
+def padded_frame(header: list, rows: list, width: int) -> pd.DataFrame:
+    headers = pandas_headers(header + [None] * (width - len(header)))
+    return pd.DataFrame([row + [None] * (width - len(row)) for row in rows], columns=headers, dtype=object)
+
+class RowReader:
+    """只读模式按行读取工作簿（.xlsx/.xlsm 用 openpyxl，.xlsb 用 pyxlsb），不把整张 sheet 读进内存。"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        suffix = path.suffix.lower()
+        if suffix in (".xlsx", ".xlsm"):
+            from openpyxl import load_workbook
+            self._book = load_workbook(path, read_only=True, data_only=True)
+            self.sheet_names = list(self._book.sheetnames)
+            self._kind = "openpyxl"
+        elif suffix == ".xlsb":
+            from pyxlsb import open_workbook
+            self._book = open_workbook(str(path))
+            self.sheet_names = list(self._book.sheets)
+            self._kind = "pyxlsb"
+        else:
+            raise SystemExit(f"--stream 只支持 .xlsx/.xlsm/.xlsb：{path}")
+
+    def rows(self, sheet: str):
+        if self._kind == "openpyxl":
+            for row in self._book[sheet].iter_rows(values_only=True):
+                yield [excel_value(v) for v in row]
+        else:
+            with self._book.get_sheet(sheet) as ws:
+                for row in ws.rows(sparse=False):
+                    yield [excel_value(c.v) for c in row]
+
+    def frames(self, sheet: str, chunk_rows: int, width: int = 0):
+        """逐块产出 DataFrame（列名与 pd.read_excel 一致，全部 object 列）。
+
+        与 pandas 一样，列数取表头和各行最后一个非空单元格的最大值，表头之外的列命名为 "Unnamed: i"。
+        pandas 按整张 sheet 取最大值，这里按块取；按位置取列的 handler 要先用 stream_sheet_shape 扫出整张 sheet 的 width 传进来。
+        """
+        it = self.rows(sheet)
+        raw = next(it, None)
+        if raw is None:
+            return
+        raw = trim_row(raw)
+        buf = []
+        widest = max(width, len(raw))
+        for row in it:
+            row = trim_row(row)
+            widest = max(widest, len(row))
+            buf.append(row)
+            if len(buf) >= chunk_rows:
+                yield padded_frame(raw, buf, widest)
+                buf = []
+                widest = max(width, len(raw))
+        if buf or not raw:
+            yield padded_frame(raw, buf, widest)
+
+    def close(self):
+        self._book.close()
+
+def stream_sheet_shape(reader: RowReader, sheet: str, chunk_rows: int):
+    """(整张 sheet 的列数, find_path_col 的结果)，分块扫描。"""
+    found = set()
+    columns = []
+    for frame in reader.frames(sheet, chunk_rows):
+        if len(frame.columns) > len(columns):
+            columns = list(frame.columns)
+        found |= path_col_candidates(frame)
+    return len(columns), next((c for c in columns if c in found), None)
+
+def import_sheet(conn, name: str, frames, handler, prof: BuildProfile, **kwargs) -> int:
+    """逐块跑 handler 并写入；读取/分类/写入的耗时分别记到 prof 的 read/classify/insert 阶段，整张 sheet 记一条 deck。"""
+    n = 0
+    started = time.perf_counter()
+    frames = iter(frames)
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        prof.add_stage("read", time.perf_counter() - t0, 0 if frame is None else len(frame))
+        if frame is None:
+            break
+        with prof.stage("classify", len(frame)):
+            items = handler(frame, **kwargs)
+        t0 = time.perf_counter()
+        written = write_items(conn, items)
+        prof.add_stage("insert", time.perf_counter() - t0, written)
+        n += written
+    prof.add_deck(name, time.perf_counter() - started, n)
+    return n
+
+def report_sheet_error(errors: list, sheet: str, exc: BaseException):
+    """记录一张导入失败的 sheet（打印到 stderr，并写入版本元数据的 sheet_errors），不中断其余 sheet。"""
+    message = f"{type(exc).__name__}: {exc}"
+    errors.append({"sheet": sheet, "error": message})
+    print(f"{sheet}: 导入失败，已跳过（{message}）", file=sys.stderr)
+
+def import_toc_sheet(conn, sheet: str, frames, prof: BuildProfile, errors: list) -> int:
+    """目录类 sheet 可有可无：出错时回滚这张 sheet 已写入的部分并报告，其余 sheet 照常导入。"""
+    conn.execute("SAVEPOINT toc_sheet")
+    try:
+        n = import_sheet(conn, sheet, frames(), handle_toc, prof, sheet=sheet)
+    except Exception as e:
+        conn.execute("ROLLBACK TO toc_sheet")
+        conn.execute("RELEASE toc_sheet")
+        report_sheet_error(errors, sheet, e)
+        return 0
+    conn.execute("RELEASE toc_sheet")
+    print(f"{sheet}: {n} items")
+    return n
+
+def stream_import(conn, xls: Path, chunk_rows: int, prof: BuildProfile, errors: list):
+    reader = RowReader(xls)
+    try:
+        missing = [name for name, _ in SHEET_HANDLERS if name not in reader.sheet_names]
+        if missing:
+            raise SystemExit(f"Excel 缺少 sheet：{', '.join(missing)}")
+        for name, handler in SHEET_HANDLERS:
+            width, kwargs = 0, {}
+            if name in PATH_COL_SHEETS:
+                width, kwargs["path_col"] = stream_sheet_shape(reader, name, chunk_rows)
+            n = import_sheet(conn, name, reader.frames(name, chunk_rows, width), handler, prof, **kwargs)
+            print(f"{name}: {n} items")
+        for sheet in TOC_SHEETS:
+            if sheet in reader.sheet_names:
+                import_toc_sheet(conn, sheet, lambda: reader.frames(sheet, chunk_rows), prof, errors)
+    finally:
+        reader.close()
+
+# ---- --jobs：sheet 在子进程里读取 + 跑 handler，主进程按 deck 顺序单线程写库 ----
+
+# 各自单独一个任务并最先提交，免得排在一串小 sheet 后面；其余小 sheet 分组，每组只打开一次工作簿
+LARGE_SHEETS = ("红宝书", "日语汉字")
+
+class SheetResult(NamedTuple):
+    frames: list          # handler 产出的 items 帧（每块一个）
+    rows: int             # 读入的行数
+    read_s: float
+    classify_s: float
+    seconds: float
+
+def sheet_handler(name: str):
+    """(handler, kwargs)：SHEET_HANDLERS 里的按名字取，其余按目录类 sheet 处理。"""
+    handlers = dict(SHEET_HANDLERS)
+    if name in handlers:
+        return handlers[name], {}
+    return handle_toc, {"sheet": name}
+
+def plan_tasks(names: list, jobs: int) -> list:
+    """大 sheet 各占一个任务，其余按轮转分成 jobs - 大 sheet 数 组。"""
+    large = [[n] for n in names if n in LARGE_SHEETS]
+    small = [n for n in names if n not in LARGE_SHEETS]
+    k = max(1, jobs - len(large))
+    return large + [group for group in (small[i::k] for i in range(k)) if group]
+
+def run_sheet(book, name: str, stream: bool, chunk_rows: int, cache=None) -> SheetResult:
+    """读取并处理一张 sheet；book 是 RowReader（--stream）或 pd.ExcelFile。"""
+    started = time.perf_counter()
+    handler, kwargs = sheet_handler(name)
+    read_s = 0.0
+    classify_s = 0.0
+    rows = 0
+    frames = []
+    t0 = time.perf_counter()
+    if stream:
+        if name not in book.sheet_names:
+            raise KeyError(f"工作簿里没有 sheet {name!r}")
+        width = 0
+        if name in PATH_COL_SHEETS:
+            width, kwargs["path_col"] = stream_sheet_shape(book, name, chunk_rows)
+        chunks = book.frames(name, chunk_rows, width)
+    else:
+        df = cache.get(name) if cache is not None else None
+        if df is None:
+            df = pd.read_excel(book(), sheet_name=name)
+            if cache is not None:
+                cache.put(name, df)
+        chunks = [df]
+    read_s += time.perf_counter() - t0
+    chunks = iter(chunks)
+    while True:
+        t0 = time.perf_counter()
+        frame = next(chunks, None)
+        t1 = time.perf_counter()
+        read_s += t1 - t0
+        if frame is None:
+            break
+        rows += len(frame)
+        items = handler(frame, **kwargs)
+        frames.append(items[items["term"] != ""])
+        classify_s += time.perf_counter() - t1
+    return SheetResult(frames, rows, read_s, classify_s, time.perf_counter() - started)
+
+def run_sheets(xls: Path, names: list, stream: bool, chunk_rows: int, cache=None) -> dict:
+    """子进程入口：只读输入、不碰 SQLite；每张 sheet 的结果或异常分别返回，一张出错不影响同组其他 sheet。"""
+    results = {}
+    reader = RowReader(xls) if stream else None
+    opened = []
+
+    def excel_file():
+        # 全部命中解析缓存时不打开工作簿
+        if not opened:
+            opened.append(pd.ExcelFile(xls))
+        return opened[0]
+
+    try:
+        for name in names:
+            try:
+                results[name] = run_sheet(reader if stream else excel_file, name, stream, chunk_rows, cache)
+            except Exception as e:
+                results[name] = e
+    finally:
+        if reader is not None:
+            reader.close()
+        for book in opened:
+            book.close()
+    return results
+
+def parallel_import(
+    conn, xls: Path, names: list, jobs: int, stream: bool, chunk_rows: int, prof: BuildProfile, errors: list, cache=None
+):
+    """按 deck 顺序写入，item id 与串行导入逐一相同；目录类 sheet 出错只报告，必需的 sheet 出错照常中止。
+
+    profile 里 read/classify 是各子进程耗时之和（彼此重叠），wait 是主进程等结果的时间。
+    """
+    required = {name for name, _ in SHEET_HANDLERS}
+    tasks = plan_tasks(names, jobs)
+    # 大 sheet 比 jobs 多时任务数会超过 jobs；进程数仍以 --jobs 为上限，多出的任务排队
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+        futures = {}
+        for group in tasks:
+            future = pool.submit(run_sheets, xls, group, stream, chunk_rows, cache)
+            futures.update(dict.fromkeys(group, future))
+        for name in names:
+            t0 = time.perf_counter()
+            result = futures[name].result()[name]
+            prof.add_stage("wait", time.perf_counter() - t0)
+            if isinstance(result, Exception):
+                if name in required:
+                    raise result
+                report_sheet_error(errors, name, result)
+                continue
+            prof.add_stage("read", result.read_s, result.rows)
+            prof.add_stage("classify", result.classify_s, result.rows)
+            t0 = time.perf_counter()
+            n = sum(write_items(conn, frame) for frame in result.frames)
+            insert_s = time.perf_counter() - t0
+            prof.add_stage("insert", insert_s, n)
+            prof.add_deck(name, result.seconds + insert_s, n)
+            print(f"{name}: {n} items")
+
+def write_version_file(
+    path: Path,
+    xls: Path,
+    rows: int,
+    deck_level_stats,
+    media_summary,
+    size_report,
+    build_profile=None,
+    dedup_report=None,
+    sheet_errors=None,
+    links_report=None,
+):
+    h = hashlib.sha256()
+    with xls.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    metadata = {
+        "source": str(xls),
+        "rows": rows,
+        "generated_at": dt.datetime.utcnow().isoformat() + "Z",
+        "excel_sha256": h.hexdigest(),
+        "deck_level_stats": deck_level_stats,
+        "media": {k: v for k, v in media_summary.items() if k != "missing"},
+        "size_report": size_report,
+    }
+    if links_report is not None:
+        metadata["item_links"] = links_report
+    if dedup_report is not None:
+        metadata["dedup"] = dedup_report
+    if sheet_errors:
+        metadata["sheet_errors"] = sheet_errors
+    if build_profile is not None:
+        metadata["build_profile"] = build_profile
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(metadata, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Version info written to {path}")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--excel", required=True, help="输入 Excel 路径")
     ap.add_argument("--out", required=True, help="输出 sqlite 路径，例如 jp_study_content.sqlite")
+    ap.add_argument("--search-grams", action="store_true", help="生成 search_grams 倒排索引表（不依赖 FTS5 的子串搜索）")
+    ap.add_argument("--stream", action="store_true", help="只读模式逐行读取、分块导入，内存占用与 sheet 大小无关")
+    ap.add_argument("--chunk-rows", type=int, default=5000, help="--stream 模式下每块的行数")
+    ap.add_argument("--jobs", type=int, default=1, help="并行导入：每张 sheet 在子进程里读取/处理，主进程按 deck 顺序写库（0 = CPU 核数，1 = 串行）")
+    ap.add_argument("--cache-dir", default=".cache/excel_sheets", help="Excel 解析缓存目录（按工作簿 SHA-256 + sheet 名）")
+    ap.add_argument("--cache-max-mb", type=int, default=1024, help="解析缓存的大小上限，超出时淘汰最久未用的")
+    ap.add_argument("--no-cache", action="store_true", help="不读写解析缓存")
+    ap.add_argument("--version-file", help="写出版本元数据（JSON，格式同 assets/db_version.txt）")
+    ap.add_argument("--media-root", help="本地媒体目录（与手机上的 にほんご 目录同结构），用于统计大小/哈希、报告缺失文件")
+    ap.add_argument("--media-workers", type=int, default=8, help="--media-root 的 stat/哈希线程数")
+    ap.add_argument("--missing-report", help="把 --media-root 下缺失的 rel_path 列表写到这个 JSON 文件")
+    ap.add_argument("--links", action="store_true", help="生成 item_links 相关条目表（同词 / 同读音 / 汉字 / “A vs B”），并在日志里报告连接耗时")
+    ap.add_argument("--dedup", action="store_true", help="媒体路径去重：每个媒体文件的路径与清单只存一份（media_paths），并报告节省的字节数")
+    ap.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="收尾阶段（ANALYZE + VACUUM）使用的 page size")
+    ap.add_argument("--profile", action="store_true", help="记录各阶段/各 sheet 的耗时与行数、峰值内存，写入 --profile-out 和版本元数据")
+    ap.add_argument("--profile-out", default=str(PROFILE_OUT), help="--profile 的 JSON 输出路径")
+    ap.add_argument("--profile-table", action="store_true", help="同 --profile，并在收尾之前把 build_stats 表写进库（默认不写：耗时每次都不同，库就不可复现）")
+    ap.add_argument("--profile-dump", help="同时在 cProfile 下运行，把统计结果写到这个文件")
     args = ap.parse_args()
-
+    if args.profile_dump:
+        profiler = cProfile.Profile()
+        profiler.runcall(build, args)
+        profiler.dump_stats(args.profile_dump)
+        print(f"cProfile stats written to {args.profile_dump}")
+    else:
+        build(args)
+
+def build(args):
+    prof = BuildProfile()
+    args.profile = args.profile or args.profile_table
     xls = Path(args.excel)
     out = Path(args.out)
     out.parent.mkdir(parents=True, exist_ok=True)
@@ -278,30 +780,100 @@ def main():
 
     conn = sqlite3.connect(out)
     create_schema(conn)
-
-    # 逐个 sheet 导入（一次性）
-    handle_red_book(conn, xls)
-    handle_sheet1_adverbs(conn, xls)
-    handle_exam_countermeasure(conn, xls)
-    handle_shinkanzen(conn, xls)
-    handle_donnatoki(conn, xls)
-    handle_new_textbook(conn, xls)
-    handle_diff(conn, xls)
-    handle_vocab_diff(conn, xls)
-    handle_grammar_newthinking(conn, xls)
-    handle_jpxy_dict(conn, xls)
-    handle_blue_book(conn, xls)
-    handle_kanji(conn, xls)
-
-    # 这些是目录类，尽量也收进去
-    for sheet in ["顾明耀", "皮细庚", "变形与活用", "词典存放目录"]:
-        try:
-            handle_toc(conn, xls, sheet)
-        except Exception:
-            pass
+    # 新文件一次性写入：单事务 + 放宽 fsync
+    conn.execute("PRAGMA journal_mode=MEMORY;")
+    conn.execute("PRAGMA synchronous=OFF;")
+
+    errors = []
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    cache = None
+    if not args.stream and not args.no_cache:
+        cache = SheetCache(Path(args.cache_dir), xls, args.cache_max_mb * 1024 * 1024)
+    if jobs > 1:
+        present = cache.sheet_names() if cache is not None else None
+        if present is None:
+            present = sheet_names(xls)
+            if cache is not None:
+                cache.put_sheet_names(present)
+        parallel_import(conn, xls, wanted_sheets(present), jobs, args.stream, args.chunk_rows, prof, errors, cache)
+        if cache is not None:
+            cache.evict()
+    elif args.stream:
+        stream_import(conn, xls, args.chunk_rows, prof, errors)
+    else:
+        with prof.stage("read"):
+            sheets = load_sheets(xls, cache)
+        for name, handler in SHEET_HANDLERS:
+            n = import_sheet(conn, name, [sheets[name]], handler, prof)
+            print(f"{name}: {n} items")
+
+        for sheet in TOC_SHEETS:
+            if sheet in sheets:
+                import_toc_sheet(conn, sheet, lambda: [sheets[sheet]], prof, errors)
+        del sheets
 
     conn.commit()
+    rows = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    with prof.stage("index", rows):
+        create_indexes(conn)
+        conn.execute("PRAGMA synchronous=FULL;")
+        if args.search_grams:
+            postings = build_search_grams(conn)
+            print(f"search_grams: {postings} postings")
+        refresh_shuffle_keys(conn)
+        refresh_text_keys(conn)
+
+    media_root = Path(args.media_root) if args.media_root else None
+    with prof.stage("media"):
+        media_summary = resolve_media(conn, media_root, args.media_workers, marker=MARKER2)
+    print(format_summary(media_summary))
+    if args.missing_report and media_root:
+        write_missing_report(Path(args.missing_report), media_summary)
+    with prof.stage("aggregate"):
+        refresh_media_counts(conn)
+        deck_level_stats = build_deck_level_stats(conn)
+    print(f"deck_level_stats: {len(deck_level_stats)} deck/level rows")
+    links_report = None
+    if args.links:
+        with prof.stage("links", rows):
+            links_report = build_item_links(conn)
+        print(format_links_report(links_report))
+    dedup_report = None
+    if args.dedup:
+        with prof.stage("dedup"):
+            dedup_report = dedup_content(conn)
+        print(format_dedup_report(dedup_report))
+    if args.profile_table:
+        prof.write_table(conn, prof.to_dict())
     conn.close()
+
+    with prof.stage("finalize"):
+        size_report = finalize(out, args.page_size)
+    print(f"finalized: {format_report(size_report)}")
+    build_profile = None
+    if args.profile:
+        build_profile = prof.to_dict()
+        BuildProfile.write_json(Path(args.profile_out), build_profile)
+        print(BuildProfile.format(build_profile))
+        print(f"build profile written to {args.profile_out}")
+    if args.version_file:
+        write_version_file(
+            Path(args.version_file),
+            xls,
+            rows,
+            deck_level_stats,
+            media_summary,
+            size_report,
+            build_profile,
+            dedup_report,
+            errors,
+            links_report,
+        )
+    peak = peak_rss_mb()
+    if peak is not None:
+        print(f"peak RSS: {peak:.1f} MB")
+    if errors:
+        print(f"{len(errors)} 张 sheet 导入失败：{', '.join(e['sheet'] for e in errors)}", file=sys.stderr)
     print(f"OK -> {out}")
 
 if __name__ == "__main__":
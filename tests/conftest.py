@@ -0,0 +1,24 @@
+import csv
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+for sub in ('tooling', 'scripts'):
+    if str(ROOT / sub) not in sys.path:
+        sys.path.insert(0, str(ROOT / sub))
+
+from synthetic_corpus import write_csv  # noqa: E402
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A 1 000-row synthetic export, plus the same export with every tenth row removed."""
+    full = write_csv(tmp_path / 'src' / 'full.csv', 1000, manifest_path=ROOT / 'data' / 'data_manifest.json')
+    with open(full, encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    trimmed = tmp_path / 'src' / 'trimmed.csv'
+    with open(trimmed, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows[:1] + [r for i, r in enumerate(rows[1:]) if i % 10])
+    return full, trimmed
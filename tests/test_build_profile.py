@@ -0,0 +1,19 @@
+import hashlib
+import sqlite3
+
+from test_full_rebuild import build
+
+
+def test_profile_keeps_the_db_reproducible(corpus, tmp_path):
+    full, _ = corpus
+    digests = []
+    for i in (1, 2):
+        dest = tmp_path / f'out{i}' / 'content.sqlite'
+        out = tmp_path / f'profile{i}.json'
+        build(full, dest, '--bulk', '--profile', '--profile-out', str(out))
+        assert out.exists()
+        digests.append(hashlib.sha256(dest.read_bytes()).hexdigest())
+        conn = sqlite3.connect(dest)
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name='build_stats'").fetchone() is None
+        conn.close()
+    assert digests[0] == digests[1]
@@ -0,0 +1,55 @@
+import sqlite3
+from collections import Counter, defaultdict
+
+from content_stats import build_deck_level_stats, refresh_media_counts
+from test_full_rebuild import build
+
+
+def small_db():
+    conn = sqlite3.connect(':memory:')
+    conn.executescript('''
+      CREATE TABLE items(id INTEGER PRIMARY KEY, deck TEXT, level TEXT);
+      CREATE TABLE media(item_id INTEGER, type TEXT, path TEXT);
+    ''')
+    conn.executemany('INSERT INTO items VALUES(?,?,?)', [(1, 'A', 'N1'), (2, 'A', ' N1 '), (3, 'A', None), (4, 'B', '')])
+    conn.executemany(
+        'INSERT INTO media VALUES(?,?,?)',
+        [(1, 'audio', 'a.mp3'), (1, 'audio', 'b.mp3'), (1, 'image', 'c.png'), (3, 'image', 'd.png')],
+    )
+    return conn
+
+
+def test_counts_and_stats_on_a_small_db():
+    conn = small_db()
+    refresh_media_counts(conn)
+    assert conn.execute('SELECT id, audio_count, image_count FROM items ORDER BY id').fetchall() == [
+        (1, 2, 1), (2, 0, 0), (3, 0, 1), (4, 0, 0)
+    ]
+    rows = build_deck_level_stats(conn)
+    assert [tuple(r.values()) for r in rows] == [('A', '', 1, 0, 1), ('A', 'N1', 2, 1, 1), ('B', '', 1, 0, 0)]
+
+    conn.execute("INSERT INTO media VALUES(2, 'audio', 'e.mp3')")
+    conn.execute("UPDATE items SET deck='B' WHERE id=3")
+    refresh_media_counts(conn, [2, 3])
+    rows = build_deck_level_stats(conn, [('A', 'N1'), ('A', None), ('B', None)])
+    assert [tuple(r.values()) for r in rows] == [('A', 'N1', 2, 2, 1), ('B', '', 2, 0, 1)]
+
+
+def test_built_counts_match_the_media_table(corpus, tmp_path):
+    full, _ = corpus
+    dest = tmp_path / 'out' / 'content.sqlite'
+    build(full, dest)
+    conn = sqlite3.connect(dest)
+    media = Counter(conn.execute('SELECT item_id, type FROM media'))
+    items = conn.execute('SELECT id, deck, level, audio_count, image_count FROM items').fetchall()
+    assert sum(a + i for *_, a, i in items) == sum(media.values()) > 0
+    for item_id, _, _, audio, image in items:
+        assert (audio, image) == (media[item_id, 'audio'], media[item_id, 'image'])
+    want = defaultdict(Counter)
+    for _, deck, level, audio, image in items:
+        want[deck, (level or '').strip(' ')].update(item_count=1, audio_items=audio > 0, image_items=image > 0)
+    stats = conn.execute('SELECT deck, level, item_count, audio_items, image_items FROM deck_level_stats').fetchall()
+    assert {(d, lv): (n, a, i) for d, lv, n, a, i in stats} == {
+        k: (c['item_count'], c['audio_items'], c['image_items']) for k, c in want.items()
+    }
+    conn.close()
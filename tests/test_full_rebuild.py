@@ -0,0 +1,42 @@
+import sqlite3
+
+import build_sqlite_from_csv
+
+ID_TABLES = [
+    ('search_grams', 'item_id'),
+    ('media', 'item_id'),
+    ('item_links', 'item_id'),
+    ('item_links', 'related_id'),
+]
+
+
+def build(src, dest, *extra):
+    args = ['--src', str(src), '--dest', str(dest), '--version-file', str(dest.parent / 'db_version.txt')]
+    args += ['--changes-out', str(dest.parent / 'db_changes.json')]
+    build_sqlite_from_csv.main([*args, *extra])
+
+
+def orphans(dest) -> dict:
+    conn = sqlite3.connect(dest)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    out = {
+        f'{table}.{column}': conn.execute(
+            f'SELECT COUNT(*) FROM {table} WHERE {column} NOT IN (SELECT id FROM items)'
+        ).fetchone()[0]
+        for table, column in ID_TABLES
+        if table in tables
+    }
+    conn.close()
+    return out
+
+
+def test_full_rebuild_leaves_no_orphan_ids(corpus, tmp_path):
+    full, trimmed = corpus
+    dest = tmp_path / 'out' / 'content.sqlite'
+    build(full, dest, '--search-grams', '--links')
+    build(trimmed, dest)
+    found = orphans(dest)
+    assert not any(found.values()), found
+    build(full, dest)
+    found = orphans(dest)
+    assert not any(found.values()), found
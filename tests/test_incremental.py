@@ -0,0 +1,77 @@
+import csv
+import random
+import sqlite3
+
+from test_full_rebuild import build
+
+DERIVED = {
+    'items': 'SELECT id, deck, level, term, reading, meaning, search_text, src_key, audio_count, image_count, '
+    'shuffle_key, term_key, reading_key FROM items ORDER BY id',
+    'media': 'SELECT m.item_id, m.type, m.path, p.rel_path FROM media m JOIN media_paths p ON p.id = m.path_id '
+    'ORDER BY 1, 2, 3',
+    'media_paths': 'SELECT rel_path, size, mtime, file_exists, content_hash FROM media_paths ORDER BY 1',
+    'search_grams': 'SELECT gram, item_id FROM search_grams ORDER BY 1, 2',
+    'item_links': 'SELECT item_id, related_id, kind FROM item_links ORDER BY 1, 2, 3',
+    'deck_level_stats': 'SELECT * FROM deck_level_stats ORDER BY 1, 2',
+}
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+
+def write_rows(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def with_diff_terms(rows, rng):
+    """Turn some 词汇辨析 rows into ``主题 ~ A vs ~ B`` terms built from other rows' terms."""
+    col = rows[0].index('词汇')
+    terms = [r[rows[0].index('汉字/外文')] for r in rows[1:] if r[rows[0].index('汉字/外文')]]
+    for r in [r for r in rows[1:] if r[0] == '词汇辨析'][:20]:
+        a, b, c = rng.sample(terms, 3)
+        r[col] = f'{a} ~ {b} vs ~ {c}'
+    return rows
+
+
+def edit(rows, rng):
+    header, body = rows[0], rows[1:]
+    term, level, row_index = header.index('汉字/外文'), header.index('级别'), header.index('row_index')
+    terms = [r[term] for r in body if r[term]]
+    for r in rng.sample(body, 40):
+        r[term] = rng.choice(terms)
+    for r in rng.sample(body, 10):
+        r[level] = rng.choice(['N1', 'N3', ''])
+    body = [r for i, r in enumerate(body) if i % 37]
+    for n in range(10):
+        r = list(rng.choice(body))
+        r[row_index] = str(90000 + n)
+        r[term] = rng.choice(terms)
+        body.append(r)
+    return [header] + body
+
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    out = {name: conn.execute(sql).fetchall() for name, sql in DERIVED.items()}
+    conn.close()
+    return out
+
+
+def test_incremental_refresh_matches_a_full_build(corpus, tmp_path):
+    full, _ = corpus
+    rng = random.Random(5)
+    rows = with_diff_terms(read_rows(full), rng)
+    base = write_rows(tmp_path / 'src' / 'base.csv', rows)
+    edited = write_rows(tmp_path / 'src' / 'edited.csv', edit(rows, rng))
+    ids = str(tmp_path / 'item_ids.json')
+    dest = tmp_path / 'inc' / 'content.sqlite'
+    build(base, dest, '--bulk', '--id-map', ids, '--links', '--search-grams', '--dedup')
+    assert dump(dest)['item_links']
+    build(edited, dest, '--incremental', '--id-map', ids)
+    fresh = tmp_path / 'full' / 'content.sqlite'
+    build(edited, fresh, '--bulk', '--id-map', ids, '--links', '--search-grams', '--dedup')
+    assert dump(dest) == dump(fresh)
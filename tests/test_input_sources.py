@@ -0,0 +1,35 @@
+import json
+
+import input_sources
+from input_sources import select_source
+
+
+def write_manifest(tmp_path, *names):
+    files = {'csv': 'export.csv', 'jsonl': 'export.jsonl'}
+    for name in names:
+        (tmp_path / files[name]).write_text('', encoding='utf-8')
+    manifest = tmp_path / 'data_manifest.json'
+    manifest.write_text(json.dumps({'format': files}), encoding='utf-8')
+    return manifest
+
+
+def test_auto_prefers_csv_over_jsonl(tmp_path, monkeypatch):
+    monkeypatch.setattr(input_sources, 'have_pyarrow', lambda: False)
+    manifest = write_manifest(tmp_path, 'csv', 'jsonl')
+    assert select_source(manifest) == (tmp_path / 'export.csv', 'csv')
+    assert select_source(manifest, 'jsonl') == (tmp_path / 'export.jsonl', 'jsonl')
+
+
+def test_auto_falls_back_to_jsonl(tmp_path, monkeypatch):
+    monkeypatch.setattr(input_sources, 'have_pyarrow', lambda: False)
+    manifest = write_manifest(tmp_path, 'jsonl')
+    assert select_source(manifest) == (tmp_path / 'export.jsonl', 'jsonl')
+
+
+def test_auto_prefers_columnar_exports(tmp_path):
+    manifest = write_manifest(tmp_path, 'csv', 'jsonl')
+    (tmp_path / 'export.parquet').write_bytes(b'')
+    if input_sources.have_pyarrow():
+        assert select_source(manifest) == (tmp_path / 'export.parquet', 'parquet')
+    else:
+        assert select_source(manifest) == (tmp_path / 'export.csv', 'csv')
@@ -0,0 +1,78 @@
+import sqlite3
+
+from item_links import MAX_LINKS, RELATED_SQL, Item, build_item_links, diff_sides
+from text_keys import normalize_key, refresh_text_keys
+
+ITEMS = [
+    (1, '红宝书', '食べる', 'たべる'),
+    (2, '蓝宝书', '食べる', 'タベル'),
+    (3, '红宝书', 'たべる', ''),
+    (4, '日语汉字', '食', 'しょく'),
+    (5, '红宝书', '飲む', 'のむ'),
+    (6, '词汇辨析', '食事 ~ 食べる vs ~ 飲む', ''),
+    (7, '红宝书', '食事', 'しょくじ'),
+    (8, '红宝书', 'ｶﾀｶﾅ', ''),
+    (9, '蓝宝书', 'カタカナ', ''),
+]
+
+
+def links_db(items):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE items(id INTEGER PRIMARY KEY, deck TEXT, level TEXT, term TEXT, reading TEXT)')
+    conn.executemany('INSERT INTO items(id, deck, term, reading) VALUES(?,?,?,?)', items)
+    return conn
+
+
+def links(conn, kind=None):
+    rows = conn.execute('SELECT item_id, related_id, kind FROM item_links ORDER BY 1, 2').fetchall()
+    return {(a, b) for a, b, k in rows if kind is None or k == kind}
+
+
+def test_diff_sides():
+    assert diff_sides('食事 ~ 食べる vs ~ 飲む') == (['食事'], [['食べる'], ['飲む']])
+    assert diff_sides('がおわる vs. をおわる') == ([], [['がおわる'], ['をおわる']])
+    assert diff_sides('食べる') is None
+
+
+def test_link_kinds():
+    conn = links_db(ITEMS)
+    report = build_item_links(conn)
+    assert report['items'] == len(ITEMS) and report['rows'] == len(links(conn))
+    assert links(conn, 'term') == {(1, 2), (2, 1), (8, 9), (9, 8)}
+    assert links(conn, 'reading') >= {(1, 3), (3, 1), (2, 3), (3, 2)}
+    assert (1, 2) not in links(conn, 'reading')
+    assert links(conn, 'kanji') >= {(4, 1), (1, 4), (4, 7), (7, 4), (4, 6)}
+    assert (5, 4) not in links(conn, 'kanji')
+    assert links(conn, 'diff') == {
+        (6, 1), (1, 6), (6, 2), (2, 6), (6, 5), (5, 6), (6, 7), (7, 6), (1, 5), (2, 5), (5, 1), (5, 2)
+    }
+    related = conn.execute(RELATED_SQL, (6, 50)).fetchall()
+    assert {r[1] for r in related} == {1, 2, 4, 5, 7}
+
+
+def test_links_are_capped_and_prefer_other_decks():
+    n = MAX_LINKS * 3
+    conn = links_db([(i, '红宝书' if i > 1 else '蓝宝书', '同じ', '') for i in range(1, n + 1)])
+    build_item_links(conn)
+    rows = conn.execute("SELECT item_id, COUNT(*) FROM item_links WHERE kind='term' GROUP BY 1").fetchall()
+    assert len(rows) == n and all(c == MAX_LINKS for _, c in rows)
+    assert all((i, 1) in links(conn, 'term') for i in range(2, n + 1))
+
+
+def test_incremental_relink_matches_a_full_build():
+    conn = links_db(ITEMS)
+    build_item_links(conn)
+    old = conn.execute('SELECT id, deck, term, reading FROM items WHERE id IN (5, 7)').fetchall()
+    before = [Item(i, d, t, normalize_key(t), normalize_key(r)) for i, d, t, r in old]
+    conn.execute("UPDATE items SET term='走る', reading='はしる' WHERE id=5")
+    conn.execute('DELETE FROM items WHERE id=7')
+    conn.execute("INSERT INTO items(id, deck, term, reading) VALUES(10, '蓝宝书', '走る', 'はしる')")
+    refresh_text_keys(conn, [5, 10])
+    report = build_item_links(conn, [5, 7, 10], before)
+    assert report['relinked'] < len(ITEMS)
+    fresh = links_db(conn.execute('SELECT id, deck, term, reading FROM items').fetchall())
+    build_item_links(fresh)
+    assert links(conn) == links(fresh)
+    assert conn.execute('SELECT * FROM item_links ORDER BY 1, 2, 3').fetchall() == fresh.execute(
+        'SELECT * FROM item_links ORDER BY 1, 2, 3'
+    ).fetchall()
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import sqlite3
+
+import pytest
+
+from media_resolver import rel_media_path, resolve_media
+
+
+@pytest.mark.parametrize(
+    'raw,rel',
+    [
+        ('F:\\资料\\にほんご\\《B词汇·红宝书》\\audio\\1.mp3', '《B词汇·红宝书》/audio/1.mp3'),
+        ('/sdcard/にほんご/img/a.png', 'img/a.png'),
+        ('D:\\other\\x.mp3', 'other/x.mp3'),
+        ('d:/other/x.mp3', 'other/x.mp3'),
+        ('//server/share/x.mp3', 'server/share/x.mp3'),
+        ('  audio/x.mp3  ', 'audio/x.mp3'),
+        ('', ''),
+        (None, ''),
+    ],
+)
+def test_rel_media_path_follows_the_app(raw, rel):
+    assert rel_media_path(raw) == rel
+
+
+def media_db(paths):
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE media(id INTEGER PRIMARY KEY, item_id INTEGER, type TEXT, path TEXT)')
+    rows = [(i // 2, 'audio', p) for i, p in enumerate(paths)]
+    conn.executemany('INSERT INTO media(item_id, type, path) VALUES(?,?,?)', rows)
+    return conn
+
+
+def stored_hash(conn, media_id):
+    return conn.execute('SELECT content_hash FROM media WHERE id=?', (media_id,)).fetchone()[0]
+
+
+def test_resolve_media_against_a_media_root(tmp_path):
+    root = tmp_path / 'にほんご'
+    (root / 'a').mkdir(parents=True)
+    (root / 'a' / '1.mp3').write_bytes(b'one')
+    (root / 'a' / '2.mp3').write_bytes(b'two!')
+    conn = media_db(['F:\\x\\にほんご\\a\\1.mp3', 'F:\\y\\にほんご\\a\\1.mp3', 'C:\\にほんご\\a\\2.mp3', 'C:\\にほんご\\b\\3.mp3'])
+
+    summary = resolve_media(conn, root, workers=2)
+    assert (summary['media_rows'], summary['distinct_files'], summary['found']) == (4, 3, 2)
+    assert summary['missing'] == ['b/3.mp3'] and summary['bytes'] == 7
+    rows = conn.execute('SELECT rel_path, size, file_exists, content_hash FROM media ORDER BY id').fetchall()
+    assert rows == [
+        ('a/1.mp3', 3, 1, hashlib.sha256(b'one').hexdigest()),
+        ('a/1.mp3', 3, 1, hashlib.sha256(b'one').hexdigest()),
+        ('a/2.mp3', 4, 1, hashlib.sha256(b'two!').hexdigest()),
+        ('b/3.mp3', None, 0, None),
+    ]
+
+    # 大小和 mtime 都没变：沿用上次的哈希；mtime 变了才重新哈希
+    path = root / 'a' / '2.mp3'
+    st = path.stat()
+    path.write_bytes(b'TWO!')
+    os.utime(path, (st.st_atime, st.st_mtime))
+    resolve_media(conn, root)
+    assert stored_hash(conn, 3) == hashlib.sha256(b'two!').hexdigest()
+    os.utime(path, (st.st_atime, st.st_mtime + 10))
+    resolve_media(conn, root)
+    assert stored_hash(conn, 3) == hashlib.sha256(b'TWO!').hexdigest()
+
+
+def test_resolve_media_scoped_to_items():
+    conn = media_db(['C:\\にほんご\\a.mp3', 'C:\\にほんご\\b.mp3', 'C:\\にほんご\\c.mp3'])
+    resolve_media(conn)
+    conn.execute("UPDATE media SET path='C:\\にほんご\\z.mp3'")
+    summary = resolve_media(conn, item_ids=[1])
+    assert summary == {'media_rows': 3, 'distinct_files': 1}
+    assert [r[0] for r in conn.execute('SELECT rel_path FROM media ORDER BY id')] == ['a.mp3', 'b.mp3', 'z.mp3']
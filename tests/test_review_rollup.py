@@ -0,0 +1,60 @@
+import sqlite3
+
+from app_schema import USER_TABLES_SQL
+from replay_queries import stats_days
+from review_rollup import ROLLUP_STATS_SQL, archive_log, install_trigger, main, refresh_rollup, verify_rollup
+
+TODAY = 20000
+
+
+def user_db(path, days=200, per_day=5):
+    conn = sqlite3.connect(path)
+    conn.executescript(USER_TABLES_SQL)
+    rows = [(i % 37, TODAY - d, 1 + i % 4, (TODAY - d) * 86400 + i) for d in range(days) for i in range(per_day)]
+    with conn:
+        conn.executemany('INSERT INTO review_log(item_id, day, grade, ts) VALUES(?,?,?,?)', rows)
+    conn.close()
+    return path
+
+
+def snapshot(path):
+    conn = sqlite3.connect(path)
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")]
+    log = conn.execute('SELECT * FROM review_log ORDER BY id').fetchall()
+    conn.close()
+    return tables, log
+
+
+def test_bench_leaves_the_db_unchanged(tmp_path, capsys):
+    db = user_db(tmp_path / 'user.sqlite')
+    before = snapshot(db)
+    main([str(db), '--today', str(TODAY), '--bench', '--runs', '2', '--archive-days', '90', '--trigger'])
+    assert 'archived 550 rows' in capsys.readouterr().out
+    assert snapshot(db) == before
+
+
+def test_rollup_matches_a_fresh_aggregate_after_the_trigger_fires(tmp_path):
+    conn = sqlite3.connect(user_db(tmp_path / 'user.sqlite'))
+    assert refresh_rollup(conn)['mode'] == 'full'
+    assert archive_log(conn, 60, TODAY)['moved'] == 700
+    install_trigger(conn)
+    new = [
+        (1, TODAY, 3), (1, TODAY, 1), (2, TODAY, 4), (99, TODAY, 2),  # 同一天同一 item 两次
+        (5, TODAY - 3, 1), (98, TODAY - 3, 3),  # 已汇总过的日子
+        (7, TODAY + 1, 4),  # 新的一天
+    ]
+    with conn:
+        for item_id, day, grade in new:
+            conn.execute(
+                'INSERT INTO review_log(item_id, day, grade, ts) VALUES(?,?,?,?)', (item_id, day, grade, day * 86400)
+            )
+    assert verify_rollup(conn) == []
+    assert conn.execute('SELECT * FROM review_daily WHERE day=?', (TODAY + 1,)).fetchone() == (TODAY + 1, 0, 0, 0, 1, 1)
+    for today in (TODAY, TODAY + 1):
+        sql, args = stats_days(today)
+        assert conn.execute(ROLLUP_STATS_SQL, args).fetchall() == conn.execute(sql, args).fetchall()
+
+    report = refresh_rollup(conn)
+    assert (report['mode'], report['new_rows'], report['days']) == ('incremental', len(new), 3)
+    assert verify_rollup(conn) == []
+    conn.close()
@@ -0,0 +1,42 @@
+import random
+import sqlite3
+
+from search_grams import build_gram_query, query_grams, search, text_grams
+from test_full_rebuild import build
+
+
+def like(conn, q, deck=None):
+    sql, args = 'SELECT id FROM items WHERE search_text LIKE ?', [f'%{q}%']
+    if deck is not None:
+        sql, args = sql + ' AND deck=?', args + [deck]
+    return [r[0] for r in conn.execute(sql + ' ORDER BY id DESC LIMIT 1000', args)]
+
+
+def test_text_and_query_grams():
+    assert text_grams('学習 ABC12') == {'学', '習', '学習', 'abc12'}
+    assert query_grams('学') == (['学'], [])
+    assert query_grams('日本語 Ab') == (['日本', '本語'], ['ab'])
+    assert query_grams('～ 。') == ([], [])
+
+
+def test_substring_queries_hit_the_same_items_as_like(corpus, tmp_path):
+    full, _ = corpus
+    dest = tmp_path / 'out' / 'content.sqlite'
+    build(full, dest, '--search-grams')
+    conn = sqlite3.connect(dest)
+    rng = random.Random(3)
+    texts = [r[0] for r in conn.execute('SELECT search_text FROM items')]
+    queries = ['練', '经验', '话题']
+    for text in rng.sample(texts, 30):
+        i = rng.randrange(len(text) - 3)
+        queries.append(text[i:i + rng.choice([2, 3, 4])])
+    for q in queries:
+        if build_gram_query(q, conn=conn) is None:
+            continue
+        assert search(conn, q, limit=1000) == like(conn, q), q
+        assert search(conn, q, deck='蓝宝书', limit=1000) == like(conn, q, '蓝宝书'), q
+    assert search(conn, '经验', limit=1000)
+    assert search(conn, '蓝宝书', limit=5, offset=5) == like(conn, '蓝宝书')[5:10]
+    hits = search(conn, 'n4', limit=1000)
+    assert hits and set(hits) <= set(like(conn, 'N4'))
+    conn.close()
@@ -0,0 +1,37 @@
+import json
+import sqlite3
+
+from shard_db import MANIFEST_NAME, shard_name, verify
+from test_full_rebuild import build
+from test_incremental import read_rows, write_rows
+
+
+def manifest(shards):
+    data = json.loads((shards / MANIFEST_NAME).read_text(encoding='utf-8'))
+    return {s['deck']: s['sha256'] for s in data['shards']}, data['delta']
+
+
+def test_only_the_edited_deck_gets_a_new_shard(corpus, tmp_path):
+    full, _ = corpus
+    rows = read_rows(full)
+    ids = str(tmp_path / 'item_ids.json')
+    shards = tmp_path / 'shards'
+    dest = tmp_path / 'out' / 'content.sqlite'
+    build(full, dest, '--bulk', '--id-map', ids, '--search-grams', '--shards', str(shards))
+    before, delta = manifest(shards)
+    assert len(before) > 2 and not delta['unchanged']
+    assert verify(shards / MANIFEST_NAME, dest) == []
+
+    row = next(r for r in rows[1:] if r[0] == '红宝书')
+    row[2:] = [f'{v}改' if v and v != 'nan' else v for v in row[2:]]
+    edited = write_rows(tmp_path / 'src' / 'edited.csv', rows)
+    build(edited, dest, '--incremental', '--id-map', ids, '--shards', str(shards))
+    after, delta = manifest(shards)
+    assert delta['changed'] == [shard_name('红宝书')] and not delta['added'] and not delta['removed']
+    assert {deck for deck in before if before[deck] != after[deck]} == {'红宝书'}
+    assert len(delta['unchanged']) == len(before) - 1
+    assert verify(shards / MANIFEST_NAME, dest) == []
+    conn = sqlite3.connect(shards / shard_name('红宝书'))
+    assert conn.execute("SELECT COUNT(*) FROM items WHERE search_text LIKE '%改%'").fetchone()[0] == 1
+    assert conn.execute('SELECT COUNT(DISTINCT deck) FROM items').fetchone()[0] == 1
+    conn.close()
@@ -0,0 +1,51 @@
+import random
+import sqlite3
+from collections import Counter, defaultdict
+
+from shuffle_keys import random_window
+from test_full_rebuild import build
+
+
+def keys(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute('SELECT id, deck, level, shuffle_key FROM items').fetchall()
+    conn.close()
+    groups = defaultdict(dict)
+    for item_id, deck, level, key in rows:
+        groups[deck, level][item_id] = key
+    return groups
+
+
+def test_shuffle_keys_are_stable_across_rebuilds(corpus, tmp_path):
+    full, trimmed = corpus
+    a, b, c = (tmp_path / name / 'content.sqlite' for name in ('a', 'b', 'c'))
+    build(full, a)
+    build(full, b, '--bulk')
+    build(trimmed, c)
+    first, trimmed_keys = keys(a), keys(c)
+    assert keys(b) == first
+    for group, members in first.items():
+        assert sorted(members.values()) == list(range(len(members))), group
+        kept = trimmed_keys.get(group, {})
+        assert sorted(kept.values()) == list(range(len(kept))), group
+        # 删掉条目后幸存者的相对顺序不变
+        assert sorted(kept, key=members.get) == sorted(kept, key=kept.get), group
+
+
+def test_random_window_draws_every_item_evenly(corpus, tmp_path):
+    full, _ = corpus
+    dest = tmp_path / 'out' / 'content.sqlite'
+    build(full, dest)
+    conn = sqlite3.connect(dest)
+    deck, level, size = conn.execute(
+        'SELECT deck, level, COUNT(*) FROM items WHERE level IS NOT NULL GROUP BY 1, 2 ORDER BY 3 DESC'
+    ).fetchone()
+    rng = random.Random(1)
+    seen = Counter()
+    for _ in range(400):
+        ids = random_window(conn, deck, level, 10, rng)
+        assert len(ids) == len(set(ids)) == 10
+        seen.update(ids)
+    assert len(seen) == size
+    assert max(seen.values()) < 3 * 4000 / size
+    conn.close()
@@ -0,0 +1,123 @@
+import math
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+import pytest
+
+from srs_forecast import (
+    GOLDEN,
+    GRADES,
+    Sm2Params,
+    SrsUpdate,
+    dart_round,
+    dart_round_array,
+    self_check,
+    sm2_update,
+    sm2_update_arrays,
+)
+
+
+def dart_sm2(today, ease, interval_days, reps, lapses, grade):
+    """``sm2Update`` from ``lib/db.dart`` transcribed as-is; ``.round()`` via exact decimal half-away-from-zero."""
+    e = ease
+    interval = interval_days
+    r = reps
+    l = lapses  # noqa: E741
+    if grade <= 1:
+        l += 1
+        r = 0
+        interval = 0
+    else:
+        r += 1
+        q = grade + 1
+        e = e + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+        if e < 1.3:
+            e = 1.3
+        if r == 1:
+            interval = 1
+        elif r == 2:
+            interval = 3
+        else:
+            mult = 1.2 if grade == 2 else (e if grade == 3 else e * 1.3)
+            interval = int(Decimal(interval * mult).to_integral_value(rounding=ROUND_HALF_UP))
+            if interval < 1:
+                interval = 1
+    return (e, interval, r, l, today + interval, 1 if grade <= 1 else 2)
+
+
+def as_tuple(update):
+    return tuple(v.item() if hasattr(v, 'item') else v for v in update)
+
+
+def same(got, want):
+    return all(
+        math.isclose(g, w, rel_tol=0, abs_tol=1e-12) if isinstance(w, float) else g == w for g, w in zip(got, want)
+    )
+
+
+@pytest.mark.parametrize('args,want', GOLDEN)
+def test_golden_cases(args, want):
+    assert same(sm2_update(*args), want)
+    assert same(as_tuple(a[0] for a in sm2_update_arrays(*(np.array([v]) for v in args))), want)
+    assert same(dart_sm2(*args), want)
+
+
+@pytest.mark.parametrize('grade', GRADES)
+def test_every_grade_from_a_mature_card(grade):
+    args = (200, 2.5, 20, 4, 1, grade)
+    assert sm2_update(*args) == SrsUpdate(*dart_sm2(*args))
+
+
+def test_lapse_resets_the_card_and_keeps_ease():
+    got = sm2_update(300, 2.2, 45, 7, 2, 1)
+    assert got == SrsUpdate(2.2, 0, 0, 3, 300, 1)
+
+
+def test_ease_floor():
+    assert sm2_update(0, 1.3, 10, 5, 0, 2).ease == 1.3
+    assert sm2_update(0, 1.35, 10, 5, 0, 2).ease == 1.3
+    assert sm2_update(0, 1.5, 10, 5, 0, 2, Sm2Params(min_ease=1.4)).ease == 1.4
+    e, *_ = sm2_update_arrays(0, np.array([1.3, 1.35]), np.array([10, 10]), np.array([5, 5]), 0, np.array([2, 2]))
+    assert e.tolist() == [1.3, 1.3]
+
+
+@pytest.mark.parametrize(
+    'x,want',
+    [
+        (0.5, 1),
+        (1.5, 2),
+        (2.5, 3),
+        (6.5, 7),
+        (-0.5, -1),
+        (-2.5, -3),
+        (2.4999999999999996, 2),
+        (-2.4999999999999996, -2),
+        (0.49999999999999994, 0),
+        (0.0, 0),
+    ],
+)
+def test_dart_round_halves_away_from_zero(x, want):
+    assert dart_round(x) == want
+    assert dart_round_array(np.array([x])).tolist() == [want]
+
+
+def test_arrays_match_the_dart_transcription():
+    rng = np.random.default_rng(11)
+    n = 20000
+    today = rng.integers(19000, 21000, n)
+    ease = rng.uniform(1.3, 3.2, n)
+    ease[::2] = np.round(ease[::2], 2)
+    interval = rng.integers(0, 400, n)
+    interval[:500] = 5  # 5 × 1.3 = 6.5：.5 边界
+    ease[:500] = 1.3
+    reps = rng.integers(0, 12, n)
+    lapses = rng.integers(0, 6, n)
+    grade = rng.integers(1, 5, n)
+    arrays = sm2_update_arrays(today, ease, interval, reps, lapses, grade)
+    for i in range(n):
+        args = (int(today[i]), float(ease[i]), int(interval[i]), int(reps[i]), int(lapses[i]), int(grade[i]))
+        assert tuple(a[i].item() for a in arrays) == dart_sm2(*args), args
+
+
+def test_self_check_passes():
+    assert self_check(samples=2000) == []
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import build_db
+
+PATH = 'F:\\\\资料\\\\にほんご\\\\《日本语句型辞典》\\\\{}.png'
+
+# 表头比数据窄：pandas 把多出来的列命名为 "Unnamed: i"，按位置取列的 handler 依赖这些列
+SHEETS = {
+    '《日本语句型辞典》': [
+        ['页码', '路径', 'あか'],
+        [1, PATH.format(1), 'けいさ'],
+        [2, PATH.format(2), 'あさ', None, 'tail2'],
+        [3, PATH.format(3), 'いか'],
+        [4, PATH.format(4), None, 'mid'],
+    ],
+    '词汇辨析': [
+        ['书名', '路径'],
+        ['《疑难辨析》', PATH.format(5)],
+        ['《疑难辨析》', PATH.format(6), '上がる vs 上る'],
+        ['《疑难辨析》', PATH.format(7), '話す vs 言う', None],
+    ],
+}
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, rows in SHEETS.items():
+        ws = wb.create_sheet(name)
+        for row in rows:
+            ws.append(row)
+    path = tmp_path / 'book.xlsx'
+    wb.save(path)
+    return path
+
+
+@pytest.mark.parametrize('chunk_rows', [1, 2, 100])
+@pytest.mark.parametrize('sheet', list(SHEETS))
+def test_stream_frames_match_read_excel(workbook, sheet, chunk_rows):
+    handler = dict(build_db.SHEET_HANDLERS)[sheet]
+    expected = handler(pd.read_excel(workbook, sheet_name=sheet))
+
+    reader = build_db.RowReader(workbook)
+    try:
+        width, path_col = build_db.stream_sheet_shape(reader, sheet, chunk_rows)
+        frames = list(reader.frames(sheet, chunk_rows, width))
+    finally:
+        reader.close()
+    assert [list(f.columns) for f in frames] == [list(pd.read_excel(workbook, sheet_name=sheet).columns)] * len(frames)
+    got = pd.concat([handler(f, path_col=path_col) for f in frames], ignore_index=True)
+    assert got.to_dict('records') == expected.to_dict('records')
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from text_keys import normalize_key, prefix_query, refresh_text_keys
+
+
+@pytest.mark.parametrize(
+    'text,key',
+    [
+        ('カタカナ', 'かたかな'),
+        ('ｶﾀｶﾅ', 'かたかな'),
+        ('ｶﾞｯｺｳ', 'がっこう'),
+        ('ヴァイオリン', 'ゔぁいおりん'),
+        ('ヽヾ', 'ゝゞ'),
+        ('ヷ', 'ヷ'),
+        ('ＡＢＣ１２３', 'abc123'),
+        ('Straße', 'strasse'),
+        ('  食べ　る\t\nこと ', '食べ る こと'),
+        ('', ''),
+        (None, ''),
+    ],
+)
+def test_normalize_key_folds_kana_width_and_case(text, key):
+    assert normalize_key(text) == key
+
+
+def test_prefix_query_finds_katakana_and_fullwidth_entries():
+    conn = sqlite3.connect(':memory:')
+    conn.execute('CREATE TABLE items(id INTEGER PRIMARY KEY, deck TEXT, term TEXT, reading TEXT)')
+    conn.executemany(
+        'INSERT INTO items VALUES(?,?,?,?)',
+        [(1, 'A', 'テスト', ''), (2, 'A', '試験', 'しけん'), (3, 'B', 'ＴＶ番組', 'ﾃﾚﾋﾞばんぐみ'), (4, 'A', '100%', '')],
+    )
+    assert refresh_text_keys(conn) == 4
+    assert conn.execute('SELECT term_key, reading_key FROM items WHERE id=3').fetchone() == ('tv番組', 'てれびばんぐみ')
+
+    def ids(q, deck=None):
+        sql, args = prefix_query(q, deck)
+        return [r[0] for r in conn.execute(sql, args)]
+
+    assert ids('てす') == [1]
+    assert ids('シケ') == [2]
+    assert ids('tv') == ids('ＴＶ') == [3]
+    assert ids('テレビ', deck='A') == []
+    assert ids('100%') == [4]
+    assert ids('10_') == []
+    assert prefix_query('　') is None
+    sql, args = prefix_query('てす')
+    plan = ' '.join(r[-1] for r in conn.execute(f'EXPLAIN QUERY PLAN {sql}', args))
+    assert 'idx_items_term_key' in plan and 'idx_items_reading_key' in plan
@@ -0,0 +1,38 @@
+"""SQL the app runs on the device (``lib/db.dart``), shared by the builders and the tools.
+
+``ensureUserTables`` 建学习进度表，``ensureContentIndexes`` 给内置词库补索引；改动 ``lib/db.dart`` 时同步这里。
+"""
+
+# lib/db.dart: ensureUserTables
+USER_TABLES_SQL = '''
+CREATE TABLE IF NOT EXISTS srs(
+  item_id INTEGER PRIMARY KEY,
+  deck TEXT,
+  level TEXT,
+  state INTEGER NOT NULL DEFAULT 0,
+  ease REAL NOT NULL DEFAULT 2.5,
+  interval_days INTEGER NOT NULL DEFAULT 0,
+  due_day INTEGER NOT NULL DEFAULT 0,
+  reps INTEGER NOT NULL DEFAULT 0,
+  lapses INTEGER NOT NULL DEFAULT 0,
+  last_review_day INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS review_log(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id INTEGER NOT NULL,
+  day INTEGER NOT NULL,
+  grade INTEGER NOT NULL,
+  ts INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_day ON review_log(day);
+CREATE INDEX IF NOT EXISTS idx_srs_due ON srs(due_day);
+CREATE INDEX IF NOT EXISTS idx_srs_deck_level ON srs(deck, level);
+'''
+
+# lib/db.dart: ensureContentIndexes
+CONTENT_INDEXES_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_items_deck_level ON items(deck, level);
+CREATE INDEX IF NOT EXISTS idx_items_term ON items(term);
+CREATE INDEX IF NOT EXISTS idx_items_search_text ON items(search_text);
+CREATE INDEX IF NOT EXISTS idx_media_item ON media(item_id);
+'''
@@ -0,0 +1,167 @@
+"""Benchmark ``tooling/build_sqlite_from_csv.py`` on synthetic corpora at 1×, 10× and 100× scale.
+
+    python tooling/bench_builders.py --scales 1x,10x --out bench.json
+    python tooling/bench_builders.py --scales 1x,10x --baseline bench.json   # 与基线比较，退化时退出码为 1
+    python tooling/bench_builders.py --scales 10x --input-format parquet     # 先转成 Parquet 再构建（需要 pyarrow）
+"""
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import shlex
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from input_sources import DEFAULT_SUFFIX, FORMATS, convert
+from synthetic_corpus import MANIFEST, write_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+BUILDER = ROOT / 'tooling' / 'build_sqlite_from_csv.py'
+SCALES = {'1x': 32000, '10x': 320000, '100x': 3200000}
+# 与基线比较的指标：越大越差的为 True
+METRICS = {'seconds': True, 'peak_rss_mb': True, 'db_bytes': True, 'rows_per_sec': False}
+
+
+def run_build(src_path: Path, workdir: Path, scale: str, builder_args: List[str]) -> Dict[str, object]:
+    dest = workdir / f'bench_{scale}.sqlite'
+    version = workdir / f'bench_{scale}_version.json'
+    # id 表也按规模隔离并每次删掉：否则后面的运行会走按 id 表分配的路径，与基线不可比
+    id_map = workdir / f'bench_{scale}_ids.json'
+    for p in (dest, version, id_map):
+        if p.exists():
+            p.unlink()
+    cmd = [sys.executable, str(BUILDER), '--src', str(src_path), '--dest', str(dest), '--id-map', str(id_map),
+           '--version-file', str(version), '--changes-out', str(workdir / f'bench_{scale}_changes.json'),
+           '--profile', '--profile-out', str(workdir / f'bench_{scale}_profile.json')]
+    cmd += builder_args
+    log = workdir / f'bench_{scale}.log'
+    with log.open('wb') as out:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT)
+        # wait4 给出这个子进程（及其已回收的 worker）的 rusage，多个规模依次跑也互不影响
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        tail = log.read_text(encoding='utf-8', errors='replace')[-4000:]
+        raise SystemExit(f'builder failed at {scale} (exit {proc.returncode}), see {log}:\n{tail}')
+
+    meta = json.loads(version.read_text(encoding='utf-8'))
+    conn = sqlite3.connect(dest)
+    items = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+    conn.close()
+    rss = usage.ru_maxrss / 1024 / 1024 if sys.platform == 'darwin' else usage.ru_maxrss / 1024
+    rows = meta['rows']
+    profile = meta.get('build_profile', {})
+    return {
+        'scale': scale,
+        'csv_rows': SCALES[scale],
+        'rows': rows,
+        'items': items,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else None,
+        'peak_rss_mb': round(rss, 1),
+        'db_bytes': dest.stat().st_size,
+        'src_bytes': src_path.stat().st_size,
+        'stages': {name: s['seconds'] for name, s in profile.get('stages', {}).items()},
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[str]:
+    """Human-readable comparison lines; returns the regressions (empty list when all good)."""
+    base_by_scale = {r['scale']: r for r in baseline.get('results', [])}
+    regressions = []
+    print(f'\nvs baseline {baseline.get("generated_at", "?")} (tolerance {tolerance:.0%})')
+    for key, default in (('input_format', 'csv'), ('builder_args', None)):
+        if baseline.get(key, default) != current.get(key):
+            print(f'  note: baseline ran with {key} {baseline.get(key, default)}, current with {current.get(key)}')
+    print(f'  {"scale":6}{"metric":14}{"baseline":>16}{"current":>16}{"change":>10}')
+    for res in current['results']:
+        base = base_by_scale.get(res['scale'])
+        if base is None:
+            print(f'  {res["scale"]:6}(no baseline)')
+            continue
+        for metric, higher_is_worse in METRICS.items():
+            old, new = base.get(metric), res.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            flag = '  REGRESSION' if worse else ''
+            print(f'  {res["scale"]:6}{metric:14}{old:>16,.1f}{new:>16,.1f}{change:>+10.1%}{flag}')
+            if worse:
+                regressions.append(f'{res["scale"]} {metric}: {old} -> {new} ({change:+.1%})')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description='Benchmark the CSV builder on synthetic corpora.')
+    ap.add_argument('--scales', default='1x,10x', help=f'comma-separated, from {", ".join(SCALES)}')
+    ap.add_argument('--workdir', type=Path, default=ROOT / '.cache' / 'bench', help='generated CSVs and build outputs')
+    ap.add_argument('--manifest', type=Path, default=ROOT / MANIFEST)
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--input-format', choices=FORMATS, default='csv', help='convert the synthetic CSV to this format first')
+    ap.add_argument('--builder-args', default='--bulk', help='extra arguments for build_sqlite_from_csv.py')
+    ap.add_argument('--out', type=Path, help='write the results JSON here')
+    ap.add_argument('--baseline', type=Path, help='compare against a previous results JSON')
+    ap.add_argument('--tolerance', type=float, default=0.15, help='allowed relative change before flagging')
+    args = ap.parse_args(argv)
+
+    scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        raise SystemExit(f'unknown scale(s): {", ".join(unknown)}')
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    builder_args = shlex.split(args.builder_args)
+
+    results = []
+    for scale in scales:
+        csv_path = args.workdir / f'synthetic_{scale}_seed{args.seed}.csv'
+        if not csv_path.exists():
+            t0 = time.perf_counter()
+            write_csv(csv_path, SCALES[scale], args.seed, args.manifest)
+            print(f'generated {csv_path} in {time.perf_counter() - t0:.1f}s')
+        src_path = csv_path
+        if args.input_format != 'csv':
+            src_path = csv_path.with_suffix(DEFAULT_SUFFIX[args.input_format])
+            if not src_path.exists():
+                t0 = time.perf_counter()
+                convert(csv_path, src_path)
+                print(f'converted to {src_path} in {time.perf_counter() - t0:.1f}s')
+        res = run_build(src_path, args.workdir, scale, builder_args)
+        results.append(res)
+        print(
+            f'{scale:5} {res["rows"]:>9} rows  {res["seconds"]:8.2f}s  {res["rows_per_sec"]:>10,.0f} rows/s  '
+            f'peak {res["peak_rss_mb"]:7.1f} MB  db {res["db_bytes"] / 1024 / 1024:7.1f} MB'
+        )
+
+    current = {
+        'generated_at': dt.datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'input_format': args.input_format,
+        'builder_args': builder_args,
+        'results': results,
+    }
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f'results written to {args.out}')
+    if args.baseline:
+        regressions = compare(current, json.loads(args.baseline.read_text(encoding='utf-8')), args.tolerance)
+        if regressions:
+            print('\nregressions:\n  ' + '\n  '.join(regressions))
+            sys.exit(1)
+        print('\nno regressions')
+
+
+if __name__ == '__main__':
+    main()
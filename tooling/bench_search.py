@@ -0,0 +1,103 @@
+"""Benchmark: ``search_grams`` inverted index vs. the library page's ``LIKE '%q%'`` scan.
+
+    python tooling/build_sqlite_from_csv.py --bulk --search-grams
+    python tooling/bench_search.py --db assets/jp_study_content.sqlite
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from search_grams import CJK_RUN, LATIN_TOKEN, build_gram_query, has_search_grams
+
+
+def like_query(q: str, deck: Optional[str], limit: int) -> Tuple[str, list]:
+    where = ['i.search_text LIKE ?']
+    args: list = [f'%{q}%']
+    if deck is not None:
+        where.append('i.deck=?')
+        args.append(deck)
+    sql = f'SELECT i.id FROM items i WHERE {" AND ".join(where)} ORDER BY i.id DESC LIMIT ? OFFSET ?'
+    return sql, args + [limit, 0]
+
+
+def sample_queries(conn: sqlite3.Connection, n: int, seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    rows = conn.execute('SELECT deck, term, reading, search_text FROM items').fetchall()
+    out: List[Tuple[str, str]] = []
+    while len(out) < n and rows:
+        deck, term, reading, text = rng.choice(rows)
+        source = rng.choice([term or '', reading or '', text or ''])
+        runs = CJK_RUN.findall(source)
+        tokens = LATIN_TOKEN.findall(source)
+        if runs and (not tokens or rng.random() < 0.85):
+            run = rng.choice(runs)
+            size = min(len(run), rng.randint(1, 4))
+            start = rng.randint(0, len(run) - size)
+            out.append((run[start:start + size], deck))
+        elif tokens:
+            out.append((rng.choice(tokens), deck))
+    return out
+
+
+def timed(conn: sqlite3.Connection, sql: str, args: list) -> Tuple[float, List[int]]:
+    t0 = time.perf_counter()
+    ids = [r[0] for r in conn.execute(sql, args)]
+    return (time.perf_counter() - t0) * 1000, ids
+
+
+def pct(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--db', type=Path, default=Path('assets/jp_study_content.sqlite'))
+    ap.add_argument('--queries', type=int, default=300)
+    ap.add_argument('--limit', type=int, default=50, help='page size, same as the library page')
+    ap.add_argument('--seed', type=int, default=7)
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+    if not has_search_grams(conn):
+        raise SystemExit(f'{args.db} has no search_grams table; build it with --search-grams first.')
+
+    items = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+    postings = conn.execute('SELECT COUNT(*) FROM search_grams').fetchone()[0]
+    print(f'{args.db}: {items} items, {postings} postings')
+
+    queries = sample_queries(conn, args.queries, args.seed)
+    for scope in ('all decks', 'deck filter'):
+        like_ms: List[float] = []
+        gram_ms: List[float] = []
+        mismatches = 0
+        for q, deck in queries:
+            d = deck if scope == 'deck filter' else None
+            t0 = time.perf_counter()
+            built = build_gram_query(q, d, args.limit, conn=conn)
+            if built is None:
+                continue
+            t_plan = (time.perf_counter() - t0) * 1000
+            t_like, ids_like = timed(conn, *like_query(q, d, args.limit))
+            t_gram, ids_gram = timed(conn, *built)
+            t_gram += t_plan  # 选 gram 时的 posting 计数也算进检索耗时
+            like_ms.append(t_like)
+            gram_ms.append(t_gram)
+            mismatches += ids_like != ids_gram
+        if not like_ms:
+            continue
+        print(f'\n[{scope}] {len(like_ms)} queries, limit {args.limit}')
+        print(f'  {"":12}{"p50 ms":>10}{"p95 ms":>10}{"mean ms":>10}')
+        for name, vals in (('LIKE scan', like_ms), ('search_grams', gram_ms)):
+            print(f'  {name:12}{pct(vals, 50):10.3f}{pct(vals, 95):10.3f}{statistics.mean(vals):10.3f}')
+        print(f'  speedup (mean): {statistics.mean(like_ms) / max(statistics.mean(gram_ms), 1e-9):.1f}x')
+        print(f'  result mismatches: {mismatches} (latin infix matches are expected to differ)')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
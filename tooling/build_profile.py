@@ -0,0 +1,135 @@
+"""Per-stage build timings for ``--profile`` (both builders).
+
+    python tooling/build_sqlite_from_csv.py --profile --profile-out build/build_profile.json [--profile-table]
+"""
+import json
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+DEFAULT_OUT = Path('build/build_profile.json')
+
+# --profile-table：在收尾（ANALYZE + VACUUM）之前写入，所以没有 finalize 阶段；
+# kind 为 stage / deck / process，process 行只用 value（如 peak_rss_mb、total_seconds）
+STATS_SQL = '''
+CREATE TABLE build_stats(
+  kind TEXT NOT NULL,
+  name TEXT NOT NULL,
+  rows INTEGER,
+  seconds REAL,
+  rows_per_sec REAL,
+  value REAL,
+  PRIMARY KEY(kind, name)
+) WITHOUT ROWID;
+'''
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位是 KB，macOS 是字节
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+
+class BuildProfile:
+    """Accumulates wall time and row counts per stage and per deck."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.decks: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _add(table: Dict[str, Dict[str, float]], name: str, seconds: float, rows: int):
+        entry = table.setdefault(name, {'rows': 0, 'seconds': 0.0})
+        entry['rows'] += rows
+        entry['seconds'] += seconds
+
+    def add_stage(self, name: str, seconds: float, rows: int = 0):
+        self._add(self.stages, name, seconds, rows)
+
+    def add_deck(self, deck: str, seconds: float, rows: int = 1):
+        self._add(self.decks, deck, seconds, rows)
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0, rows)
+
+    def timed(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield from ``items``, charging the time spent producing each one (and the count) to stage ``name``."""
+        it = iter(items)
+        seconds = 0.0
+        rows = 0
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    seconds += time.perf_counter() - t0
+                    break
+                seconds += time.perf_counter() - t0
+                rows += 1
+                yield item
+        finally:
+            self.add_stage(name, seconds, rows)
+
+    @staticmethod
+    def _rates(table: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for name, entry in table.items():
+            secs = entry['seconds']
+            out[name] = {
+                'rows': int(entry['rows']),
+                'seconds': round(secs, 4),
+                'rows_per_sec': round(entry['rows'] / secs, 1) if secs > 0 and entry['rows'] else None,
+            }
+        return out
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'total_seconds': round(time.perf_counter() - self.started, 4),
+            'peak_rss_mb': round(peak_rss_mb() or 0, 1) or None,
+            'stages': self._rates(self.stages),
+            'decks': self._rates(self.decks),
+        }
+
+    def write_table(self, conn: sqlite3.Connection, summary: Dict[str, object]):
+        conn.execute('DROP TABLE IF EXISTS build_stats')
+        conn.executescript(STATS_SQL)
+        rows = []
+        for kind, key in (('stage', 'stages'), ('deck', 'decks')):
+            for name, entry in summary[key].items():
+                rows.append((kind, name, entry['rows'], entry['seconds'], entry['rows_per_sec'], None))
+        for name in ('total_seconds', 'peak_rss_mb'):
+            rows.append(('process', name, None, None, None, summary[name]))
+        conn.executemany(
+            'INSERT INTO build_stats(kind, name, rows, seconds, rows_per_sec, value) VALUES(?,?,?,?,?,?)', rows
+        )
+        conn.commit()
+
+    @staticmethod
+    def write_json(path: Path, summary: Dict[str, object]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(summary, ensure_ascii=False, indent=2))
+
+    @staticmethod
+    def format(summary: Dict[str, object]) -> str:
+        lines = [f"build profile: {summary['total_seconds']:.2f}s total, peak RSS {summary['peak_rss_mb']} MB"]
+        for key in ('stages', 'decks'):
+            for name, entry in summary[key].items():
+                rate = f"{entry['rows_per_sec']:>12,.0f} rows/s" if entry['rows_per_sec'] else ''
+                lines.append(f"  {key[:-1]:5} {name:24} {entry['seconds']:9.3f}s {entry['rows']:>9} rows {rate}")
+        return '\n'.join(lines)
@@ -1,15 +1,43 @@
-import csv
+import argparse
+import cProfile
 import datetime as dt
 import hashlib
 import json
+import os
 import re
 import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, Iterable, List, Sequence, Tuple
+from typing import Dict, FrozenSet, Iterable, List, Sequence, Set, Tuple
+
+from build_profile import DEFAULT_OUT as PROFILE_OUT, BuildProfile
+from content_stats import build_deck_level_stats, refresh_media_counts
+from dedup_content import dedup_content, format_report as format_dedup_report, has_media_paths
+from finalize_db import DEFAULT_PAGE_SIZE, finalize, format_report
+from input_sources import (
+    DEFAULT_BATCH_ROWS,
+    FORMATS,
+    MANIFEST,
+    PRE_NORMALISED,
+    detect_format,
+    open_rows,
+    select_source,
+)
+from item_ids import FILE_NAME as ITEM_IDS_FILE, ItemIdMap
+from item_links import Item, build_item_links, format_report as format_links_report, has_item_links
+from media_resolver import format_summary, resolve_media, write_missing_report
+from search_grams import build_search_grams, has_search_grams, refresh_search_grams
+from shard_db import format_summary as format_shard_summary, split as split_shards, summary as shard_summary
+from shuffle_keys import item_groups, refresh_shuffle_keys
+from text_keys import normalize_key, refresh_text_keys
 
 SRC = Path('data/grammar_vocab_index_all_sheets.csv')
 DEST = Path('assets/jp_study_content.sqlite')
 VERSION_FILE = Path('assets/db_version.txt')
+CHANGES_OUT = Path('build/db_changes.json')  # 构建产物，不放进 assets/（会被打进 APK）
 
 AUDIO_EXT = {'.mp3', '.wav', '.aac', '.m4a', '.ogg', '.flac'}
 IMAGE_EXT = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'}
@@ -64,56 +92,66 @@ def find_first(row: List[str], names: Iterable[str], idx: Dict[str, List[int]])
     return ''
 
 
-def collect_cells(
-    row: List[str],
-    names: Iterable[str],
-    idx: Dict[str, List[int]],
-    limit: int | None = None,
-) -> List[str]:
-    seen = []
-    for name in names:
-        for i in idx.get(name, []):
-            val = normalise_cell(row[i])
-            if val and val not in seen:
-                seen.append(val)
-                if limit is not None and len(seen) >= limit:
-                    return seen
-    return seen
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS items(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  deck TEXT NOT NULL,
+  level TEXT,
+  term TEXT NOT NULL,
+  reading TEXT,
+  meaning TEXT,
+  search_text TEXT,
+  src_key TEXT,
+  row_hash TEXT,
+  audio_count INTEGER NOT NULL DEFAULT 0,
+  image_count INTEGER NOT NULL DEFAULT 0,
+  shuffle_key INTEGER NOT NULL DEFAULT 0,
+  term_key TEXT NOT NULL DEFAULT '',
+  reading_key TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS media(
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  item_id INTEGER NOT NULL,
+  type TEXT NOT NULL,
+  path TEXT NOT NULL,
+  FOREIGN KEY(item_id) REFERENCES items(id)
+);
+'''
+
+INDEX_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_items_deck ON items(deck);
+CREATE INDEX IF NOT EXISTS idx_items_deck_level ON items(deck, level);
+CREATE INDEX IF NOT EXISTS idx_items_term ON items(term);
+CREATE INDEX IF NOT EXISTS idx_items_search ON items(search_text);
+CREATE INDEX IF NOT EXISTS idx_media_item ON media(item_id);
+'''
 
 
-def prepare_db(path: Path) -> sqlite3.Connection:
+def prepare_db(path: Path, with_indexes: bool = True) -> sqlite3.Connection:
     path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(path)
     cur = conn.cursor()
-    cur.executescript(
-        '''
-        PRAGMA journal_mode=WAL;
-        CREATE TABLE IF NOT EXISTS items(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          deck TEXT NOT NULL,
-          level TEXT,
-          term TEXT NOT NULL,
-          reading TEXT,
-          meaning TEXT,
-          search_text TEXT
-        );
-        CREATE TABLE IF NOT EXISTS media(
-          id INTEGER PRIMARY KEY AUTOINCREMENT,
-          item_id INTEGER NOT NULL,
-          type TEXT NOT NULL,
-          path TEXT NOT NULL,
-          FOREIGN KEY(item_id) REFERENCES items(id)
-        );
-        CREATE INDEX IF NOT EXISTS idx_items_deck_level ON items(deck, level);
-        CREATE INDEX IF NOT EXISTS idx_items_term ON items(term);
-        CREATE INDEX IF NOT EXISTS idx_items_search ON items(search_text);
-        CREATE INDEX IF NOT EXISTS idx_media_item ON media(item_id);
-        '''
-    )
+    cur.execute('PRAGMA journal_mode=WAL;')
+    cur.executescript(SCHEMA_SQL)
+    ensure_columns(conn)
+    if with_indexes:
+        create_indexes(conn)
     conn.commit()
     return conn
 
 
+def create_indexes(conn: sqlite3.Connection):
+    conn.executescript(INDEX_SQL)
+
+
+def ensure_columns(conn: sqlite3.Connection):
+    # 旧版构建出的库没有 src_key/row_hash，补上列（值为空，增量构建时会整体回填）
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    for name in ('src_key', 'row_hash'):
+        if name not in have:
+            conn.execute(f'ALTER TABLE items ADD COLUMN {name} TEXT')
+
+
 def make_search_text(deck: str, level: str, term: str, reading: str, meaning: str) -> str:
     parts = [deck, level, term, reading]
     for seg in meaning.replace('\n', ' ').split(' '):
@@ -132,20 +170,145 @@ def insert_row(
     meaning: str,
     audio_paths,
     image_paths,
+    src_key: str | None = None,
+    row_hash: str | None = None,
+    item_id: int | None = None,
 ):
     search_text = make_search_text(deck, level, term, reading, meaning)
     cur = conn.cursor()
     cur.execute(
-        'INSERT INTO items(deck, level, term, reading, meaning, search_text) VALUES(?,?,?,?,?,?)',
-        (deck, level, term, reading, meaning, search_text),
+        'INSERT INTO items(id, deck, level, term, reading, meaning, search_text, src_key, row_hash) '
+        'VALUES(?,?,?,?,?,?,?,?,?)',
+        (item_id, deck, level, term, reading, meaning, search_text, src_key, row_hash),
     )
     item_id = cur.lastrowid
+    insert_media(cur, item_id, audio_paths, image_paths)
+    return item_id
+
+
+def insert_media(cur, item_id: int, audio_paths, image_paths):
     for p in audio_paths:
         cur.execute('INSERT INTO media(item_id, type, path) VALUES(?,?,?)', (item_id, 'audio', p))
     for p in image_paths:
         cur.execute('INSERT INTO media(item_id, type, path) VALUES(?,?,?)', (item_id, 'image', p))
 
 
+def update_row(
+    conn: sqlite3.Connection,
+    item_id: int,
+    deck: str,
+    level: str,
+    term: str,
+    reading: str,
+    meaning: str,
+    audio_paths,
+    image_paths,
+    src_key: str,
+    row_hash: str,
+):
+    search_text = make_search_text(deck, level, term, reading, meaning)
+    cur = conn.cursor()
+    cur.execute(
+        'UPDATE items SET deck=?, level=?, term=?, reading=?, meaning=?, search_text=?, src_key=?, row_hash=? '
+        'WHERE id=?',
+        (deck, level, term, reading, meaning, search_text, src_key, row_hash, item_id),
+    )
+    cur.execute('DELETE FROM media WHERE item_id=?', (item_id,))
+    insert_media(cur, item_id, audio_paths, image_paths)
+
+
+def delete_rows(conn: sqlite3.Connection, item_ids: Sequence[int]):
+    cur = conn.cursor()
+    for i in range(0, len(item_ids), 500):
+        chunk = list(item_ids[i:i + 500])
+        marks = ','.join('?' * len(chunk))
+        cur.execute(f'DELETE FROM media WHERE item_id IN ({marks})', chunk)
+        cur.execute(f'DELETE FROM items WHERE id IN ({marks})', chunk)
+
+
+def snapshot_rows(conn: sqlite3.Connection, item_ids: Sequence[int]) -> List[tuple]:
+    """``(id, deck, level, term, reading)`` of ``item_ids`` before an incremental build rewrites or deletes them."""
+    rows = []
+    for i in range(0, len(item_ids), 500):
+        chunk = list(item_ids[i:i + 500])
+        marks = ','.join('?' * len(chunk))
+        rows.extend(conn.execute(f'SELECT id, deck, level, term, reading FROM items WHERE id IN ({marks})', chunk))
+    return rows
+
+
+class BulkLoader:
+    """Buffers items/media and writes them with executemany inside one transaction."""
+
+    def __init__(self, conn: sqlite3.Connection, batch_size: int = 5000):
+        self.conn = conn
+        self.batch_size = batch_size
+        # id 在这里分配而不是读 lastrowid，media 行才能和条目一起批量写
+        self.next_id = (conn.execute('SELECT COALESCE(MAX(id), 0) FROM items').fetchone()[0] or 0) + 1
+        self.items: List[tuple] = []
+        self.media: List[tuple] = []
+
+    def add(
+        self, deck, level, term, reading, meaning, audio_paths, image_paths, src_key=None, row_hash=None, item_id=None
+    ) -> int:
+        if item_id is None:
+            item_id = self.next_id
+        self.next_id = max(self.next_id, item_id + 1)
+        search_text = make_search_text(deck, level, term, reading, meaning)
+        self.items.append((item_id, deck, level, term, reading, meaning, search_text, src_key, row_hash))
+        for p in audio_paths:
+            self.media.append((item_id, 'audio', p))
+        for p in image_paths:
+            self.media.append((item_id, 'image', p))
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        return item_id
+
+    def flush(self):
+        if self.items:
+            self.conn.executemany(
+                'INSERT INTO items(id, deck, level, term, reading, meaning, search_text, src_key, row_hash) '
+                'VALUES(?,?,?,?,?,?,?,?,?)',
+                self.items,
+            )
+            self.items.clear()
+        if self.media:
+            self.conn.executemany('INSERT INTO media(item_id, type, path) VALUES(?,?,?)', self.media)
+            self.media.clear()
+
+
+def remove_db(path: Path):
+    # 全量构建从空文件开始：search_grams、item_links 等派生表不会带着已删除的 id 留下来
+    if path.exists():
+        path.unlink()
+    for suffix in ('-wal', '-shm', '-journal'):
+        side = path.with_name(path.name + suffix)
+        if side.exists():
+            side.unlink()
+
+
+def begin_bulk_load(path: Path) -> sqlite3.Connection:
+    remove_db(path)
+    conn = prepare_db(path, with_indexes=False)
+    conn.executescript(
+        '''
+        PRAGMA journal_mode=MEMORY;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-65536;
+        '''
+    )
+    conn.execute('BEGIN')
+    return conn
+
+
+def finish_bulk_load(conn: sqlite3.Connection, loader: BulkLoader):
+    loader.flush()
+    create_indexes(conn)
+    conn.commit()
+    conn.execute('PRAGMA synchronous=FULL;')
+    conn.execute('PRAGMA journal_mode=WAL;')
+
+
 def collect_quality_flags(term: str, reading: str, meaning: str) -> Tuple[bool, bool, bool]:
     missing_term = not term.strip()
     missing_reading = not reading.strip()
@@ -153,151 +316,740 @@ def collect_quality_flags(term: str, reading: str, meaning: str) -> Tuple[bool,
     return missing_term, missing_reading, missing_meaning
 
 
-def main():
-    if not SRC.exists():
-        raise SystemExit(f'Missing source CSV: {SRC}')
+TERM_COLUMNS = ['语法点', '汉字/外文', '假名', '副词', '句型', '基本句型', '漢字']
+READING_COLUMNS = ['假名', '读音', '音訓']
+MEANING_COLUMNS = ['词意', '例句', '例句解释', '关联词', '关联词解释', '词汇表达能力指导', '参考', '备注', '终了', '语法点']
+LEVEL_COLUMNS = ['级别', '级别.1', 'col_40']
+DECK_COLUMNS = ['sheet_name', 'deck', '分类']
+MEDIA_COLUMNS = ['音源路径', '音源', '路径', '实际路径', '图源', '图源_2', 'col_25', 'col_26']
+
+
+def file_ext(p: str) -> str:
+    # 与 Path(p).suffix.lower() 相同（p 已经是 / 分隔），但不用每个单元格构造 Path
+    name = p.rstrip('/').rpartition('/')[2]
+    dot = name.rfind('.')
+    if dot <= 0 or dot == len(name) - 1:
+        return ''
+    return name[dot:].lower()
+
+
+def media_hint(name: str) -> str:
+    if '音源' in name:
+        return 'audio'
+    if '图源' in name:
+        return 'image'
+    return 'by-suffix'
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """Column choices for one deck, resolved to indexes.
+
+    ``active`` is the set of columns seen non-empty in this deck so far; every
+    resolved index list is restricted to it. A row that has a value outside
+    ``active`` widens the plan (see ``PlanCache.plan_for``), so skipping the
+    other columns never changes the result.
+    """
+
+    deck: str
+    active: FrozenSet[int]
+    level_cols: Tuple[int, ...]
+    term_cols: Tuple[int, ...]
+    reading_cols: Tuple[int, ...]
+    meaning_cols: Tuple[int, ...]
+    media_cols: Tuple[Tuple[int, ...], ...]
+
+    def describe(self, headers: List[str]) -> dict:
+        names = lambda cols: [headers[i] for i in cols]  # noqa: E731
+        return {
+            'active_columns': names(sorted(self.active)),
+            'level': names(self.level_cols),
+            'term': names(self.term_cols),
+            'reading': names(self.reading_cols),
+            'meaning': names(self.meaning_cols),
+            'media': [
+                {'column': headers[cols[0]], 'indexes': list(cols), 'type': media_hint(headers[cols[0]])}
+                for cols in self.media_cols
+            ],
+            'heuristics': {
+                'level_from_cells': not self.level_cols,
+                'term_from_cells': not self.term_cols,
+                'reading_from_cells': not self.reading_cols,
+                'meaning_from_cells': not self.meaning_cols,
+            },
+        }
+
+
+def resolve_columns(idx: Dict[str, List[int]], names: Iterable[str]) -> Tuple[int, ...]:
+    return tuple(i for name in names for i in idx.get(name, []))
+
+
+class PlanCache:
+    """Per-deck extraction plans for one CSV header layout."""
+
+    def __init__(self, headers: List[str]):
+        self.headers = list(headers)
+        self.header_sha = hashlib.sha1('\x1f'.join(self.headers).encode('utf-8')).hexdigest()
+        self.idx = build_index(self.headers)
+        self.deck_cols = resolve_columns(self.idx, DECK_COLUMNS)
+        self.plans: Dict[str, ExtractionPlan] = {}
+        self.changed: Dict[str, FrozenSet[int]] = {}
+
+    def compile(self, deck: str, active: FrozenSet[int]) -> ExtractionPlan:
+        keep = lambda names: tuple(i for i in resolve_columns(self.idx, names) if i in active)  # noqa: E731
+        media = tuple(cols for cols in (keep([name]) for name in MEDIA_COLUMNS) if cols)
+        plan = ExtractionPlan(
+            deck=deck,
+            active=active,
+            level_cols=keep(LEVEL_COLUMNS),
+            term_cols=keep(TERM_COLUMNS),
+            reading_cols=keep(READING_COLUMNS),
+            meaning_cols=keep(MEANING_COLUMNS),
+            media_cols=media,
+        )
+        self.plans[deck] = plan
+        self.changed[deck] = active
+        return plan
+
+    def plan_for(self, deck: str, nonempty: Set[int]) -> ExtractionPlan:
+        plan = self.plans.get(deck)
+        if plan is None:
+            return self.compile(deck, frozenset(nonempty))
+        if not nonempty <= plan.active:
+            return self.compile(deck, plan.active | nonempty)
+        return plan
+
+    def merge(self, actives: Dict[str, FrozenSet[int]]):
+        for deck, active in actives.items():
+            plan = self.plans.get(deck)
+            if plan is None or not active <= plan.active:
+                self.compile(deck, active | (plan.active if plan else frozenset()))
+
+    def dump(self) -> dict:
+        return {
+            'header_sha1': self.header_sha,
+            'columns': len(self.headers),
+            'deck_columns': [self.headers[i] for i in self.deck_cols],
+            'decks': {deck: plan.describe(self.headers) for deck, plan in sorted(self.plans.items())},
+        }
+
+
+_plan_caches: Dict[str, PlanCache] = {}
+
+
+def plans_for_headers(headers: List[str]) -> PlanCache:
+    """Plan cache keyed on the header hash, so each layout is compiled once per process."""
+    key = hashlib.sha1('\x1f'.join(headers).encode('utf-8')).hexdigest()
+    cache = _plan_caches.get(key)
+    if cache is None:
+        cache = _plan_caches[key] = PlanCache(headers)
+    return cache
+
+
+def first_value(vals: List[str], cols: Tuple[int, ...]) -> str:
+    for i in cols:
+        if vals[i]:
+            return vals[i]
+    return ''
+
+
+def extract_row(row: List[str], plans: PlanCache, normalised: bool = False):
+    """Turn one CSV row into ``(deck, level, term, reading, meaning, audio_paths, image_paths)``.
+
+    Returns ``None`` when the row has no usable cells. ``normalised`` rows (Parquet/Arrow input,
+    cleaned column-wise by ``input_sources``) skip the per-cell ``normalise_cell`` pass.
+    """
+    vals = row if normalised else [normalise_cell(c) for c in row]
+    deck = first_value(vals, plans.deck_cols) or vals[0] or '未分类'
+    cells = [v for v in vals[1:] if v]
+    if not cells:
+        return None
+    plan = plans.plan_for(deck, {i for i, v in enumerate(vals) if v})
+
+    level = first_value(vals, plan.level_cols) or pick_level(cells)
+    term = first_value(vals, plan.term_cols)
+    reading = first_value(vals, plan.reading_cols)
+    meaning_parts: List[str] = []
+    for i in plan.meaning_cols:
+        val = vals[i]
+        if val and val not in meaning_parts:
+            meaning_parts.append(val)
+            if len(meaning_parts) >= 6:
+                break
+
+    audio_paths = []
+    image_paths = []
+
+    for cols in plan.media_cols:
+        val = first_value(vals, cols)
+        if not val:
+            continue
+        p = norm_path(val)
+        ext = file_ext(p)
+        if ext in AUDIO_EXT:
+            audio_paths.append(p)
+        elif ext in IMAGE_EXT:
+            image_paths.append(p)
+
+    for c in cells:
+        if looks_path(c):
+            p = norm_path(c)
+            ext = file_ext(p)
+            if ext in AUDIO_EXT:
+                audio_paths.append(p)
+            elif ext in IMAGE_EXT:
+                image_paths.append(p)
+            continue
+
+        if not term and looks_japanese(c):
+            term = c
+            continue
+        if not reading and looks_kana(c):
+            reading = c
+            continue
+
+        ext = file_ext(c)
+        if ext in AUDIO_EXT or ext in IMAGE_EXT:
+            continue
+
+        if len(meaning_parts) < 6 and len(c) <= 200 and not is_numeric_like(c):
+            meaning_parts.append(c)
+
+    if not term:
+        jp_tokens = [c for c in cells if looks_japanese(c) and not looks_path(c)]
+        jp_tokens.sort(key=len, reverse=True)
+        term = jp_tokens[0] if jp_tokens else cells[0]
+
+    if not meaning_parts:
+        meaning_parts = [c for c in cells if c != term and not is_numeric_like(c)][:3]
+
+    meaning = '\n'.join(dict.fromkeys([m for m in meaning_parts if m]))
+    return deck, level, term, reading, meaning, audio_paths, image_paths
+
+
+NOT_EXTRACTED = object()
+
+_worker_plans: PlanCache | None = None
+_worker_normalised = False
+
+
+def _init_worker(headers: List[str], normalised: bool):
+    global _worker_plans, _worker_normalised
+    _worker_plans = plans_for_headers(headers)
+    _worker_normalised = normalised
+
+
+def _extract_chunk(rows: List[List[str]]):
+    # 顺带带回本块里新编译/扩展过的计划，主进程合并后用于 --dump-plans
+    _worker_plans.changed.clear()
+    results = [extract_row(row, _worker_plans, _worker_normalised) for row in rows]
+    return results, dict(_worker_plans.changed)
+
+
+def iter_extracted(
+    rows: Iterable[Tuple[int, List[str]]], plans: PlanCache, workers: int, chunk_size: int, normalised: bool = False
+):
+    """Yield ``(line_no, row, extracted)`` in CSV order.
+
+    With ``workers > 1`` rows are shipped in chunks to a process pool and the
+    results are consumed strictly in submission order, so the single writer sees
+    exactly the same sequence as a serial run. At most ``2 * workers`` chunks are
+    in flight, which keeps memory bounded for large CSVs. Serial runs yield
+    ``NOT_EXTRACTED`` and leave extraction to the caller (incremental builds skip
+    it for unchanged rows).
+    """
+    if workers <= 1:
+        for line_no, row in rows:
+            yield line_no, row, NOT_EXTRACTED
+        return
+
+    def chunks():
+        buf = []
+        for item in rows:
+            buf.append(item)
+            if len(buf) >= chunk_size:
+                yield buf
+                buf = []
+        if buf:
+            yield buf
+
+    def drain(done_chunk, fut):
+        results, changed = fut.result()
+        plans.merge(changed)
+        for (line_no, row), extracted in zip(done_chunk, results):
+            yield line_no, row, extracted
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(plans.headers, normalised)) as pool:
+        pending = deque()
+        for chunk in chunks():
+            pending.append((chunk, pool.submit(_extract_chunk, [row for _, row in chunk])))
+            if len(pending) >= 2 * workers:
+                yield from drain(*pending.popleft())
+        while pending:
+            yield from drain(*pending.popleft())
 
-    conn = prepare_db(DEST)
-    cur = conn.cursor()
-    cur.execute('DELETE FROM items;')
-    cur.execute('DELETE FROM media;')
-    conn.commit()
 
-    with SRC.open(newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        headers = next(reader)
-        idx = build_index(headers)
+def extractor_salt() -> bytes:
+    # 行 hash 里混入本脚本的 hash：提取逻辑改动后，增量构建会原地重写所有行（id 不变）
+    return hashlib.sha256(Path(__file__).read_bytes()).digest()
+
+
+def row_identity(row: List[str], idx: Dict[str, List[int]], line_no: int, salt: bytes) -> Tuple[str, str]:
+    """Stable content identity of a CSV row: ``sheet_name:row_index`` plus a hash of the raw cells."""
+    sheet = find_first(row, ['sheet_name'], idx)
+    row_index = find_first(row, ['row_index'], idx)
+    key = f'{sheet}:{row_index}' if sheet and row_index else f'line:{line_no}'
+    h = hashlib.sha1(salt)
+    h.update('\x1f'.join(row).encode('utf-8'))
+    return key, h.hexdigest()
+
+
+def unique_key(key: str, seen: Dict[str, int]) -> str:
+    """Same ``src_key`` seen again: suffix it with its order among the duplicates (``#2``, ``#3`` …)."""
+    n = seen.get(key, 0) + 1
+    seen[key] = n
+    return key if n == 1 else f'{key}#{n}'
+
+
+def migrate_duplicate_keys(previous: Dict[str, Tuple[int, str]]) -> Dict[str, Tuple[int, str]]:
+    """Rename old ``key#line:N`` suffixes to the order-based ``key#n`` (ids were handed out in row order)."""
+    legacy: Dict[str, List[Tuple[int, str]]] = {}
+    for key, (item_id, _) in previous.items():
+        if '#line:' in key:
+            legacy.setdefault(key.split('#line:', 1)[0], []).append((item_id, key))
+    for base, dups in legacy.items():
+        for n, (_, key) in enumerate(sorted(dups), start=2):
+            previous[f'{base}#{n}'] = previous.pop(key)
+    return previous
+
+
+def load_previous_build(conn: sqlite3.Connection):
+    """Return ``{src_key: (id, row_hash)}`` for a DB that can be updated in place, else ``None``."""
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    if not {'src_key', 'row_hash'} <= have:
+        return None
+    if conn.execute('SELECT 1 FROM items WHERE src_key IS NULL OR row_hash IS NULL LIMIT 1').fetchone():
+        return None
+    return migrate_duplicate_keys(
+        {key: (item_id, h) for item_id, key, h in conn.execute('SELECT id, src_key, row_hash FROM items')}
+    )
+
+
+def quality_from_db(conn: sqlite3.Connection) -> Tuple[int, int, int, int]:
+    row = conn.execute(
+        '''
+        SELECT COUNT(*),
+               COALESCE(SUM(term = '(未知)'), 0),
+               COALESCE(SUM(TRIM(COALESCE(reading, '')) = ''), 0),
+               COALESCE(SUM(TRIM(COALESCE(meaning, '')) = ''), 0)
+        FROM items
+        '''
+    ).fetchone()
+    return row[0], row[1], row[2], row[3]
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description='Build the bundled sqlite from the merged CSV export.')
+    ap.add_argument(
+        '--src',
+        type=Path,
+        help=f'merged export (CSV, JSONL, Parquet or Arrow); default: picked from {MANIFEST}, else {SRC}',
+    )
+    ap.add_argument(
+        '--input-format',
+        choices=('auto',) + FORMATS,
+        default='auto',
+        help='input format; auto = from the --src suffix, or the first manifest export present '
+        '(parquet, arrow, csv, jsonl; columnar ones only when pyarrow is installed)',
+    )
+    ap.add_argument('--manifest', type=Path, default=MANIFEST, help='export manifest used to pick the input')
+    ap.add_argument(
+        '--read-batch', type=int, default=DEFAULT_BATCH_ROWS, help='rows per record batch for Parquet/Arrow input'
+    )
+    ap.add_argument('--dest', type=Path, default=DEST, help='output sqlite path')
+    ap.add_argument(
+        '--id-map',
+        type=Path,
+        help=f'src_key -> item id map that keeps ids stable across any build mode (default: {ITEM_IDS_FILE} next to '
+        'the source export; commit it)',
+    )
+    ap.add_argument('--version-file', type=Path, default=VERSION_FILE, help='version metadata output')
+    ap.add_argument(
+        '--changes-out', type=Path, default=CHANGES_OUT, help='change summary (inserted/updated/deleted ids) output'
+    )
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument(
+        '--bulk',
+        action='store_true',
+        help='rebuild from scratch with batched executemany inserts in one transaction; indexes are created after loading',
+    )
+    mode.add_argument(
+        '--incremental',
+        action='store_true',
+        help='update an existing build in place: only rows whose hash changed are written and item ids stay stable',
+    )
+    ap.add_argument('--batch-size', type=int, default=5000, help='rows per executemany batch in --bulk mode')
+    ap.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='processes for row classification/extraction (0 = all cores); a single writer keeps CSV order',
+    )
+    ap.add_argument('--chunk-size', type=int, default=2000, help='rows per work unit sent to each --workers process')
+    ap.add_argument('--dump-plans', type=Path, help='write the compiled per-deck extraction plans to this JSON file')
+    ap.add_argument(
+        '--search-grams',
+        action='store_true',
+        help='emit the search_grams(gram, item_id) inverted index (kept up to date by --incremental once present)',
+    )
+    ap.add_argument('--media-root', type=Path, help='local copy of the にほんご media folder to stat and hash')
+    ap.add_argument('--media-workers', type=int, default=8, help='threads for the --media-root stat/hash pass')
+    ap.add_argument('--missing-report', type=Path, help='write the rel_paths missing under --media-root to this JSON file')
+    ap.add_argument(
+        '--profile',
+        action='store_true',
+        help='record per-stage and per-deck timings plus peak RSS in --profile-out and the version file',
+    )
+    ap.add_argument('--profile-out', type=Path, default=PROFILE_OUT, help='where --profile writes its JSON summary')
+    ap.add_argument(
+        '--profile-table',
+        action='store_true',
+        help='implies --profile; also write a build_stats table into the DB (before finalize, so without that stage). '
+        'Off by default: timings would make the shipped DB differ on every build',
+    )
+    ap.add_argument(
+        '--profile-dump',
+        type=Path,
+        help='also run under cProfile and dump the stats here (main process only; --workers run outside it)',
+    )
+    ap.add_argument(
+        '--dedup',
+        action='store_true',
+        help='media path dedup stage: one media_paths row per media file, with a bytes-saved report '
+        '(--incremental keeps it on for DBs that were built with it)',
+    )
+    ap.add_argument(
+        '--page-size',
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help='page size applied by the finalize stage (rollback journal, ANALYZE, VACUUM)',
+    )
+    ap.add_argument(
+        '--finalize',
+        action='store_true',
+        help='also ANALYZE and VACUUM after an --incremental build (full builds always do); '
+        'without it an incremental run only switches back to the rollback journal',
+    )
+    ap.add_argument(
+        '--links',
+        action='store_true',
+        help='build item_links (same term / reading / kanji / "A vs B" cross references) and log the join cost '
+        '(--incremental keeps it on for DBs that were built with it)',
+    )
+    ap.add_argument(
+        '--shards',
+        type=Path,
+        help='also write one SQLite shard per deck plus manifest.json (hashes, row counts, delta) into this directory; '
+        'use with --incremental so unchanged decks keep byte-identical shards',
+    )
+    return ap.parse_args(argv)
+
+
+def resolve_input(args) -> Tuple[Path, str]:
+    if args.src is not None:
+        return args.src, detect_format(args.src) if args.input_format == 'auto' else args.input_format
+    picked = select_source(args.manifest, args.input_format)
+    if picked is None:
+        if args.input_format not in ('auto', 'csv'):
+            raise SystemExit(f'No {args.input_format} export listed in {args.manifest} exists')
+        print(f'Input: no export from {args.manifest} found, falling back to {SRC}')
+        return SRC, 'csv'
+    print(f'Input: {picked[0]} ({picked[1]}), picked from {args.manifest} with --input-format {args.input_format}')
+    return picked
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile_dump:
+        profiler = cProfile.Profile()
+        profiler.runcall(build, args)
+        args.profile_dump.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(args.profile_dump))
+        print(f'cProfile stats written to {args.profile_dump}')
+    else:
+        build(args)
+
+
+def build(args):
+    prof = BuildProfile()
+    args.profile = args.profile or args.profile_table
+    clock = time.perf_counter if args.profile else (lambda: 0.0)
+    src, input_format = resolve_input(args)
+    dest: Path = args.dest
+    if not src.exists():
+        raise SystemExit(f'Missing source export: {src}')
+    print(f'Reading {src} ({input_format})')
+
+    started = dt.datetime.utcnow()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    salt = extractor_salt()
+    id_map_path = args.id_map or src.parent / ITEM_IDS_FILE
+    id_map = ItemIdMap.load(id_map_path)
+    ids_stable = id_map is not None
+    previous = None
+    loader = None
+    if args.incremental:
+        if dest.exists():
+            conn = prepare_db(dest)
+            previous = load_previous_build(conn)
+            if previous is None:
+                conn.close()
+        if previous is None:
+            if id_map is None:
+                raise SystemExit(
+                    f'No id-stable build at {dest} and no id map at {id_map_path}: a full build would renumber every '
+                    'item and orphan the progress in srs/review_log. Restore one of them, or run --bulk once to start '
+                    'a new id map.'
+                )
+            print(f'No id-stable build at {dest}; full --bulk build with the ids from {id_map_path}.')
+            args.incremental = False
+            args.bulk = True
+    if id_map is None:
+        id_map = ItemIdMap(id_map_path)
+    if previous is not None:
+        ids_stable = True
+        id_map.pin_all((key, item_id) for key, (item_id, _) in previous.items())
+    if previous is None:
+        if args.bulk:
+            conn = begin_bulk_load(dest)
+            loader = BulkLoader(conn, args.batch_size)
+        else:
+            remove_db(dest)
+            conn = prepare_db(dest)
+
+    inserted: List[int] = []
+    updated: List[int] = []
+    before: List[tuple] = []  # 被改写/删除的行的旧值：派生表只重算与改动条目同组的部分
+    unchanged = 0
+
+    with open_rows(src, input_format, args.read_batch) as (headers, rows):
+        plans = plans_for_headers(headers)
+        idx = plans.idx
 
         total = 0
         skipped = 0
         missing_term = 0
         missing_reading = 0
         missing_meaning = 0
+        seen_keys: Dict[str, int] = {}
+        classify_s = 0.0
+        insert_s = 0.0
+
+        normalised = input_format in PRE_NORMALISED
+        stream = iter_extracted(
+            prof.timed('read', rows) if args.profile else rows, plans, workers, args.chunk_size, normalised
+        )
+        for line_no, row, extracted in prof.timed('pull', stream) if args.profile else stream:
+            t0 = clock()
+            key, rh = row_identity(row, idx, line_no, salt)
+            key = unique_key(key, seen_keys)
 
-        for row in reader:
-            if not row:
+            prev = previous.pop(key, None) if previous is not None else None
+            if prev is not None and prev[1] == rh:
+                unchanged += 1
+                classify_s += clock() - t0
                 continue
 
-            deck = find_first(row, ['sheet_name', 'deck', '分类'], idx) or normalise_cell(row[0]) or '未分类'
-            cells = [normalise_cell(c) for c in row[1:] if normalise_cell(c)]
-            if not cells:
+            if extracted is NOT_EXTRACTED:
+                extracted = extract_row(row, plans, normalised)
+            t1 = clock()
+            classify_s += t1 - t0
+            if extracted is None:
                 skipped += 1
+                if prev is not None:
+                    previous[key] = prev  # 变成空行：按删除处理
                 continue
-
-            level = find_first(row, ['级别', '级别.1', 'col_40'], idx) or pick_level(cells)
-
-            term = find_first(
-                row,
-                [
-                    '语法点',
-                    '汉字/外文',
-                    '假名',
-                    '副词',
-                    '句型',
-                    '基本句型',
-                    '漢字',
-                ],
-                idx,
-            )
-
-            reading = find_first(row, ['假名', '读音', '音訓'], idx)
-
-            meaning_parts = collect_cells(
-                row,
-                [
-                    '词意',
-                    '例句',
-                    '例句解释',
-                    '关联词',
-                    '关联词解释',
-                    '词汇表达能力指导',
-                    '参考',
-                    '备注',
-                    '终了',
-                    '语法点',
-                ],
-                idx,
-                limit=6,
-            )
-
-            audio_paths = []
-            image_paths = []
-
-            for name in ['音源路径', '音源', '路径', '实际路径', '图源', '图源_2', 'col_25', 'col_26']:
-                val = find_first(row, [name], idx)
-                if not val:
-                    continue
-                p = norm_path(val)
-                ext = Path(p).suffix.lower()
-                if ext in AUDIO_EXT:
-                    audio_paths.append(p)
-                elif ext in IMAGE_EXT:
-                    image_paths.append(p)
-
-            for c in cells:
-                lower = c.lower()
-                if looks_path(c):
-                    p = norm_path(c)
-                    ext = Path(p).suffix.lower()
-                    if ext in AUDIO_EXT:
-                        audio_paths.append(p)
-                    elif ext in IMAGE_EXT:
-                        image_paths.append(p)
-                    continue
-
-                if not term and looks_japanese(c):
-                    term = c
-                    continue
-                if not reading and looks_kana(c):
-                    reading = c
-                    continue
-
-                ext = Path(c).suffix.lower()
-                if ext in AUDIO_EXT or ext in IMAGE_EXT:
-                    continue
-
-                if len(meaning_parts) < 6 and len(c) <= 200 and not is_numeric_like(c):
-                    meaning_parts.append(c)
-
-            if not term:
-                jp_tokens = [c for c in cells if looks_japanese(c) and not looks_path(c)]
-                jp_tokens.sort(key=len, reverse=True)
-                term = jp_tokens[0] if jp_tokens else cells[0]
-
-            if not meaning_parts:
-                meaning_parts = [c for c in cells if c != term and not is_numeric_like(c)][:3]
-
-            meaning = '\n'.join(dict.fromkeys([m for m in meaning_parts if m]))
+            deck, level, term, reading, meaning, audio_paths, image_paths = extracted
 
             mt, mr, mm = collect_quality_flags(term, reading, meaning)
             missing_term += int(mt)
             missing_reading += int(mr)
             missing_meaning += int(mm)
 
-            insert_row(conn, deck, level, term or '(未知)', reading, meaning, audio_paths, image_paths)
+            fields = (deck, level, term or '(未知)', reading, meaning, audio_paths, image_paths)
+            if prev is not None:
+                before.extend(snapshot_rows(conn, [prev[0]]))
+                update_row(conn, prev[0], *fields, src_key=key, row_hash=rh)
+                updated.append(prev[0])
+            elif loader is not None:
+                inserted.append(loader.add(*fields, src_key=key, row_hash=rh, item_id=id_map.assign(key)))
+            else:
+                inserted.append(insert_row(conn, *fields, src_key=key, row_hash=rh, item_id=id_map.assign(key)))
+            if args.profile:
+                t2 = clock()
+                insert_s += t2 - t1
+                prof.add_deck(deck, t2 - t0)
             total += 1
-            if total % 5000 == 0:
-                conn.commit()
+            if previous is None and total % 5000 == 0:
+                if loader is None:
+                    conn.commit()
                 print(f'Inserted {total} rows...')
 
-        conn.commit()
-        print(f'Done. Inserted {total} rows, skipped {skipped}.')
+        deleted: List[int] = []
+        if previous:
+            deleted = sorted(item_id for item_id, _ in previous.values())
+            before.extend(snapshot_rows(conn, deleted))
+            with prof.stage('insert'):
+                delete_rows(conn, deleted)
+
+        if args.profile:
+            # pull = 等待读取/分类结果的时间（含 read）；多进程时分类在 worker 里，等待时间记到 classify
+            pull_s = prof.stages.pop('pull')['seconds'] - prof.stages.get('read', {}).get('seconds', 0.0)
+            prof.add_stage('classify', classify_s + max(pull_s, 0.0), total + skipped + unchanged)
+            prof.add_stage('insert', insert_s, total)
+
+        # 增量构建只刷新本次写入/删除的条目及其所在的组；全量构建整表重算
+        scope = inserted + updated if args.incremental else None
+        groups = None
+        if args.incremental:
+            groups = item_groups(conn, scope) | {(deck, level) for _, deck, level, _, _ in before}
+        with prof.stage('index', total):
+            if loader is not None:
+                finish_bulk_load(conn, loader)
+            conn.commit()
+
+            if args.incremental and has_search_grams(conn):
+                postings = refresh_search_grams(conn, inserted + updated + deleted)
+                print(f'search_grams refreshed: {postings} postings rewritten.')
+            elif args.search_grams:
+                postings = build_search_grams(conn)
+                print(f'search_grams built: {postings} postings.')
+            refresh_shuffle_keys(conn, groups)
+            refresh_text_keys(conn, scope)
+
+        with prof.stage('media'):
+            media_summary = resolve_media(conn, args.media_root, args.media_workers, item_ids=scope)
+        print(format_summary(media_summary))
+        with prof.stage('aggregate'):
+            refresh_media_counts(conn, scope)
+            deck_level_stats = build_deck_level_stats(conn, groups)
+        print(f'deck_level_stats: {len(deck_level_stats)} deck/level rows.')
+        links_report = None
+        had_links = args.incremental and has_item_links(conn)
+        if args.links or had_links:
+            with prof.stage('links', total):
+                old_items = [
+                    Item(i, deck, term, normalize_key(term), normalize_key(reading)) for i, deck, _, term, reading in before
+                ]
+                links_report = build_item_links(conn, scope if had_links else None, old_items)
+            print(format_links_report(links_report))
+        dedup_report = None
+        had_dedup = args.incremental and has_media_paths(conn)
+        if args.dedup or had_dedup:
+            with prof.stage('dedup'):
+                # 给了 --media-root 时 resolve_media 整表重写了清单，去重也要整表做
+                dedup_report = dedup_content(conn, scope if had_dedup and args.media_root is None else None)
+            print(format_dedup_report(dedup_report))
+
+        if args.incremental:
+            total, missing_term, missing_reading, missing_meaning = quality_from_db(conn)
+            print(
+                f'Done. {len(inserted)} inserted, {len(updated)} updated, {len(deleted)} deleted, '
+                f'{unchanged} unchanged ({total} rows).'
+            )
+        else:
+            print(f'Done. Inserted {total} rows, skipped {skipped}.')
         print(
             f'Quality summary -> missing term: {missing_term}, '
             f'missing reading: {missing_reading}, missing meaning: {missing_meaning}'
         )
+        if args.profile_table:
+            prof.write_table(conn, prof.to_dict())
+    conn.close()
+
+    if id_map.changed():
+        added = id_map.added
+        id_map.save()
+        print(f'Item id map: {len(id_map.ids)} keys ({added} new) written to {id_map_path}')
+
+    if args.missing_report and args.media_root:
+        write_missing_report(args.missing_report, media_summary)
+        print(f'Missing media list written to {args.missing_report}')
+
+    with prof.stage('finalize'):
+        size_report = finalize(dest, args.page_size, vacuum=args.finalize or not args.incremental)
+    print(f'Finalized {dest}: {format_report(size_report)}')
+
+    build_profile = None
+    if args.profile:
+        build_profile = prof.to_dict()
+        BuildProfile.write_json(args.profile_out, build_profile)
+        print(BuildProfile.format(build_profile))
+        print(f'Build profile written to {args.profile_out}')
+
+    shards = None
+    if args.shards:
+        manifest = split_shards(dest, args.shards, args.page_size)
+        shards = shard_summary(manifest, args.shards)
+        print(format_shard_summary(manifest))
+
+    if args.dump_plans:
+        args.dump_plans.parent.mkdir(parents=True, exist_ok=True)
+        args.dump_plans.write_text(json.dumps(plans.dump(), ensure_ascii=False, indent=2))
+        print(f'Extraction plans written to {args.dump_plans}')
+
+    csv_sha = hashlib.sha256(src.read_bytes()).hexdigest()
+    previous_sha = None
+    if args.version_file.exists():
+        try:
+            previous_sha = json.loads(args.version_file.read_text()).get('csv_sha256')
+        except (ValueError, AttributeError):
+            previous_sha = None
 
     metadata = {
-        'source': str(SRC),
+        'source': str(src),
+        'source_format': input_format,
         'rows': total,
         'generated_at': dt.datetime.utcnow().isoformat() + 'Z',
-        'csv_sha256': hashlib.sha256(SRC.read_bytes()).hexdigest(),
+        'csv_sha256': csv_sha,
+        'build_mode': 'incremental' if args.incremental else ('bulk' if args.bulk else 'full'),
         'missing_term': missing_term,
         'missing_reading': missing_reading,
         'missing_meaning': missing_meaning,
+        'deck_level_stats': deck_level_stats,
+        'media': {k: v for k, v in media_summary.items() if k != 'missing'},
+        'size_report': size_report,
+    }
+    if links_report is not None:
+        metadata['item_links'] = links_report
+    if dedup_report is not None:
+        metadata['dedup'] = dedup_report
+    if build_profile is not None:
+        metadata['build_profile'] = build_profile
+    if shards is not None:
+        metadata['shards'] = shards
+    args.version_file.parent.mkdir(parents=True, exist_ok=True)
+    args.version_file.write_text(json.dumps(metadata, ensure_ascii=False, indent=2))
+    print(f'Version info written to {args.version_file}')
+
+    changes = {
+        'build_mode': metadata['build_mode'],
+        'from_csv_sha256': previous_sha,
+        'to_csv_sha256': csv_sha,
+        'ids_stable': ids_stable,
+        'inserted': len(inserted),
+        'updated': len(updated),
+        'deleted': len(deleted),
+        'unchanged': unchanged,
+        'elapsed_ms': round((dt.datetime.utcnow() - started).total_seconds() * 1000, 1),
     }
-    VERSION_FILE.write_text(json.dumps(metadata, ensure_ascii=False, indent=2))
-    print(f'Version info written to {VERSION_FILE}')
+    if args.incremental:
+        changes['inserted_ids'] = inserted
+        changes['updated_ids'] = updated
+        changes['deleted_ids'] = deleted
+    args.changes_out.parent.mkdir(parents=True, exist_ok=True)
+    args.changes_out.write_text(json.dumps(changes, ensure_ascii=False, indent=2))
+    print(f'Change summary written to {args.changes_out}')
 
 
 if __name__ == '__main__':
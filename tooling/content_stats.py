@@ -0,0 +1,66 @@
+"""Denormalized aggregates written at build time: ``items.audio_count``/``image_count`` and ``deck_level_stats``."""
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# level 为空串的行也保留，这样按 deck 求和就是总数
+STATS_SQL = '''
+CREATE TABLE IF NOT EXISTS deck_level_stats(
+  deck TEXT NOT NULL,
+  level TEXT NOT NULL,
+  item_count INTEGER NOT NULL,
+  audio_items INTEGER NOT NULL,
+  image_items INTEGER NOT NULL,
+  PRIMARY KEY(deck, level)
+) WITHOUT ROWID;
+'''
+
+
+def ensure_count_columns(conn: sqlite3.Connection):
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    for name in ('audio_count', 'image_count'):
+        if name not in have:
+            conn.execute(f'ALTER TABLE items ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0')
+
+
+def refresh_media_counts(conn: sqlite3.Connection, item_ids: Optional[Sequence[int]] = None):
+    """Recompute ``audio_count``/``image_count`` for all items, or only ``item_ids``."""
+    ensure_count_columns(conn)
+    sql = '''
+      UPDATE items SET
+        audio_count = (SELECT COUNT(*) FROM media m WHERE m.item_id = items.id AND m.type = 'audio'),
+        image_count = (SELECT COUNT(*) FROM media m WHERE m.item_id = items.id AND m.type = 'image')
+    '''
+    if item_ids is None:
+        conn.execute(sql)
+    else:
+        ids = sorted(set(item_ids))
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            conn.execute(f'{sql} WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+    conn.commit()
+
+
+def build_deck_level_stats(
+    conn: sqlite3.Connection, only: Optional[Iterable[Tuple[str, Optional[str]]]] = None
+) -> List[Dict[str, object]]:
+    """(Re)build ``deck_level_stats`` (only the ``only`` (deck, level) groups if given) and return all its rows."""
+    insert = '''
+        INSERT INTO deck_level_stats(deck, level, item_count, audio_items, image_items)
+        SELECT deck, COALESCE(TRIM(level), ''), COUNT(*),
+               SUM(audio_count > 0), SUM(image_count > 0)
+        FROM items
+    '''
+    group_by = "GROUP BY deck, COALESCE(TRIM(level), '')"
+    if only is None:
+        conn.execute('DROP TABLE IF EXISTS deck_level_stats')
+        conn.executescript(STATS_SQL)
+        conn.execute(f'{insert} {group_by}')
+    else:
+        conn.executescript(STATS_SQL)
+        for deck, level in sorted({(deck, (level or '').strip(' ')) for deck, level in only}):
+            conn.execute('DELETE FROM deck_level_stats WHERE deck=? AND level=?', (deck, level))
+            conn.execute(f"{insert} WHERE deck=? AND COALESCE(TRIM(level), '')=? {group_by}", (deck, level))
+    conn.commit()
+    cols = ('deck', 'level', 'item_count', 'audio_items', 'image_items')
+    rows = conn.execute(f'SELECT {", ".join(cols)} FROM deck_level_stats ORDER BY deck, level')
+    return [dict(zip(cols, r)) for r in rows]
@@ -0,0 +1,237 @@
+"""Media path dedup stage (``--dedup``): one ``media_paths`` row per media file, with a bytes-saved report.
+
+只去掉 App 不读或可以等价改写的重复：``items`` 必须仍是一张表（App 会在上面建索引），条目内容和 deck/level 不做拆分。
+
+    python tooling/dedup_content.py assets/jp_study_content.sqlite
+"""
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from media_resolver import MEDIA_COLUMNS, ensure_media_columns, rel_media_path
+from app_schema import CONTENT_INDEXES_SQL
+
+DEDUP_SQL = '''
+CREATE TABLE IF NOT EXISTS media_paths(
+  id INTEGER PRIMARY KEY,
+  rel_path TEXT NOT NULL,
+  size INTEGER,
+  mtime INTEGER,
+  file_exists INTEGER,
+  content_hash TEXT
+);
+'''
+# 早期版本的去重阶段还建过这两张表，App 不读；增量构建的旧库里见到就删掉
+RETIRED_TABLES = ('item_members', 'deck_levels')
+
+MANIFEST_COLUMNS = tuple(name for name, _ in MEDIA_COLUMNS if name != 'rel_path')
+_APP_INDEX = re.compile(r'CREATE INDEX IF NOT EXISTS (\w+) ON (\w+)\(([^)]*)\)')
+
+
+def has_media_paths(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='media_paths'").fetchone() is not None
+
+
+def ensure_dedup_columns(conn: sqlite3.Connection):
+    ensure_media_columns(conn)
+    have = {r[1] for r in conn.execute('PRAGMA table_info(media)')}
+    if 'path_id' not in have:
+        conn.execute('ALTER TABLE media ADD COLUMN path_id INTEGER')
+
+
+def used_bytes(conn: sqlite3.Connection) -> Optional[Dict[str, int]]:
+    """Bytes actually used per table/index (what is left after VACUUM), or ``None`` without ``dbstat``."""
+    try:
+        rows = conn.execute('SELECT name, SUM(pgsize - unused) FROM dbstat GROUP BY name').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    return {name: size for name, size in rows}
+
+
+def stable_ids(old: Dict, keys: List) -> Dict:
+    """Keep the ids ``old`` already gave; new keys get fresh ids after the largest one, in ``keys`` order.
+
+    增量构建时其他条目引用的 id 不变，按 deck 拆分的分片（``tooling/shard_db.py``）才不会因为别处新增一个路径而整体变化。
+    """
+    next_id = max(old.values(), default=0) + 1
+    ids = {}
+    for key in keys:
+        if key in old:
+            ids[key] = old[key]
+        else:
+            ids[key] = next_id
+            next_id += 1
+    return ids
+
+
+def dedup_media(conn: sqlite3.Connection, item_ids: Optional[Sequence[int]] = None) -> Dict[str, int]:
+    """Move the per-file manifest into ``media_paths`` and point ``media`` rows at it.
+
+    Idempotent: rows already deduplicated keep their manifest through the old ``media_paths`` entry,
+    rows freshly written by ``media_resolver`` (``rel_path`` set) bring their own, and rows without
+    ``rel_path`` fall back to the same ``rel_media_path`` rule. With ``item_ids`` (incremental builds)
+    only those items' media rows are rewritten and paths nothing points at any more are dropped.
+    """
+    ensure_dedup_columns(conn)
+    conn.executescript(DEDUP_SQL)
+    cols = ', '.join(MANIFEST_COLUMNS)
+    old = {}
+    old_ids = {}
+    for rel, path_id, *info in conn.execute(f'SELECT rel_path, id, {cols} FROM media_paths'):
+        old[rel] = tuple(info)
+        old_ids[rel] = path_id
+    select = f'SELECT id, path, rel_path, {cols} FROM media'
+    if item_ids is None:
+        rows = conn.execute(f'{select} ORDER BY id').fetchall()
+    else:
+        ids = sorted(set(item_ids))
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows.extend(conn.execute(f'{select} WHERE item_id IN ({",".join("?" * len(chunk))})', chunk))
+        rows.sort()
+
+    manifest: Dict[str, Tuple] = {}
+    rel_by_id: List[Tuple[int, str, str]] = []
+    for media_id, path, rel, *info in rows:
+        if rel is None:
+            rel = rel_media_path(path)
+            info = old.get(rel, (None,) * len(MANIFEST_COLUMNS))
+        if rel not in manifest or any(v is not None for v in info):
+            manifest[rel] = tuple(info)
+        rel_by_id.append((media_id, path, rel))
+
+    insert = f'INSERT INTO media_paths(id, rel_path, {cols}) VALUES(?,?{",?" * len(MANIFEST_COLUMNS)})'
+    if item_ids is None:
+        ids = stable_ids(old_ids, sorted(manifest))
+        conn.execute('DELETE FROM media_paths')
+        conn.executemany(insert, ((ids[rel], rel, *manifest[rel]) for rel in sorted(manifest)))
+    else:
+        added = sorted(rel for rel in manifest if rel not in old_ids)
+        ids = {**old_ids, **stable_ids(old_ids, added)}
+        conn.executemany(insert, ((ids[rel], rel, *manifest[rel]) for rel in added))
+        conn.executemany(
+            f'UPDATE media_paths SET {", ".join(f"{name}=?" for name in MANIFEST_COLUMNS)} WHERE id=?',
+            (
+                (*info, ids[rel])
+                for rel, info in manifest.items()
+                if rel in old_ids and info != old[rel] and any(v is not None for v in info)
+            ),
+        )
+    rewritten = 0
+    updates = []
+    for media_id, path, rel in rel_by_id:
+        # 只有 App 对改写后的路径解析出同一个文件时才改写（rel 里再出现一次 にほんご 时保持原样）
+        if rel and rel != path and rel_media_path(rel) == rel:
+            path = rel
+            rewritten += 1
+        updates.append((path, ids[rel], media_id))
+    nulls = ', '.join(f'{name}=NULL' for name in ('rel_path',) + MANIFEST_COLUMNS)
+    conn.executemany(f'UPDATE media SET path=?, path_id=?, {nulls} WHERE id=?', updates)
+    if item_ids is not None:
+        conn.execute('DELETE FROM media_paths WHERE id NOT IN (SELECT path_id FROM media WHERE path_id IS NOT NULL)')
+
+    by_hash: Dict[str, List[int]] = {}
+    for digest, size in conn.execute('SELECT content_hash, size FROM media_paths WHERE content_hash IS NOT NULL'):
+        by_hash.setdefault(digest, []).append(size or 0)
+    same_content = [sizes for sizes in by_hash.values() if len(sizes) > 1]
+    conn.commit()
+    return {
+        'media_rows': conn.execute('SELECT COUNT(*) FROM media').fetchone()[0],
+        'media_paths': conn.execute('SELECT COUNT(*) FROM media_paths').fetchone()[0],
+        'paths_rewritten': rewritten,
+        # 内容完全相同但路径不同的文件：媒体目录本身可以再去重（只报告，不改动）
+        'same_content_files': sum(len(s) - 1 for s in same_content),
+        'same_content_bytes': sum(sum(s[1:]) for s in same_content),
+    }
+
+
+def drop_retired_tables(conn: sqlite3.Connection) -> List[str]:
+    dropped = []
+    for name in RETIRED_TABLES:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone():
+            conn.execute(f'DROP TABLE {name}')
+            dropped.append(name)
+    conn.commit()
+    return dropped
+
+
+def dedup_indexes(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+    """Rename indexes that duplicate one of the app's content indexes under another name.
+
+    增量构建的 ``prepare_db`` 会把旧名字的索引再建回来，此时 App 名字的已经存在，直接删掉重复的那个。
+    """
+    renamed = []
+    existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    for app_name, table, cols in _APP_INDEX.findall(CONTENT_INDEXES_SQL):
+        want = [c.strip() for c in cols.split(',')]
+        for name, unique, origin, partial in [r[1:5] for r in conn.execute(f'PRAGMA index_list({table})')]:
+            if name == app_name or unique or partial or origin != 'c':
+                continue
+            info = conn.execute(f'PRAGMA index_xinfo({name})').fetchall()
+            keys = [r for r in info if r[5]]
+            if [r[2] for r in keys] == want and all(r[4] == 'BINARY' and not r[3] for r in keys):
+                conn.execute(f'DROP INDEX {name}')
+                if app_name not in existing:
+                    conn.execute(f'CREATE INDEX {app_name} ON {table}({", ".join(want)})')
+                    existing.add(app_name)
+                renamed.append((name, app_name))
+                break
+    conn.commit()
+    return renamed
+
+
+def dedup_content(conn: sqlite3.Connection, item_ids: Optional[Sequence[int]] = None) -> Dict[str, object]:
+    """Run the whole stage; returns the report stored under ``dedup`` in the version metadata.
+
+    ``item_ids`` is passed on to :func:`dedup_media`; the before/after byte count is skipped then.
+    """
+    before = used_bytes(conn) if item_ids is None else None
+    report: Dict[str, object] = {'media': dedup_media(conn, item_ids), 'tables_dropped': drop_retired_tables(conn)}
+    report['indexes_renamed'] = [f'{old} -> {new}' for old, new in dedup_indexes(conn)]
+    after = used_bytes(conn) if before is not None else None
+    if before is not None and after is not None:
+        deltas = {
+            name: after.get(name, 0) - before.get(name, 0)
+            for name in sorted(set(before) | set(after))
+            if after.get(name, 0) != before.get(name, 0)
+        }
+        report['bytes_before'] = sum(before.values())
+        report['bytes_after'] = sum(after.values())
+        report['bytes_saved'] = report['bytes_before'] - report['bytes_after']
+        report['objects'] = dict(sorted(deltas.items(), key=lambda kv: kv[1]))
+    return report
+
+
+def format_report(report: Dict[str, object]) -> str:
+    media = report['media']
+    lines = [
+        f"dedup: {media['media_rows']} media rows -> {media['media_paths']} media_paths "
+        f"({media['paths_rewritten']} paths made library-relative)",
+    ]
+    if report['tables_dropped']:
+        lines.append(f"  dropped {', '.join(report['tables_dropped'])} (no longer built)")
+    for renamed in report['indexes_renamed']:
+        lines.append(f'  index {renamed} (same columns as the app index)')
+    if media['same_content_files']:
+        lines.append(
+            f"  {media['same_content_files']} media files duplicate another file's content "
+            f"({media['same_content_bytes'] / 1024 / 1024:.1f} MB in the media folder)"
+        )
+    if 'bytes_saved' in report:
+        lines.append(
+            f"  {report['bytes_before'] / 1024 / 1024:.2f} MB -> {report['bytes_after'] / 1024 / 1024:.2f} MB, "
+            f"saved {report['bytes_saved'] / 1024:.1f} KB"
+        )
+        for name, delta in report['objects'].items():
+            lines.append(f'    {name:32} {delta / 1024:+10.1f} KB')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('assets/jp_study_content.sqlite')
+    conn = sqlite3.connect(target)
+    print(format_report(dedup_content(conn)))
+    conn.close()
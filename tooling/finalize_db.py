@@ -0,0 +1,72 @@
+"""Ship-ready finalize stage for the bundled content DB (journal mode, page size, ANALYZE, VACUUM, size report).
+
+    python tooling/finalize_db.py assets/jp_study_content.sqlite
+"""
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+DEFAULT_PAGE_SIZE = 4096  # 与 Android 文件系统块大小一致
+
+
+def size_breakdown(conn: sqlite3.Connection) -> List[Dict[str, object]]:
+    """Bytes and pages per table/index (via the ``dbstat`` virtual table), largest first."""
+    kinds = {name: (kind, tbl) for name, kind, tbl in conn.execute('SELECT name, type, tbl_name FROM sqlite_master')}
+    try:
+        rows = conn.execute('SELECT name, COUNT(*), SUM(pgsize) FROM dbstat GROUP BY name').fetchall()
+    except sqlite3.OperationalError:
+        return []  # SQLite 没有编译 dbstat
+    out = []
+    for name, pages, size in rows:
+        kind, tbl = kinds.get(name, ('table', name))
+        out.append({'name': name, 'type': kind, 'table': tbl, 'pages': pages, 'bytes': size})
+    out.sort(key=lambda r: (-r['bytes'], r['name']))
+    return out
+
+
+def finalize(path: Path, page_size: int = DEFAULT_PAGE_SIZE, vacuum: bool = True) -> Dict[str, object]:
+    """Finalize the DB at ``path`` in place and return a size report.
+
+    ``vacuum=False`` only switches back to the rollback journal (incremental builds without ``--finalize``).
+    """
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+        if vacuum:
+            conn.execute(f'PRAGMA page_size={int(page_size)}')
+            conn.execute('ANALYZE')
+            conn.execute('VACUUM')
+        objects = size_breakdown(conn) if vacuum else []
+        report = {
+            'vacuumed': vacuum,
+            'journal_mode': conn.execute('PRAGMA journal_mode').fetchone()[0],
+            'page_size': conn.execute('PRAGMA page_size').fetchone()[0],
+            'page_count': conn.execute('PRAGMA page_count').fetchone()[0],
+            'file_bytes': path.stat().st_size,
+            'objects': objects,
+        }
+    finally:
+        conn.close()
+    return report
+
+
+def format_report(report: Dict[str, object]) -> str:
+    total = report['file_bytes'] or 1
+    lines = [
+        f"{report['file_bytes'] / 1024 / 1024:.2f} MB, {report['page_count']} pages of {report['page_size']} B, "
+        f"journal_mode={report['journal_mode']}",
+    ]
+    if not report.get('vacuumed', True):
+        lines.append('  (not analyzed or vacuumed: run with --finalize before shipping)')
+    elif not report['objects']:
+        lines.append('  (dbstat not available in this SQLite build; no per-object breakdown)')
+    for obj in report['objects']:
+        label = obj['name'] if obj['type'] == 'table' else f"{obj['name']} ({obj['table']})"
+        lines.append(f"  {obj['type']:5} {label:40} {obj['bytes'] / 1024:10.1f} KB {obj['bytes'] * 100 / total:5.1f}%")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('assets/jp_study_content.sqlite')
+    print(format_report(finalize(target)))
@@ -0,0 +1,300 @@
+"""Row sources for the merged export: CSV, JSONL and Parquet/Arrow.
+
+    python tooling/input_sources.py data/grammar_vocab_index_all_sheets.csv data/grammar_vocab_index_all_sheets.parquet
+"""
+import argparse
+import csv
+import json
+import math
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+MANIFEST = Path('data/data_manifest.json')
+FORMATS = ('csv', 'jsonl', 'parquet', 'arrow')
+COLUMNAR = {'parquet', 'arrow'}
+# 这些格式产出的单元格已经去空白、nan 置空，提取时不必逐格 normalise_cell
+PRE_NORMALISED = COLUMNAR
+# JSONL 比 CSV 慢（3.2 万行 7.8 s 对 6.0 s，输出相同），只有列式格式优先于 CSV
+AUTO_ORDER = ('parquet', 'arrow', 'csv', 'jsonl')
+SUFFIXES = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+DEFAULT_SUFFIX = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet', 'arrow': '.arrow'}
+GROUP_COLUMN = 'sheet_name'
+DEFAULT_BATCH_ROWS = 16384
+MAX_RUNS = 16
+
+# (line_no, row)：row 与 headers 等长；line_no 按 CSV 行号计（表头算第 1 行），line:N 兜底 src_key 在各格式之间一致
+Rows = Iterator[Tuple[int, Sequence[str]]]
+
+
+def have_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise SystemExit('Parquet/Arrow input needs pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+def detect_format(path: Path) -> str:
+    fmt = SUFFIXES.get(path.suffix.lower())
+    if fmt is None:
+        raise SystemExit(f'Cannot tell the input format of {path}; pass --input-format ({", ".join(FORMATS)})')
+    return fmt
+
+
+def select_source(manifest_path: Path = MANIFEST, fmt: str = 'auto') -> Optional[Tuple[Path, str]]:
+    """``(path, format)`` of the first export listed in the manifest that exists, or ``None``.
+
+    Formats the exporter does not list (Parquet/Arrow) are looked up next to the listed ones
+    under the same stem, e.g. ``grammar_vocab_index_all_sheets.parquet``.
+    """
+    if not manifest_path.exists():
+        return None
+    files = json.loads(manifest_path.read_text(encoding='utf-8')).get('format', {})
+    listed = [files[f] for f in FORMATS if isinstance(files.get(f), str)]
+    if not listed:
+        return None
+    stem = Path(listed[0]).stem
+    for f in AUTO_ORDER if fmt == 'auto' else (fmt,):
+        if fmt == 'auto' and f in COLUMNAR and not have_pyarrow():
+            continue
+        path = manifest_path.parent / (files.get(f) or stem + DEFAULT_SUFFIX[f])
+        if path.exists():
+            return path, f
+    return None
+
+
+def iter_csv_rows(reader) -> Rows:
+    for line_no, row in enumerate(reader, start=2):
+        if row:
+            yield line_no, row
+
+
+@contextmanager
+def open_csv(path: Path):
+    with path.open(newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        headers = next(reader, [])
+        yield headers, iter_csv_rows(reader)
+
+
+def json_cell(value) -> str:
+    # null / NaN 记为空串，数字转成字符串
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and math.isnan(value):
+        return ''
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+@contextmanager
+def open_jsonl(path: Path):
+    with path.open(encoding='utf-8') as f:
+        lines = (line for line in enumerate(f, start=1) if line[1].strip())
+        first = next(lines, None)
+        headers = list(json.loads(first[1])) if first else []
+        pos = {name: i for i, name in enumerate(headers)}
+        width = len(headers)
+
+        def rows() -> Rows:
+            if first is None:
+                return
+            for record_no, (file_line, text) in enumerate(_chain(first, lines), start=2):
+                row = [''] * width
+                for key, value in json.loads(text).items():
+                    i = pos.get(key)
+                    if i is None:
+                        raise SystemExit(
+                            f'{path}:{file_line}: key {key!r} is not in the first record; '
+                            'all JSONL records must share one column set'
+                        )
+                    row[i] = json_cell(value)
+                yield record_no, row
+
+        yield headers, rows()
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def _clean_column(pa, pc, arr):
+    """Strip, and turn ``null`` / ``nan`` into ``''`` (same as ``normalise_cell``), column-wise."""
+    if not pa.types.is_string(arr.type) and not pa.types.is_large_string(arr.type):
+        arr = pc.cast(arr, pa.string())
+    arr = pc.utf8_trim_whitespace(arr)
+    arr = pc.if_else(pc.equal(pc.utf8_lower(arr), 'nan'), '', arr)
+    return pc.fill_null(arr, '')
+
+
+def deck_runs(pc, deck, n: int) -> List[Tuple[int, int]]:
+    """``[start, end)`` spans of consecutive rows with the same deck, computed column-wise."""
+    if n <= 1:
+        return [(0, n)]
+    changed = pc.not_equal(deck.slice(1), deck.slice(0, n - 1))
+    bounds = [0] + [i + 1 for i in pc.indices_nonzero(changed).to_pylist()] + [n]
+    return list(zip(bounds, bounds[1:]))
+
+
+def iter_batch_rows(batches: Iterable, headers: List[str], batch_rows: int = DEFAULT_BATCH_ROWS) -> Rows:
+    """Turn Arrow record batches into builder rows.
+
+    Per batch, columns that are entirely null are never touched; the rest are cleaned in Arrow.
+    The batch is then cut into deck runs (the export is sheet-ordered, so a batch normally spans one
+    or two sheets) and each run only converts the columns that have a value in that run. When a
+    batch is interleaved (more than ``MAX_RUNS`` runs) it is converted as one piece instead.
+    """
+    pa = require_pyarrow()
+    import pyarrow.compute as pc
+
+    width = len(headers)
+    group = headers.index(GROUP_COLUMN) if GROUP_COLUMN in headers else None
+    line_no = 2
+    for big in batches:
+        for start in range(0, big.num_rows, batch_rows):
+            batch = big.slice(start, batch_rows)
+            n = batch.num_rows
+            live = {j: _clean_column(pa, pc, col) for j, col in enumerate(batch.columns) if col.null_count < n}
+            runs = deck_runs(pc, live[group], n) if group in live else [(0, n)]
+            if len(runs) > MAX_RUNS:
+                runs = [(0, n)]
+            for a, b in runs:
+                m = b - a
+                blank = [''] * m
+                cols = [blank] * width
+                for j, col in live.items():
+                    part = col.slice(a, m)
+                    if pc.max(pc.utf8_length(part)).as_py():
+                        cols[j] = part.to_pylist()
+                for row in zip(*cols):
+                    yield line_no, row
+                    line_no += 1
+
+
+@contextmanager
+def open_columnar(path: Path, fmt: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+    pa = require_pyarrow()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(path) as pf:
+            headers = pf.schema_arrow.names
+            yield headers, iter_batch_rows(pf.iter_batches(batch_size=batch_rows), headers, batch_rows)
+        return
+
+    import pyarrow.ipc as ipc
+
+    with pa.memory_map(str(path)) as source:
+        try:
+            reader = ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            reader = ipc.open_stream(source)
+            batches = iter(reader)
+        yield reader.schema.names, iter_batch_rows(batches, reader.schema.names, batch_rows)
+
+
+def open_rows(path: Path, fmt: str, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """Context manager yielding ``(headers, rows)`` for any supported export format."""
+    if fmt == 'csv':
+        return open_csv(path)
+    if fmt == 'jsonl':
+        return open_jsonl(path)
+    if fmt in COLUMNAR:
+        return open_columnar(path, fmt, batch_rows)
+    raise SystemExit(f'Unknown input format: {fmt}')
+
+
+def convert(src: Path, dest: Path, batch_rows: int = DEFAULT_BATCH_ROWS) -> int:
+    """Rewrite an export in another format (empty and ``nan`` cells become null); returns the row count."""
+    src_fmt, dest_fmt = detect_format(src), detect_format(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + '.tmp')
+    count = 0
+    with open_rows(src, src_fmt, batch_rows) as (headers, rows):
+        if dest_fmt == 'csv':
+            with tmp.open('w', newline='', encoding='utf-8') as f:
+                w = csv.writer(f)
+                w.writerow(headers)
+                for _, row in rows:
+                    w.writerow(row)
+                    count += 1
+        elif dest_fmt == 'jsonl':
+            with tmp.open('w', encoding='utf-8') as f:
+                for _, row in rows:
+                    record = {h: (None if c.strip().lower() in ('', 'nan') else c) for h, c in zip(headers, row)}
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    count += 1
+        else:
+            count = _write_columnar(tmp, dest_fmt, headers, rows, batch_rows)
+    tmp.replace(dest)
+    return count
+
+
+def _write_columnar(dest: Path, fmt: str, headers: List[str], rows: Rows, batch_rows: int) -> int:
+    pa = require_pyarrow()
+    schema = pa.schema([(h, pa.string()) for h in headers])
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(dest, schema)
+    else:
+        import pyarrow.ipc as ipc
+
+        writer = ipc.new_file(str(dest), schema)
+    count = 0
+    buf: List[List[str]] = []
+
+    def flush():
+        cols = [
+            pa.array([None if c.strip().lower() in ('', 'nan') else c for c in col], pa.string())
+            for col in zip(*buf)
+        ]
+        writer.write_batch(pa.record_batch(cols, schema=schema))
+        buf.clear()
+
+    with writer:
+        for _, row in rows:
+            buf.append(row)
+            count += 1
+            if len(buf) >= batch_rows:
+                flush()
+        if buf:
+            flush()
+    return count
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Convert the merged export between CSV, JSONL, Parquet and Arrow.')
+    ap.add_argument('src', type=Path)
+    ap.add_argument('dest', type=Path, help='format is taken from the suffix (.csv .jsonl .parquet .arrow/.feather)')
+    ap.add_argument('--batch-rows', type=int, default=DEFAULT_BATCH_ROWS)
+    args = ap.parse_args()
+    count = convert(args.src, args.dest, args.batch_rows)
+    print(f'{count} rows -> {args.dest}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Durable ``src_key`` → ``items.id`` map committed next to the source export (``data/item_ids.json``)."""
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+FILE_NAME = 'item_ids.json'
+
+
+class ItemIdMap:
+    def __init__(self, path: Path, ids: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.ids: Dict[str, int] = {}
+        self.keys: Dict[int, str] = {}
+        self.next_id = 1
+        self.loaded = dict(ids or {})
+        for key, item_id in self.loaded.items():
+            self.pin(key, item_id)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['ItemIdMap']:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text(encoding='utf-8'))
+        ids = data.get('ids', {})
+        if len(set(ids.values())) != len(ids):
+            raise SystemExit(f'{path}: the same item id is mapped to more than one src_key')
+        return cls(path, ids)
+
+    def pin(self, key: str, item_id: int):
+        """Record ``key`` → ``item_id``; a different key holding that id loses it (the built DB wins)."""
+        old = self.keys.get(item_id)
+        if old is not None and old != key:
+            del self.ids[old]
+        prev = self.ids.get(key)
+        if prev is not None and prev != item_id:
+            del self.keys[prev]
+        self.ids[key] = item_id
+        self.keys[item_id] = key
+        self.next_id = max(self.next_id, item_id + 1)
+
+    def pin_all(self, pairs: Iterable[Tuple[str, int]]):
+        for key, item_id in pairs:
+            self.pin(key, item_id)
+
+    def assign(self, key: str) -> int:
+        item_id = self.ids.get(key)
+        if item_id is None:
+            item_id = self.next_id
+            self.pin(key, item_id)
+        return item_id
+
+    @property
+    def added(self) -> int:
+        return sum(1 for key in self.ids if key not in self.loaded)
+
+    def changed(self) -> bool:
+        return self.ids != self.loaded
+
+    def save(self):
+        # 按 id 排序、一行一个条目：新增行在 diff 里就是追加的几行
+        rows = sorted(self.ids.items(), key=lambda kv: kv[1])
+        body = ',\n'.join(f'{json.dumps(k, ensure_ascii=False)}: {v}' for k, v in rows)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text('{"ids": {\n' + body + '\n}}\n', encoding='utf-8')
+        self.loaded = dict(self.ids)
@@ -0,0 +1,374 @@
+"""Build-time cross references between items: ``item_links(item_id, related_id, kind)``.
+
+    python tooling/item_links.py assets/jp_study_content.sqlite
+"""
+import re
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from text_keys import KEY_COLUMNS, normalize_key, refresh_text_keys
+
+KINDS = ('term', 'reading', 'kanji', 'diff')
+KANJI_DECKS = {'日语汉字'}
+MAX_LINKS = 10
+
+# 关系是有向的行，对称关系两个方向各写一行
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS item_links(
+  item_id INTEGER NOT NULL,
+  related_id INTEGER NOT NULL,
+  kind TEXT NOT NULL,
+  PRIMARY KEY(item_id, related_id, kind)
+) WITHOUT ROWID;
+'''
+
+# 卡片页取相关条目：item_links 主键的区间查找 + items 主键查找
+RELATED_SQL = '''
+SELECT l.kind, i.id, i.deck, i.level, i.term, i.reading
+FROM item_links l JOIN items i ON i.id = l.related_id
+WHERE l.item_id = ?
+ORDER BY l.related_id, l.kind
+LIMIT ?
+'''
+
+KANJI = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+KANA_KEY = re.compile(r'[\u3041-\u309f\u30fc\u30fb ]+')  # 折叠后的 key：片假名已经变成平假名
+VS = re.compile(r'\s+vs\.?\s+', re.IGNORECASE)
+PLACEHOLDERS = '~～〜'
+IGNORED_TERMS = {'', '(未知)'}
+
+
+class Item(NamedTuple):
+    id: int
+    deck: str
+    term: str
+    term_key: str
+    reading_key: str
+
+
+class LinkSet:
+    """Ordered, de-duplicated and capped ``item -> [related]`` for one kind, plus join counters.
+
+    ``only`` limits the sources whose lists are built (incremental refresh); the lookups still see every item.
+    """
+
+    def __init__(self, cap: int = MAX_LINKS, only: Optional[Set[int]] = None):
+        self.cap = cap
+        self.only = only
+        self.links: Dict[int, Dict[int, None]] = defaultdict(dict)
+        self.stats = {'keys': 0, 'probes': 0, 'pairs': 0, 'links': 0, 'seconds': 0.0}
+
+    def wants(self, item_id: int) -> bool:
+        return self.only is None or item_id in self.only
+
+    def add(self, item_id: int, related_id: int):
+        if item_id == related_id or not self.wants(item_id):
+            return
+        related = self.links[item_id]
+        if related_id in related:
+            return
+        if len(related) >= self.cap:
+            return
+        related[related_id] = None
+        self.stats['links'] += 1
+
+    def rows(self, kind: str) -> Iterable[Tuple[int, int, str]]:
+        for item_id, related in self.links.items():
+            for related_id in related:
+                yield item_id, related_id, kind
+
+
+def has_item_links(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='item_links'").fetchone()
+    return row is not None
+
+
+def load_items(conn: sqlite3.Connection) -> List[Item]:
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    if not all(c in have for c in KEY_COLUMNS):
+        refresh_text_keys(conn)
+    return [Item(*row) for row in conn.execute('SELECT id, deck, term, term_key, reading_key FROM items ORDER BY id')]
+
+
+def link_groups(groups: Dict[str, List[Item]], links: LinkSet, skip_same_term: bool = False):
+    """Link every member of a hash group to the others: other decks first, then its own deck, each by id."""
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        links.stats['keys'] += 1
+        links.stats['pairs'] += len(members) * (len(members) - 1)
+        by_deck: Dict[str, List[Item]] = defaultdict(list)
+        for m in members:
+            by_deck[m.deck].append(m)
+        decks = sorted(by_deck)
+        for m in members:
+            if not links.wants(m.id):
+                continue
+            taken = 0
+            for deck in [d for d in decks if d != m.deck] + [m.deck]:
+                for other in by_deck[deck]:
+                    if taken >= links.cap:
+                        break
+                    if other.id == m.id or (skip_same_term and other.term_key == m.term_key):
+                        continue
+                    links.add(m.id, other.id)
+                    taken += 1
+
+
+def term_links(items: List[Item], only: Optional[Set[int]] = None) -> Tuple[LinkSet, Dict[str, List[Item]]]:
+    links = LinkSet(only=only)
+    t0 = time.perf_counter()
+    by_term: Dict[str, List[Item]] = defaultdict(list)
+    for it in items:
+        if it.term_key not in IGNORED_TERMS:
+            by_term[it.term_key].append(it)
+            links.stats['probes'] += 1
+    link_groups(by_term, links)
+    links.stats['seconds'] = time.perf_counter() - t0
+    return links, by_term
+
+
+def reading_key(it: Item) -> str:
+    # 纯假名写法本身就是读音：与读音相同的汉字写法条目相连
+    if it.reading_key:
+        return it.reading_key
+    return it.term_key if it.term_key and KANA_KEY.fullmatch(it.term_key) else ''
+
+
+def reading_links(items: List[Item], only: Optional[Set[int]] = None) -> LinkSet:
+    links = LinkSet(only=only)
+    t0 = time.perf_counter()
+    by_reading: Dict[str, List[Item]] = defaultdict(list)
+    for it in items:
+        key = reading_key(it)
+        if key:
+            by_reading[key].append(it)
+            links.stats['probes'] += 1
+    link_groups(by_reading, links, skip_same_term=True)
+    links.stats['seconds'] = time.perf_counter() - t0
+    return links
+
+
+def kanji_links(items: List[Item], only: Optional[Set[int]] = None) -> LinkSet:
+    links = LinkSet(only=only)
+    t0 = time.perf_counter()
+    cards: Dict[str, List[Item]] = defaultdict(list)  # 汉字 -> 日语汉字 deck 里含这个字的条目
+    for it in items:
+        if it.deck in KANJI_DECKS:
+            for ch in dict.fromkeys(KANJI.findall(it.term)):
+                cards[ch].append(it)
+    postings: Dict[str, List[Item]] = defaultdict(list)  # 汉字 -> 写法里含这个字的所有条目
+    for it in items:
+        chars = [ch for ch in dict.fromkeys(KANJI.findall(it.term)) if ch in cards]
+        links.stats['probes'] += len(chars)
+        for ch in chars:
+            postings[ch].append(it)
+    links.stats['keys'] = len(postings)
+    shortest_first = lambda it: (len(it.term), it.id)  # noqa: E731
+    for ch in postings:
+        postings[ch].sort(key=shortest_first)
+        cards[ch].sort(key=shortest_first)
+    seen_cards = set()
+    for ch, holders in cards.items():
+        for card in holders:
+            if card.id in seen_cards or not links.wants(card.id):
+                continue
+            seen_cards.add(card.id)
+            chars = [c for c in dict.fromkeys(KANJI.findall(card.term)) if c in postings]
+            candidates = sorted({it for c in chars for it in postings[c][:links.cap + 1]}, key=shortest_first)
+            links.stats['pairs'] += sum(len(postings[c]) for c in chars)
+            for it in candidates:
+                links.add(card.id, it.id)
+    for it in items:
+        if not links.wants(it.id):
+            continue
+        chars = [ch for ch in dict.fromkeys(KANJI.findall(it.term)) if ch in cards]
+        links.stats['pairs'] += sum(len(cards[ch]) for ch in chars)
+        for card in sorted({c for ch in chars for c in cards[ch][:links.cap + 1]}, key=shortest_first):
+            links.add(it.id, card.id)
+    links.stats['seconds'] = time.perf_counter() - t0
+    return links
+
+
+def diff_sides(term: str) -> Optional[Tuple[List[str], List[List[str]]]]:
+    """``(topic keys, [keys of each compared side])`` for a ``主题 ~ A vs ~ B`` term, else ``None``.
+
+    ``handle_diff`` 拼成 ``主题 ~ がおわる vs ~ をおわる``：第一边占位符 ``~`` 之前的是主题，
+    其余的词（去掉占位符）是被比较的表达；没有占位符时整边就是表达。
+    """
+    parts = VS.split(term)
+    if len(parts) < 2:
+        return None
+    topic: List[str] = []
+    sides: List[List[str]] = []
+    for n, part in enumerate(parts):
+        tokens = part.split()
+        marks = [i for i, tok in enumerate(tokens) if tok.strip(PLACEHOLDERS) == '']
+        if n == 0 and marks:
+            topic = [normalize_key(tok) for tok in tokens[:marks[0]]]
+            tokens = tokens[marks[0]:]
+        words = [tok.strip(PLACEHOLDERS) for tok in tokens]
+        keys = [normalize_key(w) for w in words if w]
+        joined = normalize_key(''.join(words))
+        sides.append(list(dict.fromkeys(k for k in keys + [joined] if k)))
+    return [k for k in topic if k], sides
+
+
+def cross_link(links: LinkSet, sources: List[Item], targets: List[Item]):
+    """``x -> y`` for every ``x`` in ``sources`` and ``y`` in ``targets``, visiting only pairs the cap can accept.
+
+    每个条目最多连 ``cap`` 个，``targets`` 已去重，所以 ``x`` 只需看前 ``cap + 1`` 个（``x`` 自己可能也在里面），
+    结果与两两全连相同，代价是 ``len(sources) × cap`` 而不是 ``len(sources) × len(targets)``。
+    """
+    head = targets[:links.cap + 1]
+    for x in sources:
+        if not links.wants(x.id):
+            continue
+        related = links.links[x.id]
+        for y in head:
+            if len(related) >= links.cap:
+                break
+            links.add(x.id, y.id)
+
+
+def diff_links(items: List[Item], by_term: Dict[str, List[Item]], only: Optional[Set[int]] = None) -> LinkSet:
+    links = LinkSet(only=only)
+    t0 = time.perf_counter()
+    for it in items:
+        parsed = diff_sides(it.term)
+        if parsed is None:
+            continue
+        topic, sides = parsed
+        links.stats['keys'] += 1
+        matched = []
+        for keys in [topic] + sides:
+            links.stats['probes'] += len(keys)
+            matched.append(list({m.id: m for k in keys for m in by_term.get(k, ())}.values()))
+        for group in matched:
+            links.stats['pairs'] += len(group)
+            for m in group:
+                links.add(it.id, m.id)
+                links.add(m.id, it.id)
+        side_groups = matched[1:]
+        for a in range(len(side_groups)):
+            for b in range(a + 1, len(side_groups)):
+                links.stats['pairs'] += len(side_groups[a]) * len(side_groups[b]) * 2
+                cross_link(links, side_groups[a], side_groups[b])
+                cross_link(links, side_groups[b], side_groups[a])
+    links.stats['seconds'] = time.perf_counter() - t0
+    return links
+
+
+def table_bytes(conn: sqlite3.Connection) -> Optional[int]:
+    try:
+        row = conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name='item_links'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0]
+
+
+def affected_items(items: List[Item], before: List[Item], item_ids: Iterable[int]) -> Set[int]:
+    """Items whose links can change after ``item_ids`` were written or deleted (``before``: their old rows).
+
+    每种关系里一个条目的列表只取决于它所在的组（同 term_key、同读音、含同一个汉字、同一个辨析条目），
+    所以只需重算改动前后与改动条目同组的条目。
+    """
+    changed = set(item_ids) | {it.id for it in before}
+    versions = before + [it for it in items if it.id in changed]
+    terms = {it.term_key for it in versions} - IGNORED_TERMS
+    readings = {reading_key(it) for it in versions} - {''}
+    chars = {ch for it in versions for ch in KANJI.findall(it.term)}
+    out = set(changed)
+    diff_terms = set()
+    for it in versions + items:
+        parsed = diff_sides(it.term)
+        if parsed is None:
+            continue
+        keys = {k for side in [parsed[0]] + parsed[1] for k in side}
+        if it.id in changed or keys & terms:
+            out.add(it.id)
+            diff_terms |= keys
+    for it in items:
+        if (
+            it.term_key in terms
+            or it.term_key in diff_terms
+            or reading_key(it) in readings
+            or not chars.isdisjoint(KANJI.findall(it.term))
+        ):
+            out.add(it.id)
+    return out
+
+
+def build_item_links(
+    conn: sqlite3.Connection, item_ids: Optional[Iterable[int]] = None, before: Iterable[Item] = ()
+) -> Dict[str, object]:
+    """(Re)build ``item_links``; returns the report stored under ``item_links``.
+
+    With ``item_ids`` (incremental builds) only the :func:`affected_items` are relinked.
+    """
+    started = time.perf_counter()
+    t0 = time.perf_counter()
+    items = load_items(conn)
+    only = None if item_ids is None else affected_items(items, list(before), item_ids)
+    load_s = time.perf_counter() - t0
+    term, by_term = term_links(items, only)
+    kinds = {
+        'term': term,
+        'reading': reading_links(items, only),
+        'kanji': kanji_links(items, only),
+        'diff': diff_links(items, by_term, only),
+    }
+
+    t0 = time.perf_counter()
+    conn.executescript(SCHEMA_SQL)
+    if only is None:
+        conn.execute('DELETE FROM item_links')
+    else:
+        ids = sorted(only)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            conn.execute(f'DELETE FROM item_links WHERE item_id IN ({",".join("?" * len(chunk))})', chunk)
+    rows = sorted(row for kind in KINDS for row in kinds[kind].rows(kind))
+    conn.executemany('INSERT INTO item_links(item_id, related_id, kind) VALUES(?,?,?)', rows)
+    conn.commit()
+    write_s = time.perf_counter() - t0
+    report = {
+        'items': len(items),
+        'rows': len(rows) if only is None else conn.execute('SELECT COUNT(*) FROM item_links').fetchone()[0],
+        'bytes': table_bytes(conn),
+        'load_seconds': round(load_s, 3),
+        'write_seconds': round(write_s, 3),
+        'seconds': round(time.perf_counter() - started, 3),
+        'max_links': MAX_LINKS,
+        'kinds': {k: {**kinds[k].stats, 'seconds': round(kinds[k].stats['seconds'], 3)} for k in KINDS},
+    }
+    if only is not None:
+        report['relinked'] = len(only)
+    return report
+
+
+def format_report(report: Dict[str, object]) -> str:
+    size = f", {report['bytes'] / 1024:.0f} KB" if report.get('bytes') else ''
+    lines = [
+        f"item_links: {report['rows']} links for {report['items']} items{size} in {report['seconds']:.2f}s "
+        f"(load {report['load_seconds']:.2f}s, write {report['write_seconds']:.2f}s, at most {report['max_links']} per item and kind)",
+    ]
+    if 'relinked' in report:
+        lines[0] += f", {report['relinked']} items relinked"
+    for kind, s in report['kinds'].items():
+        lines.append(
+            f"  {kind:8} {s['keys']:8} keys {s['probes']:9} probes {s['pairs']:11} candidate pairs "
+            f"-> {s['links']:8} links {s['seconds']:6.2f}s"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('assets/jp_study_content.sqlite')
+    conn = sqlite3.connect(target)
+    print(format_report(build_item_links(conn)))
+    conn.close()
@@ -0,0 +1,145 @@
+"""Pre-generate downscaled thumbnails for the ``image`` media of a built content DB (needs Pillow).
+
+    python tooling/make_thumbnails.py --media-root <本地にほんご目录>
+"""
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from media_resolver import redo_dedup, resolve_media
+
+VARIANTS_SQL = '''
+CREATE TABLE IF NOT EXISTS media_variants(
+  media_id INTEGER NOT NULL,
+  variant TEXT NOT NULL,
+  rel_path TEXT NOT NULL,
+  width INTEGER NOT NULL,
+  height INTEGER NOT NULL,
+  bytes INTEGER NOT NULL,
+  PRIMARY KEY(media_id, variant)
+) WITHOUT ROWID;
+'''
+
+FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+
+def make_thumbnail(src: str, dest: str, max_size: int, fmt: str, quality: int) -> Tuple[int, int, int]:
+    """Write one thumbnail (no upscaling); returns ``(width, height, bytes)``. Runs in a worker process."""
+    from PIL import Image
+
+    with Image.open(src) as im:
+        im.draft('RGB', (max_size, max_size))  # JPEG 直接按缩小比例解码，省内存也省时间
+        im = im.convert('RGB')
+        im.thumbnail((max_size, max_size), Image.LANCZOS)
+        tmp = dest + '.tmp'
+        im.save(tmp, FORMATS[fmt], quality=quality)
+        width, height = im.size
+    os.replace(tmp, dest)
+    return width, height, os.path.getsize(dest)
+
+
+def cached_size(path: Path) -> Optional[Tuple[int, int, int]]:
+    from PIL import Image
+
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+    except OSError:
+        return None
+    return width, height, path.stat().st_size
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--db', type=Path, default=Path('assets/jp_study_content.sqlite'))
+    ap.add_argument('--media-root', type=Path, required=True, help='local copy of the にほんご media folder')
+    ap.add_argument('--out', default='_thumbs', help='thumbnail folder, relative to --media-root')
+    ap.add_argument('--max-size', type=int, default=320, help='longest edge in pixels')
+    ap.add_argument('--format', choices=sorted(FORMATS), default='jpg')
+    ap.add_argument('--quality', type=int, default=80)
+    ap.add_argument('--workers', type=int, default=0, help='processes (0 = all cores)')
+    args = ap.parse_args()
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise SystemExit('make_thumbnails.py needs Pillow: pip install Pillow')
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(args.db)
+    resolve_media(conn, args.media_root)
+    conn.executescript(VARIANTS_SQL)
+    variant = f'thumb{args.max_size}'
+    rows = conn.execute(
+        "SELECT id, rel_path, content_hash FROM media WHERE type='image' AND file_exists=1 ORDER BY id"
+    ).fetchall()
+
+    out_dir = args.media_root / args.out
+    out_dir.mkdir(parents=True, exist_ok=True)
+    by_hash: Dict[str, List[int]] = {}
+    source: Dict[str, str] = {}
+    for media_id, rel, digest in rows:
+        by_hash.setdefault(digest, []).append(media_id)
+        source.setdefault(digest, rel)
+
+    results: Dict[str, Tuple[int, int, int]] = {}
+    todo: List[str] = []
+    for digest in by_hash:
+        hit = cached_size(out_dir / f'{digest}-{args.max_size}.{args.format}')
+        if hit is None:
+            todo.append(digest)
+        else:
+            results[digest] = hit
+
+    failed: List[Tuple[str, str]] = []
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            digest: pool.submit(
+                make_thumbnail,
+                str(args.media_root / source[digest]),
+                str(out_dir / f'{digest}-{args.max_size}.{args.format}'),
+                args.max_size,
+                args.format,
+                args.quality,
+            )
+            for digest in todo
+        }
+        for digest, fut in futures.items():
+            try:
+                results[digest] = fut.result()
+            except Exception as e:  # 单张图解码失败不影响其他图
+                failed.append((source[digest], f'{type(e).__name__}: {e}'))
+
+    conn.execute('DELETE FROM media_variants WHERE variant=?', (variant,))
+    conn.executemany(
+        'INSERT INTO media_variants(media_id, variant, rel_path, width, height, bytes) VALUES(?,?,?,?,?,?)',
+        (
+            (media_id, variant, f'{args.out}/{digest}-{args.max_size}.{args.format}', *results[digest])
+            for digest, ids in by_hash.items()
+            if digest in results
+            for media_id in ids
+        ),
+    )
+    conn.commit()
+    redo_dedup(conn)
+    conn.close()
+
+    source_bytes = sum((args.media_root / source[d]).stat().st_size for d in results)
+    thumb_bytes = sum(r[2] for r in results.values())
+    print(
+        f'{len(rows)} image rows, {len(by_hash)} distinct images: {len(todo) - len(failed)} generated, '
+        f'{len(by_hash) - len(todo)} cached, {len(failed)} failed '
+        f'({time.perf_counter() - started:.1f}s, {workers} workers)'
+    )
+    print(f'originals {source_bytes / 1024 / 1024:.1f} MB -> thumbnails {thumb_bytes / 1024 / 1024:.1f} MB')
+    for rel, err in failed[:20]:
+        print(f'  failed: {rel}: {err}')
+
+
+if __name__ == '__main__':
+    main()
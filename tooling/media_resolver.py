@@ -0,0 +1,180 @@
+"""Media resolver stage: library-relative paths plus a stat/hash manifest in the ``media`` table.
+
+    python tooling/media_resolver.py --db assets/jp_study_content.sqlite --media-root <本地にほんご目录>
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+MEDIA_MARKER = '/にほんご/'
+
+# 列名用 file_exists 而不是 exists：后者是 SQL 关键字，不加引号没法查询
+MEDIA_COLUMNS = (
+    ('rel_path', 'TEXT'),
+    ('size', 'INTEGER'),
+    ('mtime', 'INTEGER'),
+    ('file_exists', 'INTEGER'),
+    ('content_hash', 'TEXT'),
+)
+
+_DRIVE = re.compile(r'^[A-Za-z]:/')
+
+
+def rel_media_path(raw: Optional[str], marker: str = MEDIA_MARKER) -> str:
+    """Path relative to the media root, following the app's ``resolveMediaPath``."""
+    p = (raw or '').strip().replace('\\', '/')
+    if not p:
+        return ''
+    i = p.find(marker)
+    if i >= 0:
+        return p[i + len(marker):]
+    return _DRIVE.sub('', p, count=1).lstrip('/')
+
+
+def ensure_media_columns(conn: sqlite3.Connection):
+    have = {r[1] for r in conn.execute('PRAGMA table_info(media)')}
+    for name, decl in MEDIA_COLUMNS:
+        if name not in have:
+            conn.execute(f'ALTER TABLE media ADD COLUMN {name} {decl}')
+
+
+def stat_file(root: Path, rel: str, known: Dict[str, Tuple[int, int, str]]) -> Tuple[str, Optional[Tuple[int, int, str]]]:
+    """``(rel, (size, mtime, sha256))`` for one file, or ``(rel, None)`` when it is missing."""
+    path = root / rel
+    try:
+        st = path.stat()
+    except OSError:
+        return rel, None
+    if not path.is_file():
+        return rel, None
+    size, mtime = st.st_size, int(st.st_mtime)
+    prev = known.get(rel)
+    if prev and prev[0] == size and prev[1] == mtime and prev[2]:
+        return rel, prev
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return rel, (size, mtime, h.hexdigest())
+
+
+def resolve_media(
+    conn: sqlite3.Connection,
+    media_root: Optional[Path] = None,
+    workers: int = 8,
+    marker: str = MEDIA_MARKER,
+    item_ids: Optional[Sequence[int]] = None,
+) -> Dict[str, object]:
+    """Fill ``media.rel_path`` (and the stat columns when ``media_root`` is given); returns a summary.
+
+    The summary's ``missing`` list holds every distinct ``rel_path`` that was not found under ``media_root``.
+    ``item_ids`` limits the ``rel_path`` writes to those items' media; it is ignored with ``media_root``,
+    since files can change on disk without any row changing.
+    """
+    ensure_media_columns(conn)
+    rows = conn.execute('SELECT id, path, item_id FROM media ORDER BY id').fetchall()
+    rel_by_id = [(rel_media_path(path, marker), media_id) for media_id, path, _ in rows]
+    if item_ids is None or media_root is not None:
+        conn.executemany('UPDATE media SET rel_path=? WHERE id=?', rel_by_id)
+    else:
+        wanted = set(item_ids)
+        conn.executemany(
+            'UPDATE media SET rel_path=? WHERE id=?',
+            (pair for pair, (_, _, item_id) in zip(rel_by_id, rows) if item_id in wanted),
+        )
+    summary: Dict[str, object] = {'media_rows': len(rows), 'distinct_files': len({rel for rel, _ in rel_by_id if rel})}
+    if media_root is None:
+        conn.commit()
+        return summary
+
+    manifests = ['media']
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='media_paths'").fetchone():
+        manifests.append('media_paths')  # --dedup 过的库：清单在 media_paths 里
+    known = {
+        rel: (size, mtime, digest)
+        for table in manifests
+        for rel, size, mtime, digest in conn.execute(
+            f'SELECT rel_path, size, mtime, content_hash FROM {table} WHERE file_exists=1 AND content_hash IS NOT NULL'
+        )
+    }
+    wanted = sorted({rel for rel, _ in rel_by_id if rel})
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        found = dict(pool.map(lambda rel: stat_file(media_root, rel, known), wanted))
+    updates = []
+    for rel, media_id in rel_by_id:
+        info = found.get(rel)
+        if info is None:
+            updates.append((None, None, 0, None, media_id))
+        else:
+            updates.append((info[0], info[1], 1, info[2], media_id))
+    conn.executemany('UPDATE media SET size=?, mtime=?, file_exists=?, content_hash=? WHERE id=?', updates)
+    conn.commit()
+
+    missing = [rel for rel in wanted if found.get(rel) is None]
+    present = [info for info in found.values() if info is not None]
+    summary.update(
+        {
+            'media_root': str(media_root),
+            'found': len(present),
+            'missing_count': len(missing),
+            'bytes': sum(info[0] for info in present),
+            'missing': missing,
+        }
+    )
+    return summary
+
+
+def format_summary(summary: Dict[str, object], top: int = 10) -> str:
+    lines = [f"media: {summary['media_rows']} rows, {summary['distinct_files']} distinct files"]
+    if 'media_root' not in summary:
+        return lines[0] + ' (no --media-root; rel_path only)'
+    lines[0] += (
+        f", {summary['found']} found ({summary['bytes'] / 1024 / 1024:.1f} MB), "
+        f"{summary['missing_count']} missing under {summary['media_root']}"
+    )
+    by_dir = Counter(rel.split('/', 1)[0] if '/' in rel else '.' for rel in summary['missing'])
+    for folder, n in by_dir.most_common(top):
+        lines.append(f'  missing {n:6} in {folder}/')
+    return '\n'.join(lines)
+
+
+def write_missing_report(path: Path, summary: Dict[str, object]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(summary.get('missing', []), ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def redo_dedup(conn: sqlite3.Connection):
+    """Put the manifest back into ``media_paths`` on a ``--dedup`` build (``resolve_media`` fills ``media``)."""
+    from dedup_content import dedup_media, has_media_paths
+
+    if has_media_paths(conn):
+        dedup_media(conn)
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Resolve media paths of an existing content DB against a local media tree.')
+    ap.add_argument('--db', type=Path, default=Path('assets/jp_study_content.sqlite'))
+    ap.add_argument('--media-root', type=Path, help='local copy of the にほんご media folder')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='threads for stat + hashing')
+    ap.add_argument('--missing-report', type=Path, help='write the list of missing rel_paths to this JSON file')
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    summary = resolve_media(conn, args.media_root, args.workers)
+    redo_dedup(conn)
+    conn.close()
+    print(format_summary(summary))
+    if args.missing_report:
+        write_missing_report(args.missing_report, summary)
+        print(f'Missing media list written to {args.missing_report}')
+
+
+if __name__ == '__main__':
+    main()
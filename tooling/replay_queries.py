@@ -0,0 +1,351 @@
+"""Replay the app's hot SQL against a built content DB and check the query plans.
+
+    python tooling/replay_queries.py --db assets/jp_study_content.sqlite
+"""
+import argparse
+import datetime as dt
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from app_schema import CONTENT_INDEXES_SQL, USER_TABLES_SQL
+from bench_search import pct, sample_queries
+
+MEM_FILTERS = ('all', 'newOnly', 'dueOnly', 'learnedOnly', 'masteredOnly')
+FULL_SCAN = re.compile(r'^SCAN (items|i)\b(?!.*USING .*INDEX)')
+INDEX_SCAN = re.compile(r'^SCAN (items|i) USING (COVERING )?INDEX')
+
+
+def epoch_day(now: Optional[dt.datetime] = None) -> int:
+    """``epochDay(DateTime.now())`` from lib/db.dart (UTC days since epoch)."""
+    now = now or dt.datetime.now(dt.timezone.utc)
+    return (now.date() - dt.date(1970, 1, 1)).days
+
+
+# ---- lib/pages/library.dart -------------------------------------------------
+
+def library_decks():
+    return '''
+      SELECT DISTINCT deck FROM items
+      ORDER BY deck;
+    ''', []
+
+
+def library_levels(deck: str):
+    return '''
+      SELECT DISTINCT level FROM items
+      WHERE deck=? AND level IS NOT NULL AND TRIM(level)!=''
+      ORDER BY level;
+    ''', [deck]
+
+
+def library_items(today: int, deck: str, level: str, q: str, mem: str, offset: int, limit: int = 50):
+    """``_queryItems``: the library list for one page."""
+    where = ['i.deck=?']
+    args: List[object] = [deck]
+    if level != '全部':
+        where.append('i.level=?')
+        args.append(level)
+    if mem == 'newOnly':
+        where.append('s.item_id IS NULL')
+    elif mem == 'dueOnly':
+        where.append('s.item_id IS NOT NULL AND s.due_day <= ?')
+        args.append(today)
+    elif mem == 'learnedOnly':
+        where.append('s.item_id IS NOT NULL')
+    elif mem == 'masteredOnly':
+        where.append('s.item_id IS NOT NULL AND s.reps >= 4 AND s.interval_days >= 21 AND s.due_day > ?')
+        args.append(today)
+    qq = q.strip()
+    if qq:
+        where.append('i.search_text LIKE ?')
+        args.append(f'%{qq}%')
+    sql = f'''
+      SELECT i.id, i.term, i.reading, i.level, i.meaning,
+             (SELECT COUNT(*) FROM media WHERE item_id=i.id AND type='audio') AS audio_count,
+             (SELECT COUNT(*) FROM media WHERE item_id=i.id AND type='image') AS image_count,
+             COALESCE(s.reps,0) AS reps,
+             COALESCE(s.interval_days,0) AS interval_days,
+             COALESCE(s.due_day,0) AS due_day,
+             CASE
+               WHEN s.item_id IS NULL THEN 0
+               WHEN s.due_day <= {today} THEN 1
+               WHEN s.reps >= 4 AND s.interval_days >= 21 AND s.due_day > {today} THEN 3
+               ELSE 2
+             END AS mem_tag
+      FROM items i
+      LEFT JOIN srs s ON s.item_id=i.id
+      WHERE {' AND '.join(where)}
+      ORDER BY i.id DESC
+      LIMIT ? OFFSET ?;
+    '''
+    return sql, args + [limit, offset]
+
+
+# ---- lib/pages/study.dart ---------------------------------------------------
+
+def study_decks():
+    return '''
+        SELECT DISTINCT deck
+        FROM items
+        ORDER BY deck;
+      ''', []
+
+
+def study_levels(deck: str):
+    return '''
+      SELECT DISTINCT level
+      FROM items
+      WHERE deck=? AND level IS NOT NULL AND TRIM(level)!=''
+      ORDER BY level DESC;
+    ''', [deck]
+
+
+def _study_where(deck: str, level: str):
+    where = ['i.deck=?']
+    args: List[object] = [deck]
+    if level != '全部':
+        where.append('i.level=?')
+        args.append(level)
+    return where, args
+
+
+def study_new(deck: str, level: str, target: int = 20):
+    where, args = _study_where(deck, level)
+    candidate = max(target * 4, target)
+    return f'''
+        SELECT i.id AS id
+        FROM items i
+        LEFT JOIN srs s ON s.item_id=i.id
+        WHERE {' AND '.join(where)} AND s.item_id IS NULL
+        ORDER BY i.id DESC
+        LIMIT ?;
+      ''', args + [candidate]
+
+
+def study_due(today: int, deck: str, level: str, target: int = 20):
+    where, args = _study_where(deck, level)
+    candidate = max(target * 4, target)
+    return f'''
+        SELECT i.id AS id
+        FROM items i
+        JOIN srs s ON s.item_id=i.id
+        WHERE {' AND '.join(where)} AND s.due_day <= ?
+        ORDER BY s.due_day ASC, i.id DESC
+        LIMIT ?;
+      ''', args + [today, candidate]
+
+
+# ---- detail pages (library/study), stats page, DbSnapshot.fetch ---------------
+
+def detail_item(item_id: int):
+    return 'SELECT * FROM items WHERE id=? LIMIT 1', [item_id]
+
+
+def detail_media(item_id: int):
+    return 'SELECT * FROM media WHERE item_id=?', [item_id]
+
+
+def detail_srs(item_id: int):
+    return 'SELECT * FROM srs WHERE item_id=? LIMIT 1', [item_id]
+
+
+def stats_days(today: int):
+    return '''
+        SELECT day,
+               SUM(CASE WHEN grade>=3 THEN 1 ELSE 0 END) AS remembered,
+               SUM(CASE WHEN grade<=1 THEN 1 ELSE 0 END) AS forgotten,
+               COUNT(*) AS total
+        FROM review_log
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day
+        ORDER BY day DESC;
+      ''', [today - 29, today]
+
+
+def snapshot_meta():
+    return '''
+      SELECT COUNT(*) AS item_count, COUNT(DISTINCT deck) AS deck_count FROM items;
+    ''', []
+
+
+def snapshot_media():
+    return 'SELECT COUNT(*) AS media_count FROM media;', []
+
+
+def snapshot_due(today: int):
+    return 'SELECT COUNT(*) AS due_count FROM srs WHERE due_day <= ?', [today]
+
+
+def snapshot_new():
+    return '''
+      SELECT COUNT(*) AS new_count
+      FROM items i
+      LEFT JOIN srs s ON s.item_id=i.id
+      WHERE s.item_id IS NULL;
+    ''', []
+
+
+@dataclass
+class Case:
+    name: str
+    make: Callable[[random.Random], Tuple[str, list]]
+    whole_table: bool = False  # 计数类查询本来就要读整张表
+
+
+def populate_user_tables(
+    conn: sqlite3.Connection, today: int, learned: float, history_days: int, seed: int, app_indexes: bool = True
+):
+    """Synthetic progress: a ``learned`` fraction of items in ``srs`` and their past reviews in ``review_log``."""
+    rng = random.Random(seed)
+    try:
+        conn.executescript(USER_TABLES_SQL)
+    except sqlite3.OperationalError as e:
+        raise SystemExit(f"the DB's srs/review_log tables don't match lib/db.dart ensureUserTables: {e}")
+    if app_indexes:
+        conn.executescript(CONTENT_INDEXES_SQL)
+    items = conn.execute('SELECT id, deck, level FROM items').fetchall()
+    picked = rng.sample(items, int(len(items) * learned))
+    srs, log = [], []
+    for item_id, deck, level in picked:
+        reps = rng.randint(1, 8)
+        interval = rng.choice([1, 3, 7, 14, 21, 30, 60, 120])
+        last = today - rng.randint(0, min(interval, history_days))
+        srs.append((item_id, deck, level, 2, round(rng.uniform(1.3, 2.8), 2), interval, last + interval, reps,
+                    rng.randint(0, 3), last))
+        for _ in range(reps):
+            day = today - rng.randint(0, history_days)
+            log.append((item_id, day, rng.choice([1, 2, 3, 3, 4]), day * 86400 + rng.randint(0, 86399)))
+    log.sort(key=lambda r: r[3])
+    conn.executemany('INSERT OR REPLACE INTO srs VALUES(?,?,?,?,?,?,?,?,?,?)', srs)
+    conn.executemany('INSERT INTO review_log(item_id, day, grade, ts) VALUES(?,?,?,?)', log)
+    conn.commit()
+    return len(srs), len(log)
+
+
+def build_cases(conn: sqlite3.Connection, today: int, seed: int) -> List[Case]:
+    decks = [r[0] for r in conn.execute('SELECT DISTINCT deck FROM items ORDER BY deck')]
+    levels = {
+        d: ['全部'] + [r[0] for r in conn.execute(*library_levels(d))]
+        for d in decks
+    }
+    # 与 App 一样偏向大词库：library 默认打开红宝书
+    weights = [conn.execute('SELECT COUNT(*) FROM items WHERE deck=?', (d,)).fetchone()[0] for d in decks]
+    words = [q for q, _ in sample_queries(conn, 200, seed)] or ['']
+    max_id = conn.execute('SELECT MAX(id) FROM items').fetchone()[0] or 1
+
+    def deck_level(rng: random.Random):
+        d = rng.choices(decks, weights)[0]
+        return d, rng.choice(levels[d])
+
+    def lib(mem: str, search: bool, deep: bool):
+        def make(rng: random.Random):
+            d, lv = deck_level(rng)
+            offset = rng.choice([50, 200, 500]) if deep else 0
+            return library_items(today, d, lv, rng.choice(words) if search else '', mem, offset)
+        return make
+
+    cases = [
+        Case('library.decks', lambda rng: library_decks(), whole_table=True),
+        Case('library.levels', lambda rng: library_levels(deck_level(rng)[0])),
+    ]
+    for mem in MEM_FILTERS:
+        cases.append(Case(f'library.list[{mem}]', lib(mem, False, False)))
+    cases += [
+        Case('library.list[all,page>1]', lib('all', False, True)),
+        Case('library.search[all]', lib('all', True, False)),
+        Case('library.search[newOnly]', lib('newOnly', True, False)),
+        Case('library.detail.item', lambda rng: detail_item(rng.randint(1, max_id))),
+        Case('library.detail.media', lambda rng: detail_media(rng.randint(1, max_id))),
+        Case('library.detail.srs', lambda rng: detail_srs(rng.randint(1, max_id))),
+        Case('study.decks', lambda rng: study_decks(), whole_table=True),
+        Case('study.levels', lambda rng: study_levels(deck_level(rng)[0])),
+        Case('study.new', lambda rng: study_new(*deck_level(rng))),
+        Case('study.due', lambda rng: study_due(today, *deck_level(rng))),
+        Case('stats.days', lambda rng: stats_days(today)),
+        Case('snapshot.meta', lambda rng: snapshot_meta(), whole_table=True),
+        Case('snapshot.media', lambda rng: snapshot_media(), whole_table=True),
+        Case('snapshot.due', lambda rng: snapshot_due(today)),
+        Case('snapshot.new', lambda rng: snapshot_new(), whole_table=True),
+    ]
+    return cases
+
+
+def plan_lines(conn: sqlite3.Connection, sql: str, args: Sequence[object]) -> List[str]:
+    return [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', list(args))]
+
+
+def check_plan(lines: List[str], whole_table: bool) -> Optional[str]:
+    """Problem description, or ``None`` when the plan is acceptable.
+
+    ``whole_table`` 查询（``COUNT(*)`` 等整表计数）允许扫描索引，但仍不能扫描 ``items`` 表本身。
+    """
+    for line in lines:
+        if FULL_SCAN.match(line):
+            return f'full table scan: {line}'
+        if INDEX_SCAN.match(line) and not whole_table:
+            return f'full index scan: {line}'
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay the app's SQL against a built DB and check query plans.")
+    ap.add_argument('--db', type=Path, default=Path('assets/jp_study_content.sqlite'))
+    ap.add_argument('--runs', type=int, default=50, help='executions per query (parameters vary per run)')
+    ap.add_argument('--learned', type=float, default=0.3, help='fraction of items with synthetic srs rows')
+    ap.add_argument('--history-days', type=int, default=365)
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--no-app-indexes', action='store_true',
+                    help='skip ensureContentIndexes, i.e. test only the indexes the builder ships')
+    args = ap.parse_args()
+
+    today = epoch_day()
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / args.db.name
+        shutil.copyfile(args.db, copy)
+        conn = sqlite3.connect(copy)
+        n_srs, n_log = populate_user_tables(
+            conn, today, args.learned, args.history_days, args.seed, not args.no_app_indexes
+        )
+        items = conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+        print(f'{args.db}: {items} items, synthetic srs {n_srs} rows, review_log {n_log} rows, today={today}')
+
+        rng = random.Random(args.seed)
+        failures = []
+        print(f'\n  {"query":28}{"p50 ms":>10}{"p95 ms":>10}{"max ms":>10}  plan')
+        for case in build_cases(conn, today, args.seed):
+            times: List[float] = []
+            problem = None
+            seen_plans = set()
+            for _ in range(args.runs):
+                sql, qargs = case.make(rng)
+                lines = plan_lines(conn, sql, qargs)
+                key = tuple(lines)
+                if key not in seen_plans:
+                    seen_plans.add(key)
+                    problem = problem or check_plan(lines, case.whole_table)
+                t0 = time.perf_counter()
+                conn.execute(sql, qargs).fetchall()
+                times.append((time.perf_counter() - t0) * 1000)
+            status = 'ok' if problem is None else 'FAIL'
+            print(f'  {case.name:28}{pct(times, 50):10.3f}{pct(times, 95):10.3f}{max(times):10.3f}  {status}')
+            if problem:
+                failures.append((case.name, problem))
+        conn.close()
+
+    if failures:
+        print('\nplan check failed:')
+        for name, problem in failures:
+            print(f'  {name}: {problem}')
+        raise SystemExit(1)
+    print('\nall plans avoid full scans of items')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Materialized daily review rollup (``review_daily``) and raw-log archiving for a copy of the user progress DB.
+
+    python tooling/review_rollup.py user_copy.sqlite --archive-days 180 --vacuum --trigger
+    python tooling/review_rollup.py user_copy.sqlite --archive-days 180 --bench  # 只计时，不改库
+    python tooling/review_rollup.py --synthetic 100000
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app_schema import USER_TABLES_SQL
+from bench_search import pct
+from replay_queries import epoch_day, plan_lines, stats_days
+
+STATS_WINDOW = 30  # lib/pages/stats.dart 显示最近 30 天
+
+# review_daily_meta 记下已汇总到的 review_log.id（水位）；review_log_archive 保留原 id，
+# ts 存成当天内的秒数（ts = day * 86400 + sec），可无损还原
+ROLLUP_SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS review_daily(
+  day INTEGER PRIMARY KEY,
+  again INTEGER NOT NULL DEFAULT 0,
+  hard INTEGER NOT NULL DEFAULT 0,
+  good INTEGER NOT NULL DEFAULT 0,
+  easy INTEGER NOT NULL DEFAULT 0,
+  distinct_items INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS review_daily_meta(
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS review_log_archive(
+  day INTEGER NOT NULL,
+  id INTEGER NOT NULL,
+  item_id INTEGER NOT NULL,
+  grade INTEGER NOT NULL,
+  sec INTEGER NOT NULL,
+  PRIMARY KEY(day, id)
+) WITHOUT ROWID;
+'''
+
+# 每行评分累加到当天；distinct_items 只在当天第一次出现该 item 时 +1（走 idx_log_day）。
+# 不用 UPSERT：Android 旧版本自带的 SQLite 低于 3.24。
+ROLLUP_TRIGGER_SQL = '''
+CREATE TRIGGER IF NOT EXISTS review_daily_log_insert AFTER INSERT ON review_log
+BEGIN
+  INSERT OR IGNORE INTO review_daily(day) VALUES (new.day);
+  UPDATE review_daily SET
+    again = again + (new.grade <= 1),
+    hard = hard + (new.grade = 2),
+    good = good + (new.grade = 3),
+    easy = easy + (new.grade >= 4),
+    distinct_items = distinct_items + NOT EXISTS(
+      SELECT 1 FROM review_log WHERE day = new.day AND item_id = new.item_id AND id <> new.id
+    )
+  WHERE day = new.day;
+END;
+'''
+
+# 与 stats.dart 的查询结果逐行相同（remembered = grade>=3，forgotten = grade<=1）。
+ROLLUP_STATS_SQL = '''
+SELECT day, good + easy AS remembered, again AS forgotten, again + hard + good + easy AS total
+FROM review_daily
+WHERE day BETWEEN ? AND ?
+ORDER BY day DESC
+'''
+
+_AGGREGATE = '''
+SELECT day, SUM(grade <= 1), SUM(grade = 2), SUM(grade = 3), SUM(grade >= 4), COUNT(DISTINCT item_id)
+FROM (
+  SELECT day, item_id, grade FROM review_log {where}
+  UNION ALL
+  SELECT day, item_id, grade FROM review_log_archive {where}
+)
+GROUP BY day
+'''
+
+
+def has_review_log(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='review_log'").fetchone()
+    return row is not None
+
+
+def has_rollup(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='review_daily'").fetchone()
+    return row is not None
+
+
+def ensure_rollup_tables(conn: sqlite3.Connection):
+    if not has_review_log(conn):
+        raise SystemExit('no review_log table: not a user progress DB (lib/db.dart ensureUserTables)')
+    conn.executescript(ROLLUP_SCHEMA_SQL)
+
+
+def _watermark(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT value FROM review_daily_meta WHERE key='last_log_id'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def refresh_rollup(conn: sqlite3.Connection) -> Dict[str, object]:
+    """Roll ``review_log`` rows past the watermark into ``review_daily``, recomputing each touched day in full."""
+    t0 = time.perf_counter()
+    ensure_rollup_tables(conn)
+    last_id = _watermark(conn)
+    top = conn.execute('SELECT COALESCE(MAX(id), 0) FROM review_log').fetchone()[0]
+    new_rows = conn.execute('SELECT COUNT(*) FROM review_log WHERE id > ?', (last_id,)).fetchone()[0]
+    with conn:
+        if last_id == 0:
+            conn.execute('DELETE FROM review_daily')
+            conn.execute('INSERT INTO review_daily ' + _AGGREGATE.format(where=''))
+            days = conn.execute('SELECT COUNT(*) FROM review_daily').fetchone()[0]
+        else:
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS rollup_days(day INTEGER PRIMARY KEY)')
+            conn.execute('DELETE FROM temp.rollup_days')
+            conn.execute(
+                'INSERT OR IGNORE INTO temp.rollup_days SELECT day FROM review_log WHERE id > ? AND id <= ?',
+                (last_id, top),
+            )
+            days = conn.execute('SELECT COUNT(*) FROM temp.rollup_days').fetchone()[0]
+            where = 'WHERE day IN (SELECT day FROM temp.rollup_days)'
+            conn.execute('INSERT OR REPLACE INTO review_daily ' + _AGGREGATE.format(where=where))
+        conn.execute("INSERT OR REPLACE INTO review_daily_meta(key, value) VALUES ('last_log_id', ?)", (top,))
+    return {
+        'mode': 'full' if last_id == 0 else 'incremental',
+        'new_rows': new_rows,
+        'days': days,
+        'last_log_id': top,
+        'seconds': time.perf_counter() - t0,
+    }
+
+
+def archive_log(conn: sqlite3.Connection, keep_days: int, today: int) -> Dict[str, object]:
+    """Move rolled-up ``review_log`` rows older than ``keep_days`` into ``review_log_archive``."""
+    if keep_days < STATS_WINDOW:
+        raise SystemExit(f'--archive-days must be at least {STATS_WINDOW} (the stats page window)')
+    t0 = time.perf_counter()
+    last_id = _watermark(conn)
+    cutoff = today - keep_days + 1
+    with conn:
+        moved = conn.execute(
+            'INSERT INTO review_log_archive(day, id, item_id, grade, sec) '
+            'SELECT day, id, item_id, grade, ts - day * 86400 FROM review_log WHERE day < ? AND id <= ?',
+            (cutoff, last_id),
+        ).rowcount
+        conn.execute('DELETE FROM review_log WHERE day < ? AND id <= ?', (cutoff, last_id))
+    return {'moved': moved, 'cutoff_day': cutoff, 'seconds': time.perf_counter() - t0}
+
+
+def install_trigger(conn: sqlite3.Connection):
+    ensure_rollup_tables(conn)
+    conn.executescript(ROLLUP_TRIGGER_SQL)
+
+
+def verify_rollup(conn: sqlite3.Connection) -> List[int]:
+    """Days whose ``review_daily`` row differs from a fresh aggregate over ``review_log`` + archive."""
+    fresh = {r[0]: tuple(r[1:]) for r in conn.execute(_AGGREGATE.format(where=''))}
+    stored = {
+        r[0]: tuple(r[1:])
+        for r in conn.execute('SELECT day, again, hard, good, easy, distinct_items FROM review_daily')
+        if any(r[1:])
+    }
+    return sorted(d for d in fresh.keys() | stored.keys() if fresh.get(d) != stored.get(d))
+
+
+def _time_query(conn: sqlite3.Connection, sql: str, args: list, runs: int) -> Tuple[List[float], list]:
+    rows: list = []
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        rows = conn.execute(sql, args).fetchall()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times, rows
+
+
+def bench_stats(conn: sqlite3.Connection, today: int, runs: int, label: str) -> Dict[str, object]:
+    """Time the stats page's ``GROUP BY day`` query and, once refreshed, the rollup query over the same window."""
+    out: Dict[str, object] = {'label': label, 'log_rows': conn.execute('SELECT COUNT(*) FROM review_log').fetchone()[0]}
+    sql, args = stats_days(today)
+    times, raw = _time_query(conn, sql, args, runs)
+    out['raw'] = (pct(times, 50), pct(times, 95))
+    out['raw_plan'] = plan_lines(conn, sql, args)
+    if has_rollup(conn) and _watermark(conn):
+        times, rolled = _time_query(conn, ROLLUP_STATS_SQL, args, runs)
+        out['rollup'] = (pct(times, 50), pct(times, 95))
+        out['rollup_plan'] = plan_lines(conn, ROLLUP_STATS_SQL, args)
+        rolled = [r for r in rolled if r[3]]
+        out['same'] = [tuple(r) for r in raw] == [tuple(r) for r in rolled]
+    return out
+
+
+def format_bench(result: Dict[str, object]) -> str:
+    lines = [f"stats query, {result['label']} ({result['log_rows']} review_log rows):"]
+    for key in ('raw', 'rollup'):
+        if key in result:
+            p50, p95 = result[key]
+            name = 'GROUP BY review_log' if key == 'raw' else 'review_daily'
+            lines.append(f'  {name:20} p50 {p50:8.3f} ms  p95 {p95:8.3f} ms')
+            lines.extend(f'    {line}' for line in result[f'{key}_plan'])
+    if 'same' in result:
+        lines.append(f"  results identical: {'yes' if result['same'] else 'NO'}")
+    return '\n'.join(lines)
+
+
+def table_bytes(conn: sqlite3.Connection, names: List[str]) -> Optional[int]:
+    """Pages used by the given tables and their indexes (needs the ``dbstat`` virtual table)."""
+    marks = ','.join('?' * len(names))
+    try:
+        row = conn.execute(
+            f'SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name IN ({marks}))',
+            names,
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] or 0
+
+
+def synthesize(path: Path, n_cards: int, today: int, seed: int = 7) -> int:
+    """A year of synthetic reviews for ``n_cards`` cards (``srs_forecast.simulate``) written to a fresh DB."""
+    import numpy as np  # 只有合成数据需要
+
+    from srs_forecast import Cards, simulate
+
+    probs = np.array([[0.25, 0.15, 0.45, 0.15], [0.1, 0.15, 0.6, 0.15]])
+    _, _, log = simulate(Cards.empty(0), today - 364, 365, probs, new_per_day=n_cards / 365, seed=seed, record=True)
+    item, day, grade = (a.tolist() for a in log)
+    rng = np.random.default_rng(seed)
+    ts = (np.array(day, np.int64) * 86400 + rng.integers(0, 86400, len(day))).tolist()
+    rows = sorted(zip(ts, item, day, grade))
+    conn = sqlite3.connect(path)
+    conn.executescript(USER_TABLES_SQL)
+    with conn:
+        conn.executemany('INSERT INTO review_log(item_id, day, grade, ts) VALUES(?,?,?,?)', [r[1:] + r[:1] for r in rows])
+    conn.close()
+    return len(rows)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('db', nargs='?', type=Path, help='a copy of the user DB (modified in place)')
+    ap.add_argument('--today', type=int, help='epoch day (default: today, UTC, like the app)')
+    ap.add_argument('--archive-days', type=int, metavar='N', help=f'archive raw rows older than N days (N >= {STATS_WINDOW})')
+    ap.add_argument('--vacuum', action='store_true', help='VACUUM after archiving')
+    ap.add_argument('--trigger', action='store_true', help='keep review_daily current on every review_log insert')
+    ap.add_argument(
+        '--bench', action='store_true', help='time the stats query before and after, on a temporary copy of the DB'
+    )
+    ap.add_argument('--runs', type=int, default=50)
+    ap.add_argument('--synthetic', type=int, metavar='CARDS', help='run everything on a synthetic year of history')
+    args = ap.parse_args(argv)
+    today = args.today if args.today is not None else epoch_day()
+
+    tmp = None
+    db = args.db
+    if args.synthetic:
+        tmp = tempfile.TemporaryDirectory()
+        db = Path(tmp.name) / 'user.sqlite'
+        t0 = time.perf_counter()
+        n = synthesize(db, args.synthetic, today)
+        print(f'synthetic history: {args.synthetic} cards, {n} reviews ({time.perf_counter() - t0:.2f}s)')
+        args.bench = True
+        if args.archive_days is None:
+            args.archive_days = 90
+            args.vacuum = True
+    elif db is None:
+        ap.error('a DB path is required (or use --synthetic)')
+    elif not db.exists():
+        ap.error(f'{db} does not exist')
+    elif args.bench:
+        # 基准只量不改：汇总/归档/触发器都作用在临时副本上，传入的库保持原样
+        tmp = tempfile.TemporaryDirectory()
+        copy = Path(tmp.name) / db.name
+        src, dst = sqlite3.connect(db), sqlite3.connect(copy)
+        src.backup(dst)
+        src.close()
+        dst.close()
+        print(f'bench: working on a temporary copy, {db} is left unchanged')
+        db = copy
+
+    conn = sqlite3.connect(db)
+    ensure_rollup_tables(conn)
+    size = db.stat().st_size
+    log_bytes = table_bytes(conn, ['review_log'])
+    if args.bench:
+        print(format_bench(bench_stats(conn, today, args.runs, 'before')))
+
+    report = refresh_rollup(conn)
+    print(
+        f"review_daily: {report['mode']} refresh, {report['new_rows']} new rows, {report['days']} days recomputed "
+        f"in {report['seconds']:.3f}s (watermark id {report['last_log_id']})"
+    )
+    if args.archive_days is not None:
+        moved = archive_log(conn, args.archive_days, today)
+        print(f"archived {moved['moved']} rows before day {moved['cutoff_day']} in {moved['seconds']:.3f}s")
+        if args.vacuum:
+            conn.execute('VACUUM')
+    if args.trigger:
+        install_trigger(conn)
+        print('trigger review_daily_log_insert installed')
+    if args.bench:
+        print(format_bench(bench_stats(conn, today, args.runs, 'after')))
+
+    bad = verify_rollup(conn)
+    print(f"rollup check: {'ok' if not bad else f'{len(bad)} days differ, e.g. {bad[:5]}'}")
+    if log_bytes is not None:
+        after = table_bytes(conn, ['review_log', 'review_log_archive'])
+        print(f'review_log (+ archive) pages: {log_bytes} -> {after} bytes')
+    conn.close()
+    print(f'file size: {size} -> {db.stat().st_size} bytes')
+    if tmp is not None:
+        tmp.cleanup()
+    if bad:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Plain-SQLite inverted index over ``items.search_text`` (``--search-grams``; Android may lack FTS5)."""
+import re
+import sqlite3
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+CJK_RUN = re.compile(r'[\u3040-\u30ff\u3005\u4e00-\u9fff]+')
+LATIN_TOKEN = re.compile(r'[0-9A-Za-z\uff10-\uff19\uff21-\uff3a\uff41-\uff5a]+')
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS search_grams(
+  gram TEXT NOT NULL,
+  item_id INTEGER NOT NULL,
+  PRIMARY KEY(gram, item_id)
+) WITHOUT ROWID;
+'''
+
+
+def text_grams(text: str) -> Set[str]:
+    """All index grams for one ``search_text`` value."""
+    grams: Set[str] = set()
+    if not text:
+        return grams
+    for run in CJK_RUN.findall(text):
+        grams.update(run)
+        for i in range(len(run) - 1):
+            grams.add(run[i:i + 2])
+    for tok in LATIN_TOKEN.findall(text):
+        grams.add(tok.lower())
+    return grams
+
+
+def query_grams(q: str) -> Tuple[List[str], List[str]]:
+    """Split a user query into ``(exact_grams, prefix_tokens)``.
+
+    A single CJK character is looked up as a unigram; longer CJK runs only need
+    their bigrams. Latin tokens become prefix lookups.
+    """
+    exact: List[str] = []
+    for run in CJK_RUN.findall(q):
+        if len(run) == 1:
+            exact.append(run)
+        else:
+            exact.extend(run[i:i + 2] for i in range(len(run) - 1))
+    prefixes = [tok.lower() for tok in LATIN_TOKEN.findall(q)]
+    return list(dict.fromkeys(exact)), list(dict.fromkeys(prefixes))
+
+
+def has_search_grams(conn: sqlite3.Connection) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='search_grams'").fetchone()
+    return row is not None
+
+
+def _insert_grams(conn: sqlite3.Connection, rows: Iterable[Tuple[int, Optional[str]]], batch_size: int) -> int:
+    total = 0
+    batch: List[Tuple[str, int]] = []
+    for item_id, text in rows:
+        for g in text_grams(text or ''):
+            batch.append((g, item_id))
+        if len(batch) >= batch_size:
+            batch.sort()
+            conn.executemany('INSERT OR IGNORE INTO search_grams(gram, item_id) VALUES(?,?)', batch)
+            total += len(batch)
+            batch.clear()
+    if batch:
+        batch.sort()
+        conn.executemany('INSERT OR IGNORE INTO search_grams(gram, item_id) VALUES(?,?)', batch)
+        total += len(batch)
+    return total
+
+
+def build_search_grams(conn: sqlite3.Connection, batch_size: int = 200000) -> int:
+    """(Re)build the whole ``search_grams`` table from ``items.search_text``. Returns the posting count."""
+    conn.execute('DROP TABLE IF EXISTS search_grams')
+    conn.executescript(SCHEMA_SQL)
+    rows = conn.execute('SELECT id, search_text FROM items ORDER BY id').fetchall()
+    total = _insert_grams(conn, rows, batch_size)
+    conn.commit()
+    return total
+
+
+def refresh_search_grams(conn: sqlite3.Connection, item_ids: Sequence[int], batch_size: int = 200000) -> int:
+    """Re-index only ``item_ids`` (inserted, updated or deleted items) after an incremental build."""
+    if not item_ids:
+        return 0
+    ids = sorted(set(item_ids))
+    rows: List[Tuple[int, Optional[str]]] = []
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ','.join('?' * len(chunk))
+        conn.execute(f'DELETE FROM search_grams WHERE item_id IN ({marks})', chunk)
+        rows.extend(conn.execute(f'SELECT id, search_text FROM items WHERE id IN ({marks})', chunk).fetchall())
+    total = _insert_grams(conn, rows, batch_size)
+    conn.commit()
+    return total
+
+
+def posting_count(conn: sqlite3.Connection, gram: str, prefix: bool = False) -> int:
+    if prefix:
+        sql, args = 'SELECT COUNT(*) FROM search_grams WHERE gram>=? AND gram<?', (gram, gram + '\uffff')
+    else:
+        sql, args = 'SELECT COUNT(*) FROM search_grams WHERE gram=?', (gram,)
+    return conn.execute(sql, args).fetchone()[0]
+
+
+def build_gram_query(
+    q: str,
+    deck: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    conn: Optional[sqlite3.Connection] = None,
+    max_grams: int = 2,
+):
+    """Reference query (SQL, args) for a substring search through ``search_grams``.
+
+    Mirrors the library page: optional deck filter, newest ids first. With
+    ``conn`` the grams are ranked by posting count and only the ``max_grams``
+    rarest are intersected; the ``LIKE`` recheck on the candidates keeps the
+    result exact. Returns ``None`` when the query has no indexable grams and the
+    caller has to fall back to the plain ``LIKE`` scan.
+    """
+    exact, prefixes = query_grams(q)
+    if not exact and not prefixes:
+        return None
+    lookups = [(g, False) for g in exact] + [(p, True) for p in prefixes]
+    if conn is not None and len(lookups) > max_grams:
+        lookups.sort(key=lambda gp: posting_count(conn, *gp))
+        lookups = lookups[:max_grams]
+    parts: List[str] = []
+    args: List[object] = []
+    for g, prefix in lookups:
+        if prefix:
+            parts.append('SELECT item_id FROM search_grams WHERE gram>=? AND gram<?')
+            args.extend([g, g + '\uffff'])
+        else:
+            parts.append('SELECT item_id FROM search_grams WHERE gram=?')
+            args.append(g)
+    where = [f'i.id IN ({" INTERSECT ".join(parts)})', 'i.search_text LIKE ?']
+    args.append(f'%{q}%')
+    if deck is not None:
+        where.append('i.deck=?')
+        args.append(deck)
+    sql = f'''
+      SELECT i.id FROM items i
+      WHERE {' AND '.join(where)}
+      ORDER BY i.id DESC
+      LIMIT ? OFFSET ?
+    '''
+    args.extend([limit, offset])
+    return sql, args
+
+
+def search(conn: sqlite3.Connection, q: str, deck: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[int]:
+    """Item ids matching ``q`` (substring), using the inverted index when possible."""
+    built = build_gram_query(q, deck, limit, offset, conn) if has_search_grams(conn) else None
+    if built is None:
+        where = ['search_text LIKE ?']
+        args: List[object] = [f'%{q}%']
+        if deck is not None:
+            where.append('deck=?')
+            args.append(deck)
+        built = (
+            f'SELECT id FROM items WHERE {" AND ".join(where)} ORDER BY id DESC LIMIT ? OFFSET ?',
+            args + [limit, offset],
+        )
+    sql, args = built
+    return [r[0] for r in conn.execute(sql, args)]
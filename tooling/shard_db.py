@@ -0,0 +1,306 @@
+"""Per-deck SQLite shards of the content DB plus a hashed manifest (``--shards DIR``).
+
+    python tooling/shard_db.py split assets/jp_study_content.sqlite build/shards
+    python tooling/shard_db.py verify build/shards/manifest.json --merged assets/jp_study_content.sqlite
+"""
+import argparse
+import datetime as dt
+import hashlib
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from finalize_db import DEFAULT_PAGE_SIZE, finalize
+
+MANIFEST_NAME = 'manifest.json'
+SHARED_NAME = 'shared.sqlite'
+SKIP_TABLES = {'sqlite_sequence', 'sqlite_stat1', 'build_stats'}  # build_stats 是构建诊断，不进分片
+DECK_ITEMS = 'SELECT id FROM src.items WHERE deck = :deck'
+# 按 deck 过滤时的特殊规则；其余表按是否有 deck / item_id 列决定，两者都没有的整表进 shared.sqlite
+SHARD_FILTERS = {
+    'items': 'deck = :deck',
+    'media_paths': f'id IN (SELECT path_id FROM src.media WHERE item_id IN ({DECK_ITEMS}))',
+}
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open('rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def shard_name(deck: str) -> str:
+    # 按 deck 名的哈希命名：同一 deck 每次构建都是同一个文件名
+    return f"deck-{hashlib.blake2b(deck.encode('utf-8'), digest_size=6).hexdigest()}.sqlite"
+
+
+def schema_sql(conn: sqlite3.Connection) -> List[str]:
+    """Table DDL, then index/view/trigger DDL, each sorted by name (SQLite's own tables excluded).
+
+    按名字排序而不是按创建顺序：增量构建会删掉重建个别表，合并库里的顺序随之改变，分片不应跟着变。
+    """
+    return [
+        sql
+        for name, sql in conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+            "ORDER BY type != 'table', name"
+        )
+        if name not in SKIP_TABLES
+    ]
+
+
+def table_filters(conn: sqlite3.Connection) -> Tuple[Dict[str, str], List[str]]:
+    """``({table: WHERE clause}, shared tables)`` for the tables that go into shards."""
+    per_deck: Dict[str, str] = {}
+    shared: List[str] = []
+    for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY rowid"):
+        if table in SKIP_TABLES or table.startswith('sqlite_'):
+            continue
+        cols = {r[1] for r in conn.execute(f'PRAGMA table_info({table})')}
+        if table in SHARD_FILTERS:
+            per_deck[table] = SHARD_FILTERS[table]
+        elif 'deck' in cols:
+            per_deck[table] = 'deck = :deck'
+        elif 'item_id' in cols:
+            per_deck[table] = f'item_id IN ({DECK_ITEMS})'
+        else:
+            shared.append(table)
+    return per_deck, shared
+
+
+def order_by(conn: sqlite3.Connection, table: str) -> str:
+    """Primary-key order, so a shard's bytes only depend on its rows."""
+    pk = [r[1] for r in sorted(conn.execute(f'PRAGMA table_info({table})'), key=lambda r: r[5]) if r[5]]
+    without_rowid = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name=? AND sql LIKE '%WITHOUT ROWID%'", (table,)
+    ).fetchone()
+    return ', '.join(pk) if pk and without_rowid else 'rowid'
+
+
+def write_shard(
+    merged: Path, dest: Path, ddl: List[str], tables: Dict[str, str], params: Dict[str, str], page_size: int
+) -> Dict[str, int]:
+    """Copy the selected rows of ``merged`` into a new DB at ``dest``; returns rows per table."""
+    if dest.exists():
+        dest.unlink()
+    conn = sqlite3.connect(dest)
+    for sql in ddl:
+        conn.execute(sql)
+    conn.execute('ATTACH DATABASE ? AS src', (str(merged),))
+    rows = {}
+    for table, where in tables.items():
+        cur = conn.execute(
+            f'INSERT INTO main.{table} SELECT * FROM src.{table} WHERE {where} ORDER BY {order_by(conn, table)}',
+            params,
+        )
+        rows[table] = cur.rowcount
+    conn.commit()
+    conn.execute('DETACH DATABASE src')
+    conn.close()
+    finalize(dest, page_size)
+    return rows
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, object]]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except ValueError:
+        return None
+
+
+def split(merged: Path, out_dir: Path, page_size: int = DEFAULT_PAGE_SIZE) -> Dict[str, object]:
+    """Write one shard per deck (plus ``shared.sqlite`` when needed) and ``manifest.json``; returns the manifest."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST_NAME
+    previous = load_manifest(manifest_path) or {}
+    old_hashes = {s['file']: s['sha256'] for s in previous.get('shards', [])}
+
+    conn = sqlite3.connect(merged)
+    ddl = schema_sql(conn)
+    per_deck, shared_tables = table_filters(conn)
+    decks = [deck for (deck,) in conn.execute('SELECT DISTINCT deck FROM items ORDER BY deck')]
+    sequence = dict(conn.execute('SELECT name, seq FROM sqlite_sequence ORDER BY name'))
+    conn.close()
+
+    jobs: List[Tuple[Optional[str], str, Dict[str, str]]] = [(deck, shard_name(deck), per_deck) for deck in decks]
+    if shared_tables:
+        jobs.append((None, SHARED_NAME, {t: '1' for t in shared_tables}))
+
+    shards = []
+    delta = {'changed': [], 'added': [], 'unchanged': [], 'removed': []}
+    for deck, name, tables in jobs:
+        final = out_dir / name
+        tmp = out_dir / (name + '.tmp')
+        rows = write_shard(merged, tmp, ddl, tables, {'deck': deck}, page_size)
+        digest = file_sha256(tmp)
+        if final.exists() and old_hashes.get(name) == digest and file_sha256(final) == digest:
+            tmp.unlink()
+            delta['unchanged'].append(name)
+        else:
+            tmp.replace(final)
+            delta['changed' if name in old_hashes else 'added'].append(name)
+        shards.append({'deck': deck, 'file': name, 'sha256': digest, 'bytes': final.stat().st_size, 'rows': rows})
+
+    current = {s['file'] for s in shards}
+    for name in sorted(set(old_hashes) - current):
+        (out_dir / name).unlink(missing_ok=True)
+        delta['removed'].append(name)
+
+    manifest = {
+        'format': 1,
+        'generated_at': dt.datetime.utcnow().isoformat() + 'Z',
+        'merged': {'file': merged.name, 'sha256': file_sha256(merged), 'bytes': merged.stat().st_size},
+        'schema_sha256': hashlib.sha256('\n'.join(ddl).encode('utf-8')).hexdigest(),
+        'page_size': page_size,
+        'sequence': sequence,
+        'shards': shards,
+        'delta': {
+            'from_merged_sha256': previous.get('merged', {}).get('sha256'),
+            **delta,
+            'bytes_to_ship': sum(s['bytes'] for s in shards if s['file'] not in delta['unchanged']),
+        },
+    }
+    tmp = manifest_path.with_name(MANIFEST_NAME + '.tmp')
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+    tmp.replace(manifest_path)
+    return manifest
+
+
+def summary(manifest: Dict[str, object], out_dir: Path) -> Dict[str, object]:
+    """The short form stored under ``shards`` in the version metadata."""
+    delta = manifest['delta']
+    return {
+        'manifest': str(out_dir / MANIFEST_NAME),
+        'count': len(manifest['shards']),
+        'bytes': sum(s['bytes'] for s in manifest['shards']),
+        'changed': delta['changed'] + delta['added'],
+        'removed': delta['removed'],
+        'unchanged': len(delta['unchanged']),
+        'bytes_to_ship': delta['bytes_to_ship'],
+    }
+
+
+def format_summary(manifest: Dict[str, object]) -> str:
+    shards = manifest['shards']
+    delta = manifest['delta']
+    total = sum(s['bytes'] for s in shards)
+    lines = [
+        f"shards: {len(shards)} files, {total / 1024 / 1024:.2f} MB "
+        f"(merged {manifest['merged']['bytes'] / 1024 / 1024:.2f} MB); "
+        f"{len(delta['changed'])} changed, {len(delta['added'])} added, {len(delta['removed'])} removed, "
+        f"{len(delta['unchanged'])} unchanged -> {delta['bytes_to_ship'] / 1024 / 1024:.2f} MB to ship",
+    ]
+    status = {name: kind for kind in ('changed', 'added', 'unchanged') for name in delta[kind]}
+    for s in shards:
+        label = s['deck'] if s['deck'] is not None else '(shared)'
+        lines.append(
+            f"  {s['file']:26} {status.get(s['file'], ''):9} {s['bytes'] / 1024:9.1f} KB "
+            f"{s['rows'].get('items', 0):7} items  {label}"
+        )
+    return '\n'.join(lines)
+
+
+def merge(manifest_path: Path, dest: Path, page_size: Optional[int] = None) -> Dict[str, int]:
+    """Rebuild the merged DB from the shards listed in ``manifest_path``; returns rows per table."""
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        raise SystemExit(f'No shard manifest at {manifest_path}')
+    base = manifest_path.parent
+    for s in manifest['shards']:
+        if file_sha256(base / s['file']) != s['sha256']:
+            raise SystemExit(f"{s['file']} does not match the manifest hash")
+    if dest.exists():
+        dest.unlink()
+    conn = sqlite3.connect(dest)
+    first = sqlite3.connect(base / manifest['shards'][0]['file'])
+    ddl = schema_sql(first)
+    first.close()
+    tables = [sql.split('(')[0].split()[-1] for sql in ddl if sql.upper().startswith('CREATE TABLE')]
+    for sql in ddl:
+        conn.execute(sql)
+    rows = dict.fromkeys(tables, 0)
+    for s in manifest['shards']:
+        conn.execute('ATTACH DATABASE ? AS src', (str(base / s['file']),))
+        for table in s['rows']:
+            # media_paths 的同一行可能被多个 deck 引用
+            cur = conn.execute(f'INSERT OR IGNORE INTO main.{table} SELECT * FROM src.{table}')
+            rows[table] += cur.rowcount
+        conn.commit()
+        conn.execute('DETACH DATABASE src')
+    conn.executemany('UPDATE sqlite_sequence SET seq=? WHERE name=?', [(v, k) for k, v in manifest['sequence'].items()])
+    conn.commit()
+    conn.close()
+    finalize(dest, page_size or manifest.get('page_size', DEFAULT_PAGE_SIZE))
+    return rows
+
+
+def table_digests(path: Path) -> Dict[str, Tuple[int, str]]:
+    """``{table: (rows, sha256 of the rows in primary-key order)}`` for the shardable tables."""
+    conn = sqlite3.connect(path)
+    per_deck, shared = table_filters(conn)
+    out = {}
+    for table in list(per_deck) + shared + ['sqlite_sequence']:
+        h = hashlib.sha256()
+        n = 0
+        order = 'name' if table == 'sqlite_sequence' else order_by(conn, table)
+        for row in conn.execute(f'SELECT * FROM {table} ORDER BY {order}'):
+            h.update(repr(row).encode('utf-8'))
+            n += 1
+        out[table] = (n, h.hexdigest())
+    conn.close()
+    return out
+
+
+def verify(manifest_path: Path, merged: Optional[Path] = None) -> List[str]:
+    """Merge the shards into a temp file and compare every table with ``merged``; returns the differences."""
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        raise SystemExit(f'No shard manifest at {manifest_path}')
+    merged = merged or manifest_path.parent / manifest['merged']['file']
+    with tempfile.TemporaryDirectory() as tmp:
+        rebuilt = Path(tmp) / 'merged.sqlite'
+        merge(manifest_path, rebuilt)
+        got, want = table_digests(rebuilt), table_digests(merged)
+    return [
+        f'{table}: shards give {got.get(table, (0, "-"))[0]} rows, merged has {want.get(table, (0, "-"))[0]}'
+        for table in sorted(set(got) | set(want))
+        if got.get(table) != want.get(table)
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Per-deck shards of the content DB with a hashed manifest.')
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    p = sub.add_parser('split', help='write one shard per deck and manifest.json')
+    p.add_argument('merged', type=Path)
+    p.add_argument('out_dir', type=Path)
+    p.add_argument('--page-size', type=int, default=DEFAULT_PAGE_SIZE)
+    p = sub.add_parser('merge', help='rebuild the merged DB from the shards')
+    p.add_argument('manifest', type=Path)
+    p.add_argument('dest', type=Path)
+    p = sub.add_parser('verify', help='check that the shards merge back into the merged DB')
+    p.add_argument('manifest', type=Path)
+    p.add_argument('--merged', type=Path)
+    args = ap.parse_args()
+
+    if args.cmd == 'split':
+        print(format_summary(split(args.merged, args.out_dir, args.page_size)))
+    elif args.cmd == 'merge':
+        rows = merge(args.manifest, args.dest)
+        print(f'{args.dest}: ' + ', '.join(f'{t} {n}' for t, n in rows.items()))
+    else:
+        problems = verify(args.manifest, args.merged)
+        for line in problems:
+            print(f'MISMATCH {line}')
+        print('shards match the merged DB' if not problems else f'{len(problems)} tables differ')
+        raise SystemExit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
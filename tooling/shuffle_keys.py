@@ -0,0 +1,184 @@
+"""Stable pseudo-random ``items.shuffle_key`` and the matching random-window query.
+
+    python tooling/shuffle_keys.py --db assets/jp_study_content.sqlite --deck 红宝书
+"""
+import argparse
+import hashlib
+import random
+import sqlite3
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_items_shuffle ON items(deck, level, shuffle_key);'
+
+
+def content_hash(deck, term, reading, meaning) -> bytes:
+    raw = '\x1f'.join(str(v or '') for v in (deck, term, reading, meaning))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).digest()
+
+
+def ensure_shuffle_column(conn: sqlite3.Connection):
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    if 'shuffle_key' not in have:
+        conn.execute('ALTER TABLE items ADD COLUMN shuffle_key INTEGER NOT NULL DEFAULT 0')
+
+
+def item_groups(conn: sqlite3.Connection, item_ids: Sequence[int]) -> Set[Tuple[str, Optional[str]]]:
+    """The ``(deck, level)`` groups that ``item_ids`` currently belong to."""
+    ids = sorted(set(item_ids))
+    found = set()
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ','.join('?' * len(chunk))
+        found.update(conn.execute(f'SELECT DISTINCT deck, level FROM items WHERE id IN ({marks})', chunk))
+    return found
+
+
+def refresh_shuffle_keys(conn: sqlite3.Connection, only: Optional[Iterable[Tuple[str, Optional[str]]]] = None) -> int:
+    """Re-rank every (deck, level), or only the ``only`` groups, by content hash; only changed keys are written.
+
+    增量构建里新增/删除条目只会让同组里排在它后面的名次整体平移，相对顺序不变。返回写入的行数。
+    """
+    ensure_shuffle_column(conn)
+    select = 'SELECT id, deck, level, term, reading, meaning, shuffle_key FROM items'
+    if only is None:
+        rows = conn.execute(select)
+    else:
+        rows = [r for group in set(only) for r in conn.execute(f'{select} WHERE deck=? AND level IS ?', group)]
+    groups: Dict[Tuple[str, Optional[str]], List[Tuple[bytes, int, int]]] = defaultdict(list)
+    for item_id, deck, level, term, reading, meaning, key in rows:
+        groups[(deck, level)].append((content_hash(deck, term, reading, meaning), item_id, key))
+    changed: List[Tuple[int, int]] = []
+    for members in groups.values():
+        members.sort()
+        changed.extend((rank, item_id) for rank, (_, item_id, key) in enumerate(members) if key != rank)
+    changed.sort(key=lambda r: r[1])
+    conn.executemany('UPDATE items SET shuffle_key=? WHERE id=?', changed)
+    conn.execute(INDEX_SQL)
+    conn.commit()
+    return len(changed)
+
+
+def random_window_query(
+    deck: str,
+    level: Optional[str],
+    n: int,
+    start: int,
+    new_only: bool = False,
+) -> Tuple[str, list]:
+    """Reference query (SQL, args): ``n`` random items of ``deck``/``level`` starting at key ``start``.
+
+    每个分支都是 ``(deck, level, shuffle_key)`` 索引上的一次区间定位：先取 ``shuffle_key >= start``，
+    不足 n 条时第二个分支从键空间开头补齐。``level`` 为 ``None``（学习页的“全部”）时调用方按等级逐个
+    调用（见 ``random_window``）。``new_only`` 对应学习页的新词队列：跳过已经在 ``srs`` 里的条目。
+    """
+    where = ['i.deck=?', 'i.level=?' if level is not None else 'i.level IS NULL']
+    args: List[object] = [deck] + ([level] if level is not None else [])
+    if new_only:
+        where.append('NOT EXISTS (SELECT 1 FROM srs s WHERE s.item_id = i.id)')
+    cond = ' AND '.join(where)
+    sql = f'''
+      SELECT * FROM (
+        SELECT i.id, i.shuffle_key FROM items i WHERE {cond} AND i.shuffle_key >= ?
+        ORDER BY i.shuffle_key LIMIT ?
+      )
+      UNION ALL
+      SELECT * FROM (
+        SELECT i.id, i.shuffle_key FROM items i WHERE {cond} AND i.shuffle_key < ?
+        ORDER BY i.shuffle_key LIMIT ?
+      )
+      LIMIT ?
+    '''
+    return sql, args + [start, n] + args + [start, n, n]
+
+
+def group_sizes(conn: sqlite3.Connection, deck: str) -> Dict[Optional[str], int]:
+    """Items per level of ``deck`` (= ``MAX(shuffle_key) + 1``).
+
+    用递归 CTE 在索引上逐个跳到下一个 level（loose index scan），每个 level 只做两次定位，
+    不随 deck 大小增长。
+    """
+    rows = conn.execute(
+        '''
+        WITH RECURSIVE lv(level) AS (
+          SELECT MIN(level) FROM items WHERE deck=?
+          UNION ALL
+          SELECT (SELECT MIN(level) FROM items WHERE deck=? AND level > lv.level) FROM lv WHERE lv.level IS NOT NULL
+        )
+        SELECT level, (SELECT MAX(shuffle_key) + 1 FROM items WHERE deck=? AND level=lv.level)
+        FROM lv WHERE level IS NOT NULL
+        ''',
+        (deck, deck, deck),
+    )
+    sizes: Dict[Optional[str], int] = dict(rows.fetchall())
+    null_size = conn.execute(
+        'SELECT MAX(shuffle_key) + 1 FROM items WHERE deck=? AND level IS NULL', (deck,)
+    ).fetchone()[0]
+    if null_size:
+        sizes[None] = null_size
+    return sizes
+
+
+def random_window(
+    conn: sqlite3.Connection,
+    deck: str,
+    level: Optional[str] = None,
+    n: int = 20,
+    rng: Optional[random.Random] = None,
+    new_only: bool = False,
+) -> List[int]:
+    """Item ids of a uniformly random window; ``level=None`` draws across all levels of the deck.
+
+    “全部”时按各等级条目数把 n 分配下去（系统抽样取整，总数正好是 n，期望与条目数成正比），
+    每个等级各定位一次，所以每个条目的入选概率仍然相同。``new_only`` 时跳过已学条目，
+    窗口会顺着索引往后多走几步，入选概率近似均匀。
+    """
+    rng = rng or random
+    sizes = group_sizes(conn, deck)
+    if level is not None:
+        quota = {level: n} if sizes.get(level) else {}
+    else:
+        quota = {}
+        total = sum(sizes.values())
+        u = rng.random()
+        seen = 0
+        for lv in sorted(sizes, key=lambda v: (v is None, v or '')):
+            lo = int(n * seen / total + u) if total else 0
+            seen += sizes[lv]
+            hi = int(n * seen / total + u) if total else 0
+            if hi > lo:
+                quota[lv] = hi - lo
+    ids: List[int] = []
+    for lv, k in quota.items():
+        sql, args = random_window_query(deck, lv, k, rng.randrange(sizes[lv]), new_only)
+        ids.extend(r[0] for r in conn.execute(sql, args))
+    rng.shuffle(ids)
+    return ids
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Draw random study windows through idx_items_shuffle and show the plan.')
+    ap.add_argument('--db', type=Path, default=Path('assets/jp_study_content.sqlite'))
+    ap.add_argument('--deck', required=True)
+    ap.add_argument('--level', help='omit for all levels of the deck')
+    ap.add_argument('-n', type=int, default=20)
+    ap.add_argument('--runs', type=int, default=200)
+    args = ap.parse_args()
+
+    conn = sqlite3.connect(f'file:{args.db}?mode=ro', uri=True)
+    sql, qargs = random_window_query(args.deck, args.level or '', args.n, 0)
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', qargs):
+        print(' ', row[-1])
+    rng = random.Random(7)
+    t0 = time.perf_counter()
+    for _ in range(args.runs):
+        ids = random_window(conn, args.deck, args.level, args.n, rng)
+    ms = (time.perf_counter() - t0) * 1000 / args.runs
+    print(f'{args.runs} windows of {len(ids)} items: {ms:.3f} ms each; last window: {ids}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,485 @@
+"""Python port of ``sm2Update`` (``lib/db.dart``): batch rescheduling of an exported ``srs`` table and review-load forecasts.
+
+    python tooling/srs_forecast.py --db user_copy.sqlite
+    python tooling/srs_forecast.py --db user_copy.sqlite --hard-mult 1.1 --easy-bonus 1.5 --csv load.csv
+    python tooling/srs_forecast.py --self-check
+"""
+import argparse
+import csv
+import datetime as dt
+import math
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+GRADES = (1, 2, 3, 4)  # again / hard / good / easy（lib/pages/study.dart 的 Rating）
+
+
+@dataclass(frozen=True)
+class Sm2Params:
+    """The constants baked into ``sm2Update``; the defaults are the app's."""
+
+    initial_ease: float = 2.5
+    min_ease: float = 1.3
+    first_interval: int = 1
+    second_interval: int = 3
+    hard_mult: float = 1.2
+    easy_bonus: float = 1.3
+
+
+APP_PARAMS = Sm2Params()
+
+
+class SrsUpdate(NamedTuple):
+    ease: float
+    interval_days: int
+    reps: int
+    lapses: int
+    due_day: int
+    state: int
+
+
+def dart_round(x: float) -> int:
+    """Dart's ``double.round()``: nearest integer, halves away from zero."""
+    # Python 的 round 是银行家舍入：5 × 1.3 = 6.5 时 Dart 得 7，round 得 6
+    if x < 0:
+        return -dart_round(-x)
+    f = math.floor(x)
+    return f + 1 if x - f >= 0.5 else f
+
+
+def sm2_update(
+    today: int, ease: float, interval_days: int, reps: int, lapses: int, grade: int, params: Sm2Params = APP_PARAMS
+) -> SrsUpdate:
+    """``sm2Update`` from ``lib/db.dart``, line for line."""
+    e = ease
+    interval = interval_days
+    r = reps
+    lap = lapses
+    if grade <= 1:
+        lap += 1
+        r = 0
+        interval = 0
+    else:
+        r += 1
+        q = grade + 1  # 2..5
+        e = e + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+        if e < params.min_ease:
+            e = params.min_ease
+        if r == 1:
+            interval = params.first_interval
+        elif r == 2:
+            interval = params.second_interval
+        else:
+            mult = params.hard_mult if grade == 2 else (e if grade == 3 else e * params.easy_bonus)
+            interval = dart_round(interval * mult)
+            if interval < 1:
+                interval = 1
+    return SrsUpdate(e, interval, r, lap, today + interval, 1 if grade <= 1 else 2)
+
+
+def dart_round_array(x: np.ndarray) -> np.ndarray:
+    a = np.abs(x)
+    f = np.floor(a)
+    return np.copysign(f + (a - f >= 0.5), x).astype(np.int64)
+
+
+def sm2_update_arrays(today, ease, interval, reps, lapses, grade, params: Sm2Params = APP_PARAMS):
+    """``sm2_update`` over NumPy arrays (``today`` may be a scalar); returns ``(ease, interval, reps, lapses, due, state)``."""
+    fail = grade <= 1
+    q = grade + 1
+    e = np.maximum(ease + (0.1 - (5 - q) * (0.08 + (5 - q) * 0.02)), params.min_ease)
+    e = np.where(fail, ease, e)
+    r = np.where(fail, 0, reps + 1)
+    mult = np.where(grade == 2, params.hard_mult, np.where(grade == 3, e, e * params.easy_bonus))
+    grown = np.maximum(dart_round_array(interval * mult), 1)
+    iv = np.where(fail, 0, np.where(r == 1, params.first_interval, np.where(r == 2, params.second_interval, grown)))
+    return e, iv, r, lapses + fail, today + iv, np.where(fail, 1, 2)
+
+
+@dataclass
+class Cards:
+    """Column arrays of an ``srs`` table (``item_id`` sorted ascending)."""
+
+    item_id: np.ndarray
+    ease: np.ndarray
+    interval: np.ndarray
+    reps: np.ndarray
+    lapses: np.ndarray
+    due: np.ndarray
+    state: np.ndarray
+    last_review: np.ndarray
+
+    FIELDS = ('ease', 'interval', 'reps', 'lapses', 'due', 'state', 'last_review')
+
+    @classmethod
+    def empty(cls, n: int, params: Sm2Params = APP_PARAMS) -> 'Cards':
+        z = lambda: np.zeros(n, np.int64)  # noqa: E731
+        return cls(z(), np.full(n, params.initial_ease), z(), z(), z(), z(), z(), z())
+
+    def __len__(self):
+        return len(self.item_id)
+
+    def take(self, idx) -> 'Cards':
+        return Cards(self.item_id[idx], *(getattr(self, f)[idx] for f in self.FIELDS))
+
+
+def load_srs(conn: sqlite3.Connection) -> Cards:
+    rows = conn.execute(
+        'SELECT item_id, ease, interval_days, reps, lapses, due_day, state, last_review_day FROM srs ORDER BY item_id'
+    ).fetchall()
+    cols = list(zip(*rows)) if rows else [()] * 8
+    ints = lambda c: np.array(c, np.int64)  # noqa: E731
+    return Cards(ints(cols[0]), np.array(cols[1], np.float64), *(ints(c) for c in cols[2:]))
+
+
+def load_log(conn: sqlite3.Connection) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """``(item_id, day, grade)`` in insertion order, i.e. the order the app applied the reviews."""
+    sql = 'SELECT id, item_id, day, grade FROM review_log'
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='review_log_archive'").fetchone():
+        sql += ' UNION ALL SELECT id, item_id, day, grade FROM review_log_archive'  # tooling/review_rollup.py 归档的旧行
+    rows = [r[1:] for r in conn.execute(f'SELECT * FROM ({sql}) ORDER BY id')]
+    if not rows:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0, np.int64)
+    a = np.array(rows, np.int64)
+    return a[:, 0], a[:, 1], a[:, 2]
+
+
+def replay(log_item: np.ndarray, log_day: np.ndarray, log_grade: np.ndarray, params: Sm2Params = APP_PARAMS):
+    """Recompute every reviewed card's state from its history.
+
+    Returns ``(cards, prior_reps)``: ``prior_reps[j]`` is the card's ``reps`` just before log entry ``j``.
+    Step k updates every card's k-th review at once, so the Python loop runs max-reviews-per-card times.
+    """
+    ids, card = np.unique(log_item, return_inverse=True)
+    cards = Cards.empty(len(ids), params)
+    cards.item_id = ids
+    prior_reps = np.zeros(len(card), np.int64)
+    if not len(card):
+        return cards, prior_reps
+    by_card = np.argsort(card, kind='stable')
+    first = np.searchsorted(card[by_card], np.arange(len(ids)))
+    rank = np.empty(len(card), np.int64)
+    rank[by_card] = np.arange(len(card)) - first[card[by_card]]
+    by_rank = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[by_rank], np.arange(rank.max() + 2))
+    for k in range(len(bounds) - 1):
+        j = by_rank[bounds[k]:bounds[k + 1]]
+        c = card[j]
+        prior_reps[j] = cards.reps[c]
+        (cards.ease[c], cards.interval[c], cards.reps[c], cards.lapses[c], cards.due[c], cards.state[c]) = sm2_update_arrays(
+            log_day[j], cards.ease[c], cards.interval[c], cards.reps[c], cards.lapses[c], log_grade[j], params
+        )
+        cards.last_review[c] = log_day[j]
+    return cards, prior_reps
+
+
+def compare(expected: Cards, actual: Cards) -> Dict[str, object]:
+    """Field-by-field comparison of two card sets on their common ``item_id``s."""
+    common, ie, ia = np.intersect1d(expected.item_id, actual.item_id, assume_unique=True, return_indices=True)
+    bad = np.zeros(len(common), bool)
+    per_field = {}
+    for f in Cards.FIELDS:
+        diff = getattr(expected, f)[ie] != getattr(actual, f)[ia]
+        per_field[f] = int(diff.sum())
+        bad |= diff
+    return {
+        'compared': len(common),
+        'only_expected': len(expected) - len(common),
+        'only_actual': len(actual) - len(common),
+        'mismatched': int(bad.sum()),
+        'mismatched_fields': {f: n for f, n in per_field.items() if n},
+        'sample': common[bad][:10].tolist(),
+    }
+
+
+def merge(base: Cards, update: Cards) -> Cards:
+    """``base`` with the rows of ``update`` (matched on ``item_id``) replaced."""
+    out = Cards(base.item_id.copy(), *(getattr(base, f).copy() for f in Cards.FIELDS))
+    _, ib, iu = np.intersect1d(base.item_id, update.item_id, assume_unique=True, return_indices=True)
+    for f in Cards.FIELDS:
+        getattr(out, f)[ib] = getattr(update, f)[iu]
+    return out
+
+
+def grade_probs(log_grade: np.ndarray, prior_reps: np.ndarray) -> np.ndarray:
+    """``P(grade)`` per phase: row 0 = new/relearning (``reps == 0``), row 1 = review; add-one smoothed."""
+    probs = np.ones((2, len(GRADES)))
+    for phase, mask in enumerate((prior_reps == 0, prior_reps > 0)):
+        probs[phase] += np.bincount(np.clip(log_grade[mask], 1, 4) - 1, minlength=len(GRADES))
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def recent_new_per_day(log_item: np.ndarray, log_day: np.ndarray, today: int, window: int = 30) -> float:
+    """Average number of cards seen for the first time per day over the last ``window`` days."""
+    if not len(log_item):
+        return 0.0
+    _, first = np.unique(log_item, return_index=True)
+    return float(np.count_nonzero(log_day[first] > today - window)) / window
+
+
+def simulate(
+    cards: Cards,
+    start_day: int,
+    days: int,
+    probs: np.ndarray,
+    new_per_day: float = 0.0,
+    params: Sm2Params = APP_PARAMS,
+    seed: int = 7,
+    max_reviews: Optional[int] = None,
+    record: bool = False,
+):
+    """Review every due card each day for ``days`` days, adding ``new_per_day`` new cards.
+
+    Returns ``(load, cards, log)``: ``load`` maps ``day`` / ``reviews`` / ``new`` / ``again`` / ``learned`` to
+    per-day arrays, ``cards`` is the final state, ``log`` is ``(item_id, day, grade)`` when ``record`` else ``None``.
+    With ``max_reviews`` the most overdue cards go first and the rest carry over to the next day.
+    """
+    rng = np.random.default_rng(seed)
+    cum = np.cumsum(probs, axis=1)
+    cum[:, -1] = 1.0
+    n = len(cards)
+    cap = n + int(math.ceil(new_per_day * days)) + 1
+    state = Cards.empty(cap, params)
+    for f in ('item_id',) + Cards.FIELDS:
+        getattr(state, f)[:n] = getattr(cards, f)
+    next_id = int(cards.item_id.max()) + 1 if n else 1
+    load = {k: np.zeros(days, np.int64) for k in ('day', 'reviews', 'new', 'again', 'learned')}
+    logs: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+    owed = 0.0
+    for d in range(days):
+        day = start_day + d
+        owed += new_per_day
+        k = min(int(owed), cap - n)
+        owed -= k
+        if k:
+            state.item_id[n:n + k] = np.arange(next_id, next_id + k)
+            next_id += k
+        due = np.flatnonzero(state.due[:n] <= day)
+        if max_reviews is not None and len(due) > max_reviews:
+            due = due[np.argsort(state.due[due], kind='stable')[:max_reviews]]
+        idx = np.concatenate([due, np.arange(n, n + k)])
+        n += k
+        phase = (state.reps[idx] > 0).astype(np.int64)
+        grade = 1 + (rng.random(len(idx))[:, None] > cum[phase]).sum(axis=1)
+        (state.ease[idx], state.interval[idx], state.reps[idx], state.lapses[idx], state.due[idx], state.state[idx]) = (
+            sm2_update_arrays(day, state.ease[idx], state.interval[idx], state.reps[idx], state.lapses[idx], grade, params)
+        )
+        state.last_review[idx] = day
+        if record:
+            logs.append((state.item_id[idx], np.full(len(idx), day, np.int64), grade))
+        load['day'][d] = day
+        load['reviews'][d] = len(idx)
+        load['new'][d] = k
+        load['again'][d] = int(np.count_nonzero(grade == 1))
+        load['learned'][d] = n
+    log = None
+    if record:
+        log = tuple(np.concatenate([part[i] for part in logs]) if logs else np.zeros(0, np.int64) for i in range(3))
+    return load, state.take(slice(0, n)), log
+
+
+def write_cards(conn: sqlite3.Connection, cards: Cards) -> int:
+    conn.executemany(
+        'UPDATE srs SET ease=?, interval_days=?, reps=?, lapses=?, due_day=?, state=?, last_review_day=? WHERE item_id=?',
+        zip(*(getattr(cards, f).tolist() for f in Cards.FIELDS), cards.item_id.tolist()),
+    )
+    conn.commit()
+    return len(cards)
+
+
+def epoch_today() -> int:
+    """``epochDay(DateTime.now())`` from ``lib/db.dart`` (UTC date)."""
+    return (dt.datetime.utcnow().date() - dt.date(1970, 1, 1)).days
+
+
+def format_load(load: Dict[str, np.ndarray], weeks: int = 8) -> str:
+    reviews = load['reviews']
+    if not len(reviews):
+        return 'forecast: 0 days'
+    peak = int(reviews.argmax())
+    lines = [
+        f"forecast: {len(reviews)} days, {int(reviews.sum())} reviews ({reviews.mean():.1f}/day), "
+        f"{int(load['new'].sum())} new, peak {int(reviews[peak])} on day +{peak}, "
+        f"{int(load['learned'][-1])} cards at the end"
+    ]
+    for w in range(min(weeks, (len(reviews) + 6) // 7)):
+        s = slice(w * 7, w * 7 + 7)
+        lines.append(
+            f"  week {w + 1:2}: {int(reviews[s].sum()):7} reviews  {int(load['new'][s].sum()):6} new  "
+            f"{int(load['again'][s].sum()):6} again  max/day {int(reviews[s].max()):5}"
+        )
+    return '\n'.join(lines)
+
+
+def write_csv(path: Path, load: Dict[str, np.ndarray]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(['day', 'date', 'reviews', 'new', 'again', 'learned'])
+        for i, day in enumerate(load['day'].tolist()):
+            date = dt.date(1970, 1, 1) + dt.timedelta(days=day)
+            w.writerow([day, date.isoformat()] + [int(load[k][i]) for k in ('reviews', 'new', 'again', 'learned')])
+
+
+# (today, ease, interval_days, reps, lapses, grade) -> sm2Update 的结果，按 lib/db.dart 逐步推出
+GOLDEN = [
+    ((100, 2.5, 0, 0, 0, 1), SrsUpdate(2.5, 0, 0, 1, 100, 1)),
+    ((100, 2.5, 0, 0, 0, 2), SrsUpdate(2.36, 1, 1, 0, 101, 2)),
+    ((100, 2.5, 0, 0, 0, 3), SrsUpdate(2.5, 1, 1, 0, 101, 2)),
+    ((100, 2.5, 0, 0, 0, 4), SrsUpdate(2.6, 1, 1, 0, 101, 2)),
+    ((100, 2.5, 1, 1, 0, 3), SrsUpdate(2.5, 3, 2, 0, 103, 2)),
+    # 5 × 1.3 = 6.5：Dart 取 7，Python 的 round() 会得 6
+    ((100, 1.3, 5, 2, 0, 3), SrsUpdate(1.3, 7, 3, 0, 107, 2)),
+    ((100, 2.5, 3, 2, 0, 4), SrsUpdate(2.6, 10, 3, 0, 110, 2)),
+    ((100, 1.35, 10, 5, 1, 2), SrsUpdate(1.3, 12, 6, 1, 112, 2)),
+    ((100, 2.1, 40, 6, 2, 1), SrsUpdate(2.1, 0, 0, 3, 100, 1)),
+    ((100, 2.1, 0, 0, 3, 3), SrsUpdate(2.1, 1, 1, 3, 101, 2)),
+    ((100, 2.5, 0, 2, 0, 2), SrsUpdate(2.36, 1, 3, 0, 101, 2)),
+]
+
+
+def self_check(samples: int = 200_000, seed: int = 1) -> List[str]:
+    """Golden cases against the Dart semantics plus scalar-vs-array parity; returns the failures."""
+    failures = []
+    for args, want in GOLDEN:
+        got = sm2_update(*args)
+        ok = all(
+            math.isclose(g, w, rel_tol=0, abs_tol=1e-12) if isinstance(w, float) else g == w for g, w in zip(got, want)
+        )
+        if not ok:
+            failures.append(f'sm2_update{args} = {got}, expected {want}')
+    if dart_round(2.5) != 3 or dart_round(-2.5) != -3 or dart_round(2.4999999999999996) != 2:
+        failures.append('dart_round does not round halves away from zero')
+
+    rng = np.random.default_rng(seed)
+    today = rng.integers(19000, 21000, samples)
+    ease = rng.uniform(1.3, 3.2, samples)
+    ease[::2] = np.round(ease[::2], 2)
+    interval = rng.integers(0, 400, samples)
+    # 专门放一批 interval × mult 恰好落在 .5 上的状态
+    interval[:1000] = 5
+    ease[:1000] = 1.3
+    reps = rng.integers(0, 12, samples)
+    lapses = rng.integers(0, 6, samples)
+    grade = rng.integers(1, 5, samples)
+    arrays = sm2_update_arrays(today, ease, interval, reps, lapses, grade)
+    for i in range(samples):
+        want = sm2_update(int(today[i]), float(ease[i]), int(interval[i]), int(reps[i]), int(lapses[i]), int(grade[i]))
+        got = tuple(a[i].item() for a in arrays)
+        if got != tuple(want):
+            failures.append(f'array/scalar mismatch at {i}: {got} != {tuple(want)}')
+            break
+
+    _, cards, log = simulate(Cards.empty(0), 19000, 120, np.full((2, 4), 0.25), new_per_day=40, seed=seed, record=True)
+    replayed, _ = replay(*log)
+    diff = compare(cards, replayed)
+    if diff['mismatched'] or diff['only_expected'] or diff['only_actual']:
+        failures.append(f'replay of a simulated history does not reproduce it: {diff}')
+    return failures
+
+
+def bench(n_cards: int, seed: int = 7):
+    """Synthetic year of history for ``n_cards`` cards, then time replay, reschedule and a 365-day forecast."""
+    t0 = time.perf_counter()
+    probs = np.array([[0.25, 0.15, 0.45, 0.15], [0.1, 0.15, 0.6, 0.15]])
+    _, cards, log = simulate(Cards.empty(0), 19000, 365, probs, new_per_day=n_cards / 365, seed=seed, record=True)
+    print(f'synthetic history: {len(cards)} cards, {len(log[0])} reviews ({time.perf_counter() - t0:.2f}s)')
+    today = 19000 + 365
+    timings = {}
+    t0 = time.perf_counter()
+    replayed, prior = replay(*log)
+    timings['replay (app params)'] = time.perf_counter() - t0
+    diff = compare(cards, replayed)
+    t0 = time.perf_counter()
+    replay(*log, params=replace(APP_PARAMS, hard_mult=1.1, easy_bonus=1.5))
+    timings['reschedule (new params)'] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    simulate(replayed, today, 365, grade_probs(log[2], prior), recent_new_per_day(log[0], log[1], today), seed=seed)
+    timings['forecast 365 days'] = time.perf_counter() - t0
+    for name, secs in timings.items():
+        print(f'  {name:26} {secs * 1000:9.1f} ms')
+    print(f"  replay reproduces the simulated state: {'yes' if not diff['mismatched'] else diff}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Batch SRS rescheduler and review-load forecaster (port of sm2Update).')
+    ap.add_argument('--db', type=Path, help='a copy of the user DB with srs and review_log')
+    ap.add_argument('--today', type=int, help='epoch day to start from (default: today, UTC, like the app)')
+    ap.add_argument('--days', type=int, default=365, help='forecast horizon')
+    ap.add_argument('--new-per-day', type=float, help='new cards per day (default: the last 30 days of review_log)')
+    ap.add_argument('--max-reviews', type=int, help='cap on due reviews per day (new cards come on top); the rest carries over')
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--csv', type=Path, help='write the daily load curve here')
+    ap.add_argument('--write', action='store_true', help='write the rescheduled state back into srs')
+    for name, default in vars(APP_PARAMS).items():
+        ap.add_argument(f'--{name.replace("_", "-")}', type=type(default), default=default, help=f'(app: {default})')
+    ap.add_argument('--self-check', action='store_true', help='parity checks against the Dart sm2Update semantics')
+    ap.add_argument('--bench', type=int, metavar='CARDS', help='time replay/reschedule/forecast on synthetic cards')
+    args = ap.parse_args(argv)
+
+    if args.self_check:
+        failures = self_check()
+        for line in failures:
+            print(f'FAIL {line}')
+        print('self-check ' + ('failed' if failures else f'passed ({len(GOLDEN)} golden cases, scalar/array/replay parity)'))
+        sys.exit(1 if failures else 0)
+    if args.bench:
+        bench(args.bench, args.seed)
+        return
+    if args.db is None:
+        ap.error('--db is required (or use --self-check / --bench)')
+
+    params = Sm2Params(**{name: getattr(args, name) for name in vars(APP_PARAMS)})
+    today = args.today if args.today is not None else epoch_today()
+    conn = sqlite3.connect(args.db)
+    srs = load_srs(conn)
+    log_item, log_day, log_grade = load_log(conn)
+    print(f'{len(srs)} srs rows, {len(log_item)} review_log rows')
+
+    t0 = time.perf_counter()
+    replayed, prior = replay(log_item, log_day, log_grade)
+    check = compare(srs, replayed)
+    print(
+        f"replay with the app's parameters: {check['compared'] - check['mismatched']}/{check['compared']} cards match srs "
+        f"({time.perf_counter() - t0:.3f}s); {check['only_expected']} srs rows have no review_log history"
+    )
+    if check['mismatched']:
+        print(f"  mismatched fields {check['mismatched_fields']}, e.g. item_id {check['sample']}")
+
+    cards = srs
+    if params != APP_PARAMS:
+        t0 = time.perf_counter()
+        rescheduled, _ = replay(log_item, log_day, log_grade, params)
+        cards = merge(srs, rescheduled)
+        moved = cards.due != srs.due
+        shift = (cards.due - srs.due)[moved]
+        print(
+            f'rescheduled with {params} in {time.perf_counter() - t0:.3f}s: {int(moved.sum())} due dates moved'
+            + (f', median {np.median(shift):+.0f} days, range {shift.min():+d}..{shift.max():+d}' if len(shift) else '')
+        )
+        if args.write:
+            print(f'{write_cards(conn, cards)} srs rows written')
+    conn.close()
+
+    new_per_day = args.new_per_day
+    if new_per_day is None:
+        new_per_day = recent_new_per_day(log_item, log_day, today)
+    t0 = time.perf_counter()
+    load, _, _ = simulate(
+        cards, today, args.days, grade_probs(log_grade, prior), new_per_day, params, args.seed, args.max_reviews
+    )
+    print(f'simulated {args.days} days in {time.perf_counter() - t0:.3f}s ({new_per_day:.1f} new/day)')
+    print(format_load(load))
+    if args.csv:
+        write_csv(args.csv, load)
+        print(f'daily load written to {args.csv}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Offline synthetic corpus shaped like the merged CSV export described in ``data/data_manifest.json``.
+
+    python tooling/synthetic_corpus.py --rows 32000 --out build/synthetic.csv
+"""
+import argparse
+import csv
+import json
+import random
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+MANIFEST = Path('data/data_manifest.json')
+
+KANJI = (
+    '日本語学習試験対策漢字読書文法会話単語意味表現辞典名前時間場所仕事生活家族友達先生学生'
+    '天気電車旅行料理映画音楽新聞経済政治社会文化歴史自然環境問題情報技術研究発表説明確認'
+    '準備練習結果原因理由目的方法必要重要簡単複雑安全危険自由平和世界国際地域都市住所番号'
+)
+HIRAGANA = [chr(c) for c in range(0x3041, 0x3094)]
+KATAKANA = [chr(c) for c in range(0x30A1, 0x30F4)] + ['ー']
+GRAMMAR_TAILS = ['ように', 'ばかりに', 'ものの', 'ことから', 'わけにはいかない', 'にすぎない', 'をめぐって', 'に限って']
+GLOSSES = ['表示原因', '表示转折', '强调程度', '表示目的', '动作完成', '表示推测', '列举', '限定范围', '表示经验', '提出话题']
+BOOKS = ['《B词汇·红宝书》', '《A 新日本语教程》', '《考前对策》', '《新完全掌握》', '《疑难辨析》', '《日本语句型辞典》']
+LEVELS = ['N1', 'N2', 'N3', 'N4', 'N5']
+
+Gen = Callable[[random.Random, int], str]
+
+
+def kanji_word(rng: random.Random, i: int) -> str:
+    return ''.join(rng.choice(KANJI) for _ in range(rng.randint(1, 3)))
+
+
+def hiragana_word(rng: random.Random, i: int) -> str:
+    return ''.join(rng.choice(HIRAGANA) for _ in range(rng.randint(2, 6)))
+
+
+def katakana_word(rng: random.Random, i: int) -> str:
+    return ''.join(rng.choice(KATAKANA) for _ in range(rng.randint(2, 6)))
+
+
+def vocab_term(rng: random.Random, i: int) -> str:
+    # 红宝书：大多是汉字词，少量外来语和纯假名词
+    r = rng.random()
+    if r < 0.7:
+        return kanji_word(rng, i)
+    return katakana_word(rng, i) if r < 0.85 else hiragana_word(rng, i)
+
+
+def pattern(rng: random.Random, i: int) -> str:
+    return '～' + rng.choice([hiragana_word(rng, i), kanji_word(rng, i)]) + rng.choice(GRAMMAR_TAILS)
+
+
+def sentence(rng: random.Random, i: int) -> str:
+    return kanji_word(rng, i) + 'は' + kanji_word(rng, i) + hiragana_word(rng, i) + '。'
+
+
+def gloss(rng: random.Random, i: int) -> str:
+    return rng.choice(GLOSSES) + '，' + rng.choice(GLOSSES)
+
+
+def level(rng: random.Random, i: int) -> str:
+    return rng.choice(LEVELS) if rng.random() < 0.9 else 'nan'
+
+
+def page(rng: random.Random, i: int) -> str:
+    return str(rng.randint(1, 480))
+
+
+def onkun(rng: random.Random, i: int) -> str:
+    return katakana_word(rng, i)[:3] + '・' + hiragana_word(rng, i)
+
+
+def single_kanji(rng: random.Random, i: int) -> str:
+    return rng.choice(KANJI)
+
+
+def audio_path(rng: random.Random, i: int) -> str:
+    return f'F:\\日语资料\\にほんご\\《B词汇·红宝书》\\{rng.choice(LEVELS)}\\{i:06d}.mp3'
+
+
+def image_path(book: str, ext: str = 'jpg') -> Gen:
+    def gen(rng: random.Random, i: int) -> str:
+        return f'F:\\日语资料\\にほんご\\{book}\\{i // 50:04d}\\p{i % 50:02d}.{ext}'
+    return gen
+
+
+def forward_image_path(book: str) -> Gen:
+    def gen(rng: random.Random, i: int) -> str:
+        return f'C:/Users/me/にほんご/{book}/{i // 50:04d}/p{i % 50:02d}.png'
+    return gen
+
+
+def lesson(rng: random.Random, i: int) -> str:
+    return str(rng.randint(1, 50))
+
+
+def sparse(gen: Gen, p: float) -> Gen:
+    """``gen`` on a fraction ``p`` of the rows, ``nan`` elsewhere (pandas-exported empties)."""
+    def wrapped(rng: random.Random, i: int) -> str:
+        return gen(rng, i) if rng.random() < p else 'nan'
+    return wrapped
+
+
+# 每个 sheet 的“特征列”：构建脚本实际读取的列名 + 该列的取值方式
+SHEET_COLUMNS: Dict[str, Dict[str, Gen]] = {
+    '蓝宝书': {'句型・2015年版目录': pattern, '级别.1': level, '页数.2': page, '例句': sentence},
+    '红宝书': {
+        '汉字/外文': vocab_term, '假名': hiragana_word, 'col_40': level, '词意': gloss,
+        '音源路径': audio_path, '图源_2': sparse(image_path(BOOKS[0]), 0.3),
+    },
+    '日语汉字': {'漢字': single_kanji, '音訓': onkun, '读音': hiragana_word},
+    '考前对策': {'句型': pattern, '级别': level, '页数': page, '路径': image_path(BOOKS[2], 'png'),
+             '实际路径': sparse(forward_image_path(BOOKS[2]), 0.2)},
+    '新日本语教程': {'初1': lesson, '基本句型': sentence, '词汇表达能力指导': gloss,
+               '路径': sparse(image_path(BOOKS[1]), 0.6)},
+    '疑难辨析': {'终了': kanji_word, '~': hiragana_word, 'がおわる': sentence, '~.1': hiragana_word,
+             'をおわる': sentence, 'col_25': image_path(BOOKS[4])},
+    '词汇辨析': {'词汇': vocab_term, '关联词': vocab_term, '关联词解释': gloss, 'col_26': image_path(BOOKS[4])},
+    '新完全掌握': {'句型': pattern, '页码': page, '路径': image_path(BOOKS[3])},
+    'どんな时どう使う': {'句型': pattern, '参考': gloss, '页码': page},
+    '顾明耀': {'语法点': pattern, '页码': page},
+    '皮细庚': {'语法点': pattern, '页码': page},
+    '日语语法新思维': {'语法点': pattern, '页码': page},
+    '《日本语句型辞典》': {'句型': pattern, 'col_25': image_path(BOOKS[5])},
+    'Sheet1': {'副词': hiragana_word, '词意': gloss, '例句': sentence, '例句解释': gloss},
+    '变形与活用': {'语法点': pattern, '例句': sentence, '备注': gloss},
+    '词典存放目录': {'路径': image_path(BOOKS[5])},
+}
+
+FILLERS: Sequence[Gen] = (sparse(gloss, 0.3), sparse(page, 0.5), sparse(kanji_word, 0.3), sparse(hiragana_word, 0.3))
+
+
+def load_manifest(path: Path = MANIFEST) -> dict:
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def build_layout(manifest: dict):
+    """Header plus, per sheet, the ``(column index, generator)`` pairs that get values."""
+    named: List[str] = []
+    for cols in SHEET_COLUMNS.values():
+        named.extend(c for c in cols if c not in named)
+    total_cols = max(manifest.get('total_cols', 0), len(named) + 2)
+    filler_names = [f'col_{i}' for i in range(total_cols) if f'col_{i}' not in named]
+    headers = ['sheet_name', 'row_index'] + named + filler_names[:total_cols - 2 - len(named)]
+    pos = {name: i for i, name in enumerate(headers)}
+    layout = {}
+    for n, sheet in enumerate(manifest['sheets']):
+        name = sheet['sheet_name']
+        gens = [(pos[c], g) for c, g in SHEET_COLUMNS.get(name, {'语法点': pattern}).items()]
+        # 用 filler 列补到 manifest 里这个 sheet 的列数（每个 sheet 用不同的一段 filler 列）
+        extra = max(0, sheet['cols'] - 2 - len(gens))
+        start = (n * 7) % max(1, len(filler_names) - extra)
+        for k, col in enumerate(filler_names[start:start + extra]):
+            gens.append((pos[col], FILLERS[k % len(FILLERS)]))
+        layout[name] = gens
+    return headers, layout
+
+
+def sheet_rows(manifest: dict, total_rows: int) -> List[tuple]:
+    """``(sheet_name, rows)`` scaled from the manifest so they add up to ``total_rows``."""
+    base = sum(s['rows'] for s in manifest['sheets'])
+    out = []
+    assigned = 0
+    for s in manifest['sheets']:
+        n = max(1, round(s['rows'] * total_rows / base))
+        out.append([s['sheet_name'], n])
+        assigned += n
+    out[max(range(len(out)), key=lambda k: out[k][1])][1] += total_rows - assigned
+    return [tuple(r) for r in out]
+
+
+def write_csv(dest: Path, total_rows: int, seed: int = 7, manifest_path: Path = MANIFEST) -> Path:
+    manifest = load_manifest(manifest_path)
+    headers, layout = build_layout(manifest)
+    rng = random.Random(seed)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(dest.suffix + '.tmp')
+    with tmp.open('w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(headers)
+        blank = [''] * len(headers)
+        for name, n in sheet_rows(manifest, total_rows):
+            gens = layout[name]
+            batch = []
+            for i in range(n):
+                row = blank.copy()
+                row[0] = name
+                row[1] = str(i)
+                for col, gen in gens:
+                    row[col] = gen(rng, i)
+                batch.append(row)
+                if len(batch) >= 10000:
+                    w.writerows(batch)
+                    batch.clear()
+            w.writerows(batch)
+    tmp.replace(dest)
+    return dest
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Write a synthetic merged CSV shaped like data/data_manifest.json.')
+    ap.add_argument('--rows', type=int, default=32000)
+    ap.add_argument('--seed', type=int, default=7)
+    ap.add_argument('--manifest', type=Path, default=MANIFEST)
+    ap.add_argument('--out', type=Path, required=True)
+    args = ap.parse_args()
+    write_csv(args.out, args.rows, args.seed, args.manifest)
+    print(f'{args.rows} rows -> {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Normalized search keys ``items.term_key`` / ``items.reading_key`` with ``COLLATE NOCASE`` prefix indexes."""
+import re
+import sqlite3
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+KEY_COLUMNS = ('term_key', 'reading_key')
+
+# NOCASE 索引才能用上 LIKE 优化（SQLite 默认的 LIKE 对 ASCII 不区分大小写），前缀查询走索引区间扫描
+INDEX_SQL = '''
+CREATE INDEX IF NOT EXISTS idx_items_term_key ON items(term_key COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_items_reading_key ON items(reading_key COLLATE NOCASE);
+'''
+
+_KATA_TO_HIRA = {c: c - 0x60 for c in range(0x30A1, 0x30F7)}
+_KATA_TO_HIRA.update({0x30FD: 0x309D, 0x30FE: 0x309E})
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_key(text: Optional[str]) -> str:
+    """Fold ``text`` into a search key: NFKC, casefold, katakana → hiragana, whitespace collapsed.
+
+    NFKC 把半角片假名转全角、全角字母数字转半角；片假名 U+30A1..U+30F6 减 0x60，``ヽヾ`` → ``ゝゞ``，
+    ``ヷヸヹヺ`` 等没有平假名对应，保持不变。
+    """
+    if not text:
+        return ''
+    folded = unicodedata.normalize('NFKC', text).casefold().translate(_KATA_TO_HIRA)
+    return _SPACES.sub(' ', folded).strip()
+
+
+def ensure_key_columns(conn: sqlite3.Connection):
+    have = {r[1] for r in conn.execute('PRAGMA table_info(items)')}
+    for name in KEY_COLUMNS:
+        if name not in have:
+            conn.execute(f"ALTER TABLE items ADD COLUMN {name} TEXT NOT NULL DEFAULT ''")
+
+
+def refresh_text_keys(conn: sqlite3.Connection, item_ids: Optional[Sequence[int]] = None) -> int:
+    """Recompute ``term_key``/``reading_key`` for all items, or only ``item_ids``; creates the indexes."""
+    ensure_key_columns(conn)
+    select = 'SELECT id, term, reading FROM items'
+    if item_ids is None:
+        rows = conn.execute(f'{select} ORDER BY id').fetchall()
+    else:
+        ids = sorted(set(item_ids))
+        rows = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows.extend(conn.execute(f'{select} WHERE id IN ({",".join("?" * len(chunk))})', chunk).fetchall())
+    conn.executemany(
+        'UPDATE items SET term_key=?, reading_key=? WHERE id=?',
+        ((normalize_key(term), normalize_key(reading), item_id) for item_id, term, reading in rows),
+    )
+    conn.executescript(INDEX_SQL)
+    conn.commit()
+    return len(rows)
+
+
+def escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def prefix_query(q: str, deck: Optional[str] = None, limit: int = 50) -> Optional[Tuple[str, list]]:
+    """Reference query (SQL, args): items whose term or reading key starts with the folded ``q``.
+
+    两个前缀条件用 ``UNION`` 拆开，各自走自己的 NOCASE 索引；``q`` 折叠后为空时返回 ``None``。
+    """
+    key = normalize_key(q)
+    if not key:
+        return None
+    pattern = escape_like(key) + '%'
+    parts: List[str] = []
+    args: List[object] = []
+    for col in KEY_COLUMNS:
+        parts.append(f"SELECT id FROM items WHERE {col} LIKE ? ESCAPE '\\'")
+        args.append(pattern)
+    where = [f'i.id IN ({" UNION ".join(parts)})']
+    if deck is not None:
+        where.append('i.deck=?')
+        args.append(deck)
+    sql = f'SELECT i.id FROM items i WHERE {" AND ".join(where)} ORDER BY i.id DESC LIMIT ?'
+    return sql, args + [limit]